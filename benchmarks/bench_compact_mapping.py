@@ -0,0 +1,74 @@
+"""
+Memory and lookup latency of the author mapping as a dict and as a CompactMapping,
+for watchlists of 10k to 1M accounts.
+Memory of the dict is what tracemalloc sees allocated while building it from fresh int and
+str objects, as download_user_mapping does. Lookups are a mix of mapped and unknown ids.
+
+Run from the repo root:
+    python -m benchmarks.bench_compact_mapping --sizes 10000 100000 1000000
+"""
+
+# native
+import argparse
+import random
+import time
+import tracemalloc
+
+# lib
+from classes.compact_mapping import CompactMapping
+
+
+def make_rows(n: int, seed: int = 0) -> list[tuple]:
+    rng = random.Random(seed)
+    ids = rng.sample(range(10**8, 10**18), n)
+    return [(user_id, f"user_{user_id % 10**9}") for user_id in ids]
+
+
+def dict_memory(rows) -> tuple[dict, int]:
+    tracemalloc.start()
+    mapping = {}
+    for user_id, user_name in rows:
+        # rebuilt the way they arrive from a cursor, not shared with rows
+        mapping[int(str(user_id))] = "".join(user_name)
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return mapping, size
+
+
+def lookup_ns(mapping, keys: list[int]) -> float:
+    get = mapping.get
+    start = time.perf_counter()
+    for key in keys:
+        get(key)
+    return (time.perf_counter() - start) / len(keys) * 1e9
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000]
+    )
+    parser.add_argument("--lookups", type=int, default=200_000)
+    parser.add_argument("--miss", type=float, default=0.1, help="share of unknown ids")
+    args = parser.parse_args()
+
+    print(
+        f"{'authors':>10}{'dict MB':>10}{'compact MB':>12}"
+        f"{'build s':>10}{'dict ns':>10}{'compact ns':>12}"
+    )
+    rng = random.Random(1)
+    for n in args.sizes:
+        rows = make_rows(n)
+        mapping, dict_bytes = dict_memory(rows)
+        start = time.perf_counter()
+        compact = CompactMapping.from_dict(mapping)
+        build = time.perf_counter() - start
+        keys = [
+            rng.randrange(10**18) if rng.random() < args.miss else rng.choice(rows)[0]
+            for _ in range(args.lookups)
+        ]
+        print(
+            f"{n:>10}{dict_bytes / 2**20:>10.1f}{compact.memory_bytes() / 2**20:>12.1f}"
+            f"{build:>10.2f}{lookup_ns(mapping, keys):>10.0f}"
+            f"{lookup_ns(compact, keys):>12.0f}"
+        )
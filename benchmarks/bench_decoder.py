@@ -0,0 +1,82 @@
+"""
+Compares the dict path (json.loads + TweetDB.extract_row on the full payload) with the
+StreamRecord decoder on the stdlib and orjson backends, from raw line to tweets table row.
+
+Run from the repo root on a recorded corpus, a capture directory, or a synthetic one:
+    python -m benchmarks.bench_decoder --corpus recorded.jsonl
+    python -m benchmarks.bench_decoder --capture _data/capture
+    python -m benchmarks.bench_decoder --tweets 100000
+"""
+
+# native
+import argparse
+import json
+import logging
+from queue import Queue
+from threading import Event
+import time
+
+# lib
+from benchmarks.common import make_corpus
+from classes.capture import list_segments, read_segment
+from classes.classesv2 import TweetDB
+from classes.decoder import decode_line, orjson
+
+
+def load_lines(args) -> list[bytes]:
+    if args.corpus:
+        with open(args.corpus, "rb") as f:
+            return [line.rstrip(b"\r\n") for line in f if line.strip()]
+    if args.capture:
+        segments = list_segments(args.capture)
+        return [line for path in segments for _, line in read_segment(path)]
+    corpus, _ = make_corpus(args.tweets, args.authors)
+    return [json.dumps(payload).encode() for payload in corpus]
+
+
+def run(name: str, lines: list[bytes], decode, database: TweetDB) -> dict:
+    start = time.perf_counter()
+    decoded = [decode(line) for line in lines]
+    decoded_at = time.perf_counter()
+    rows = [database.extract_row(item) for item in decoded if item is not None]
+    end = time.perf_counter()
+    return {
+        "name": name,
+        "lines": len(lines),
+        "rows": sum(row is not None for row in rows),
+        "decode_s": decoded_at - start,
+        "total_s": end - start,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--corpus", help="recorded payloads, one JSON per line")
+    parser.add_argument("--capture", help="directory of capture segments")
+    parser.add_argument("--tweets", type=int, default=100_000)
+    parser.add_argument("--authors", type=int, default=500)
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    lines = load_lines(args)
+    # map every author so all three paths build the same rows
+    author_ids = {int(json.loads(line)["data"]["author_id"]) for line in lines}
+    mapping = {author_id: str(author_id) for author_id in author_ids}
+
+    runs = [("json.loads + dict", json.loads)]
+    runs.append(("decoder (json)", lambda line: decode_line(line, json.loads)))
+    if orjson is not None:
+        runs.append(("decoder (orjson)", decode_line))
+
+    results = []
+    for name, decode in runs:
+        events = {"local_db": Event(), "sql": Event(), "killall": Event()}
+        database = TweetDB({}, Queue(), Queue(), events, mapping, logging.getLogger())
+        results.append(run(name, lines, decode, database))
+
+    print(f"{'path':<22}{'lines':>10}{'rows':>10}{'decode/s':>12}{'line->row/s':>14}")
+    for r in results:
+        print(
+            f"{r['name']:<22}{r['lines']:>10}{r['rows']:>10}"
+            f"{r['lines'] / r['decode_s']:>12.0f}{r['lines'] / r['total_s']:>14.0f}"
+        )
@@ -0,0 +1,62 @@
+"""
+Compares the threaded and asyncio TweetStream engines.
+Reports sustained tweets/sec and receive-to-commit latency.
+
+Run from the repo root:
+    python -m benchmarks.bench_engines --tweets 50000 --commit-ms 0.05
+"""
+
+# native
+import argparse
+import logging
+import os
+import threading
+
+# lib
+from benchmarks.common import (
+    RecordingPipe,
+    SyntheticHandler,
+    attach,
+    make_corpus,
+    print_results,
+    summarize,
+)
+from classes.classesv2 import TweetStream
+
+
+def run_engine(engine: str, corpus, mapping, commit_delay: float, rate) -> dict:
+    handler = SyntheticHandler(corpus, rate=rate)
+    pipe = RecordingPipe(mapping, len(corpus), commit_delay)
+    stream = TweetStream(None, None, engine=engine, handler=handler, sql_pipe=pipe)
+    attach(stream, handler, pipe)
+
+    runner = threading.Thread(target=stream.run, daemon=True)
+    runner.start()
+    pipe.done.wait()
+    stream.kill()
+    runner.join()
+    return summarize(engine, handler.received, pipe.committed)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tweets", type=int, default=20_000)
+    parser.add_argument("--authors", type=int, default=500)
+    parser.add_argument(
+        "--commit-ms", type=float, default=0.0, help="simulated commit time per row"
+    )
+    parser.add_argument(
+        "--rate", type=float, default=None, help="tweets/sec offered, default unpaced"
+    )
+    args = parser.parse_args()
+
+    os.makedirs("logs", exist_ok=True)
+    # measure the engines, not the per-tweet log lines
+    logging.disable(logging.INFO)
+
+    corpus, mapping = make_corpus(args.tweets, args.authors)
+    results = [
+        run_engine(engine, corpus, mapping, args.commit_ms / 1000, args.rate)
+        for engine in TweetStream.engines
+    ]
+    print_results(results)
@@ -0,0 +1,92 @@
+"""
+Per-request latency of TwitterHandler's keep-alive session against fresh
+module-level requests calls, measured on a local stand-in for the users/by endpoint.
+
+A real api.twitter.com call pays a TCP and TLS handshake on every new connection.
+Locally that cost is close to zero, so --handshake-ms adds a delay each time the
+stand-in server accepts a new connection.
+
+Run from the repo root:
+    python -m benchmarks.bench_http_session --requests 500 --handshake-ms 30
+"""
+
+# native
+import argparse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import logging
+import statistics
+from threading import Thread
+import time
+
+# packages
+import requests
+
+# lib
+from classes.classesv2 import TwitterHandler
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # headers and body are separate writes, avoid the Nagle/delayed-ACK stall on keep-alive
+    disable_nagle_algorithm = True
+    handshake_delay = 0.0
+    body = json.dumps(
+        {"data": [{"id": "247334603", "name": "Dick Durbin", "username": "Durbin"}]}
+    ).encode()
+
+    def setup(self):
+        # runs once per accepted connection
+        time.sleep(self.handshake_delay)
+        super().setup()
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(self.body)))
+        self.end_headers()
+        self.wfile.write(self.body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def time_calls(call, n: int) -> list[float]:
+    timings = []
+    for _ in range(n):
+        start = time.perf_counter()
+        call()
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--handshake-ms", type=float, default=0.0)
+    args = parser.parse_args()
+
+    StandInHandler.handshake_delay = args.handshake_ms / 1000
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StandInHandler)
+    Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_port}/2/users/by?usernames=Durbin"
+
+    handler = TwitterHandler("bench_token", None, logging.getLogger("Handler"))
+    fresh = time_calls(
+        lambda: requests.request("GET", url, auth=handler.bearer_oauth).json(),
+        args.requests,
+    )
+    pooled = time_calls(lambda: handler.get_from_endpoint(url), args.requests)
+    handler.close()
+    server.shutdown()
+
+    print(f"{'client':<24}{'mean ms':>12}{'p50 ms':>12}{'p99 ms':>12}")
+    for name, timings in (("requests.request", fresh), ("TwitterHandler", pooled)):
+        timings.sort()
+        print(
+            f"{name:<24}{statistics.mean(timings) * 1000:>12.3f}"
+            f"{statistics.median(timings) * 1000:>12.3f}"
+            f"{timings[int(len(timings) * 0.99) - 1] * 1000:>12.3f}"
+        )
+    saved = statistics.mean(fresh) - statistics.mean(pooled)
+    print(f"saved per request: {saved * 1000:.3f} ms")
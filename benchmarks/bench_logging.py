@@ -0,0 +1,96 @@
+"""
+Ingest throughput of the threaded TweetStream with the different logging setups:
+logging disabled, the original synchronous handlers, the queue-backed listener,
+and the listener with per-tweet records sampled.
+
+Run from the repo root, the log files go to a temporary directory:
+    python -m benchmarks.bench_logging --tweets 20000
+"""
+
+# native
+import argparse
+import logging
+import os
+import sys
+import tempfile
+import threading
+
+# lib
+from benchmarks.common import (
+    RecordingPipe,
+    SyntheticHandler,
+    attach,
+    make_corpus,
+    print_results,
+    summarize,
+)
+from classes.classesv2 import TweetStream
+from classes.log_queue import stop_queue_logging
+
+SETUPS = {
+    "off": {"disabled": True},
+    "sync": {"async_logging": False},
+    "async": {"async_logging": True},
+    "async sampled 1/100": {
+        "async_logging": True,
+        "log_sample": {"Handler": 100, "Local_Dict": 100},
+    },
+    "async structured": {"async_logging": True, "structured_logs": True},
+}
+
+
+def reset_logging() -> None:
+    stop_queue_logging()
+    for name in (None, "Handler", "Local_Dict", "SQL_Database"):
+        logger = logging.getLogger(name)
+        for handler in list(logger.handlers):
+            logger.removeHandler(handler)
+            handler.close()
+    logging.disable(logging.NOTSET)
+
+
+def run_setup(name: str, setup: dict, corpus, mapping, spill_dir: str) -> dict:
+    reset_logging()
+    setup = dict(setup)
+    if setup.pop("disabled", False):
+        logging.disable(logging.CRITICAL)
+    handler = SyntheticHandler(corpus)
+    pipe = RecordingPipe(mapping, len(corpus))
+    stream = TweetStream(
+        None, None, handler=handler, sql_pipe=pipe, spill_dir=spill_dir, **setup
+    )
+    attach(stream, handler, pipe)
+
+    runner = threading.Thread(target=stream.run, daemon=True)
+    runner.start()
+    pipe.done.wait()
+    result = summarize(name, handler.received, pipe.committed)
+    stream.kill()
+    runner.join()
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tweets", type=int, default=20_000)
+    parser.add_argument("--authors", type=int, default=500)
+    args = parser.parse_args()
+
+    corpus, mapping = make_corpus(args.tweets, args.authors)
+    repo = os.getcwd()
+    stderr = sys.stderr
+    with tempfile.TemporaryDirectory() as workdir, open(os.devnull, "w") as devnull:
+        os.chdir(workdir)
+        os.makedirs("logs")
+        # the console handler still formats and writes every record, just not to the terminal
+        sys.stderr = devnull
+        try:
+            results = [
+                run_setup(name, setup, corpus, mapping, os.path.join(workdir, "spill"))
+                for name, setup in SETUPS.items()
+            ]
+        finally:
+            sys.stderr = stderr
+            reset_logging()
+            os.chdir(repo)
+    print_results(results)
@@ -0,0 +1,97 @@
+"""
+Startup cost of the author mapping: a full read of id_name_mapping into a dict against
+memory-mapping a snapshot, at 10k and 1M authors.
+Without --db the full read is only the dict build from rows already in memory, a lower bound
+for download_user_mapping. With --db it is the real SELECT from a scratch table.
+
+Run from the repo root:
+    python -m benchmarks.bench_mapping_snapshot
+    python -m benchmarks.bench_mapping_snapshot --db "host=localhost dbname=postgres user=postgres"
+"""
+
+# native
+import argparse
+from datetime import datetime, timezone
+import logging
+import os
+import statistics
+import tempfile
+import time
+
+# packages
+import psycopg
+import psycopg.sql as psql
+
+# lib
+from benchmarks.bench_compact_mapping import make_rows
+from classes.mapping_snapshot import load_snapshot, write_snapshot
+
+TABLE = "bench_id_name_mapping"
+
+
+def median_time(func, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+
+def full_read(rows, conn=None):
+    if conn is None:
+        return lambda: {user_id: user_name for user_id, user_name in rows}
+    conn.execute(psql.SQL("DROP TABLE IF EXISTS {};").format(psql.Identifier(TABLE)))
+    conn.execute(
+        psql.SQL(
+            "CREATE TABLE {} (user_id BIGINT PRIMARY KEY, user_name TEXT NOT NULL);"
+        ).format(psql.Identifier(TABLE))
+    )
+    with conn.cursor().copy(
+        psql.SQL("COPY {} (user_id,user_name) FROM STDIN").format(
+            psql.Identifier(TABLE)
+        )
+    ) as copy:
+        for row in rows:
+            copy.write_row(row)
+    query = psql.SQL("SELECT user_id,user_name FROM {};").format(psql.Identifier(TABLE))
+    return lambda: {row[0]: row[1] for row in conn.execute(query)}
+
+
+def snapshot_load(path: str, probe: int):
+    logger = logging.getLogger("Bench")
+
+    def load():
+        mapping, _ = load_snapshot(path, logger)
+        mapping.get(probe)
+
+    return load
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 1_000_000])
+    parser.add_argument("--db", help="libpq connection string")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    conn = psycopg.connect(args.db, autocommit=True) if args.db else None
+    full_name = "SELECT ms" if conn else "dict build ms"
+    print(f"{'authors':>10}{full_name:>16}{'snapshot ms':>14}{'write ms':>12}{'MB':>8}")
+    with tempfile.TemporaryDirectory() as snapshot_dir:
+        path = os.path.join(snapshot_dir, "mapping.snapshot")
+        for n in args.sizes:
+            rows = make_rows(n)
+            mapping = dict(rows)
+            start = time.perf_counter()
+            write_snapshot(path, mapping, datetime.now(timezone.utc))
+            write = time.perf_counter() - start
+            full = median_time(full_read(rows, conn), args.repeat)
+            load = median_time(snapshot_load(path, rows[0][0]), args.repeat)
+            print(
+                f"{n:>10}{full * 1000:>16.1f}{load * 1000:>14.2f}"
+                f"{write * 1000:>12.0f}{os.path.getsize(path) / 2**20:>8.1f}"
+            )
+    if conn is not None:
+        conn.execute(psql.SQL("DROP TABLE {};").format(psql.Identifier(TABLE)))
+        conn.close()
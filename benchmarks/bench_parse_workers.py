@@ -0,0 +1,76 @@
+"""
+Parse throughput of ParseWorkerPool with 1, 2, 4 and 8 worker processes,
+against parsing on one thread with TweetDB.extract_row.
+
+Run from the repo root, on a synthetic corpus or a recorded one (JSONL, see tools.reingest --export):
+    python -m benchmarks.bench_parse_workers --tweets 200000
+    python -m benchmarks.bench_parse_workers --corpus corpus.jsonl
+"""
+
+# native
+import argparse
+import json
+import logging
+from queue import Queue
+from threading import Event
+import time
+
+# lib
+from classes.classesv2 import TweetDB
+from classes.parse_workers import ParseWorkerPool
+from tools.replay_server import load_corpus, make_corpus
+
+
+def chunked(lines: list[bytes], size: int):
+    for i in range(0, len(lines), size):
+        yield lines[i : i + size]
+
+
+def bench_thread(lines: list[bytes], mapping: dict) -> float:
+    events = {"local_db": Event(), "sql": Event(), "killall": Event()}
+    database = TweetDB({}, Queue(), Queue(), events, mapping, logging.getLogger("x"))
+    start = time.perf_counter()
+    for line in lines:
+        database.extract_row(json.loads(line))
+    return time.perf_counter() - start
+
+
+def bench_workers(lines: list[bytes], mapping: dict, workers: int, chunk: int):
+    pool = ParseWorkerPool(workers, mapping, logging.getLogger("x"), chunk)
+    # warm up so process start is not timed
+    list(pool.parse(chunked(lines[: workers * chunk], chunk)))
+    start = time.perf_counter()
+    rows = sum(len(r) for r in pool.parse(chunked(lines, chunk)))
+    elapsed = time.perf_counter() - start
+    pool.close()
+    return elapsed, rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tweets", type=int, default=200_000)
+    parser.add_argument("--authors", type=int, default=500)
+    parser.add_argument("--corpus", help="recorded payloads, one JSON per line")
+    parser.add_argument("--chunk", type=int, default=256)
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    if args.corpus:
+        corpus = load_corpus(args.corpus)
+        mapping = {
+            int(user["id"]): user["username"]
+            for payload in corpus
+            for user in payload.get("includes", {}).get("users", [])
+        }
+    else:
+        corpus, mapping = make_corpus(args.tweets, args.authors)
+    lines = [json.dumps(payload).encode() for payload in corpus]
+
+    print(f"{'parser':<16}{'tweets/s':>14}{'speedup':>10}")
+    base = bench_thread(lines, mapping)
+    print(f"{'thread':<16}{len(lines) / base:>14.0f}{1:>10.2f}")
+    for workers in (1, 2, 4, 8):
+        elapsed, rows = bench_workers(lines, mapping, workers, args.chunk)
+        print(
+            f"{f'{workers} workers':<16}{rows / elapsed:>14.0f}{base / elapsed:>10.2f}"
+        )
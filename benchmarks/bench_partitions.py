@@ -0,0 +1,134 @@
+"""
+Compares per-author and per-period queries on the plain tweets table (primary key only, as
+initialize_db creates it) and on the monthly partitioned one with its author_id index.
+Both tables are filled with the same synthetic tweets spread over --months months.
+
+Needs a Postgres to create two scratch tables in, run from the repo root:
+    python -m benchmarks.bench_partitions --db "host=localhost dbname=postgres user=postgres" --tweets 5000000
+"""
+
+# native
+import argparse
+from datetime import datetime, timezone
+import logging
+import random
+import statistics
+import time
+
+# packages
+import psycopg
+import psycopg.sql as psql
+
+# lib
+from classes.partitions import (
+    create_partitioned_table,
+    create_partitions,
+    month_start,
+    snowflake_id,
+)
+
+PLAIN = "bench_tweets_plain"
+PARTITIONED = "bench_tweets_part"
+
+
+def make_rows(n: int, authors: int, months: int, seed: int = 0):
+    rng = random.Random(seed)
+    end = datetime.now(timezone.utc).timestamp()
+    start = month_start(end, -months + 1).timestamp()
+    low, high = snowflake_id(start), snowflake_id(end)
+    for tweet_id in sorted(rng.sample(range(low, high), n)):
+        yield (tweet_id, rng.randrange(authors), "author", "text " * 20)
+
+
+def load(conn, table: str, rows) -> None:
+    with conn.cursor().copy(
+        psql.SQL(
+            "COPY {} (tweet_id,author_id,author_name,tweet_text) FROM STDIN"
+        ).format(psql.Identifier(table))
+    ) as copy:
+        for row in rows:
+            copy.write_row(row)
+    conn.execute(psql.SQL("ANALYZE {};").format(psql.Identifier(table)))
+
+
+def time_query(conn, query, params, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        conn.execute(query, params).fetchall()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+
+def queries(table: str, author: int, month: float) -> list[tuple]:
+    low = snowflake_id(month)
+    high = snowflake_id(month_start(month, 1).timestamp())
+    name = psql.Identifier(table)
+    return [
+        (
+            "one author",
+            psql.SQL("SELECT tweet_id FROM {} WHERE author_id=%s").format(name),
+            (author,),
+        ),
+        (
+            "one month count",
+            psql.SQL(
+                "SELECT count(*) FROM {} WHERE tweet_id >= %s AND tweet_id < %s"
+            ).format(name),
+            (low, high),
+        ),
+        (
+            "author in month",
+            psql.SQL(
+                "SELECT tweet_id FROM {} "
+                "WHERE author_id=%s AND tweet_id >= %s AND tweet_id < %s"
+            ).format(name),
+            (author, low, high),
+        ),
+    ]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--db", required=True, help="libpq connection string")
+    parser.add_argument("--tweets", type=int, default=1_000_000)
+    parser.add_argument("--authors", type=int, default=5000)
+    parser.add_argument("--months", type=int, default=12)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    logger = logging.getLogger("Bench")
+    now = datetime.now(timezone.utc).timestamp()
+    with psycopg.connect(args.db, autocommit=True) as conn:
+        for table in (PLAIN, PARTITIONED):
+            conn.execute(
+                psql.SQL("DROP TABLE IF EXISTS {};").format(psql.Identifier(table))
+            )
+        conn.execute(psql.SQL("""CREATE TABLE {} (
+                tweet_id BIGINT PRIMARY KEY NOT NULL,
+                author_id BIGINT NOT NULL,
+                author_name TEXT NOT NULL,
+                tweet_text TEXT NOT NULL);""").format(psql.Identifier(PLAIN)))
+        create_partitioned_table(conn, PARTITIONED)
+        create_partitions(
+            conn, month_start(now, -args.months).timestamp(), now, logger, PARTITIONED
+        )
+
+        for table in (PLAIN, PARTITIONED):
+            start = time.perf_counter()
+            load(conn, table, make_rows(args.tweets, args.authors, args.months))
+            print(f"loaded {table} in {time.perf_counter() - start:.1f}s")
+
+        month = month_start(now, -(args.months // 2)).timestamp()
+        print(f"{'query':<20}{'plain ms':>12}{'partitioned ms':>16}")
+        plain = queries(PLAIN, 42, month)
+        partitioned = queries(PARTITIONED, 42, month)
+        for (name, before, params), (_, after, _) in zip(plain, partitioned):
+            print(
+                f"{name:<20}"
+                f"{time_query(conn, before, params, args.repeat) * 1000:>12.1f}"
+                f"{time_query(conn, after, params, args.repeat) * 1000:>16.1f}"
+            )
+
+        for table in (PLAIN, PARTITIONED):
+            conn.execute(psql.SQL("DROP TABLE {};").format(psql.Identifier(table)))
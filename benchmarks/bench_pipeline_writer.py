@@ -0,0 +1,170 @@
+"""
+Compares PostgresPipe (row by row and COPY batches) with the pipeline-mode PipelineWriter
+on a link with artificial latency. Connections go through a local TCP proxy that holds
+every chunk for half the round trip time in each direction.
+
+Needs a Postgres initialized with Toolkit.initialize_db, run from the repo root:
+    python -m benchmarks.bench_pipeline_writer --db "host=localhost dbname=postgres user=postgres" --rtt-ms 20
+The benchmark writes tweet ids above 10^18 and deletes them again when it is done.
+"""
+
+# native
+import argparse
+import asyncio
+import logging
+from queue import Queue
+from threading import Event, Thread
+import time
+
+# packages
+import psycopg
+from psycopg.conninfo import conninfo_to_dict
+import psycopg.sql as psql
+
+# lib
+from classes.classesv2 import PostgresPipe
+from classes.db_pool import get_pool
+from classes.pipeline_writer import PipelineWriter
+
+FIRST_ID = 10**18
+
+
+class LatencyProxy:
+    """
+    Forwards local connections to target, delaying each direction by delay seconds
+    """
+
+    def __init__(self, host: str, port: int, delay: float):
+        self.target = (host, port)
+        self.delay = delay
+        self.loop = asyncio.new_event_loop()
+        self.port = None
+        Thread(target=self.loop.run_forever, daemon=True).start()
+        asyncio.run_coroutine_threadsafe(self.start(), self.loop).result()
+
+    async def start(self) -> None:
+        server = await asyncio.start_server(self.handle, "127.0.0.1", 0)
+        self.port = server.sockets[0].getsockname()[1]
+
+    async def handle(self, client_reader, client_writer) -> None:
+        server_reader, server_writer = await asyncio.open_connection(*self.target)
+        await asyncio.gather(
+            self.forward(client_reader, server_writer),
+            self.forward(server_reader, client_writer),
+        )
+
+    async def forward(self, reader, writer) -> None:
+        loop = asyncio.get_running_loop()
+        pending = asyncio.Queue()
+
+        async def release():
+            while True:
+                due, data = await pending.get()
+                if data is None:
+                    break
+                await asyncio.sleep(max(0.0, due - loop.time()))
+                writer.write(data)
+                await writer.drain()
+            writer.close()
+
+        releaser = asyncio.create_task(release())
+        try:
+            while data := await reader.read(65536):
+                pending.put_nowait((loop.time() + self.delay, data))
+        except ConnectionError:
+            pass
+        pending.put_nowait((0, None))
+        await releaser
+
+
+def make_rows(start: int, n: int) -> list[tuple]:
+    return [(FIRST_ID + start + i, 10, "author", f"text {i}") for i in range(n)]
+
+
+def run_row_by_row(pipe: PostgresPipe, rows: list[tuple]) -> float:
+    start = time.perf_counter()
+    for row in rows:
+        pipe.execute_SQL(row)
+    return time.perf_counter() - start
+
+
+def run_copy(pipe: PostgresPipe, rows: list[tuple]) -> float:
+    start = time.perf_counter()
+    for i in range(0, len(rows), pipe.max_batch_size):
+        pipe.execute_batch(rows[i : i + pipe.max_batch_size])
+    return time.perf_counter() - start
+
+
+def run_pipeline(writer: PipelineWriter, rows: list[tuple], batch_size: int) -> float:
+    async def write():
+        await writer.connect()
+        start = time.perf_counter()
+        # the async engine hands the writer whatever db_q holds, batch_size at a time
+        for i in range(0, len(rows), batch_size):
+            await writer.write(rows[i : i + batch_size])
+        elapsed = time.perf_counter() - start
+        await writer.close()
+        return elapsed
+
+    return asyncio.run(write())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--db", required=True, help="libpq connection string")
+    parser.add_argument("--rtt-ms", type=float, default=20.0)
+    parser.add_argument("--rows", type=int, default=20_000)
+    parser.add_argument(
+        "--row-by-row", type=int, default=500, help="rows for the slow row-by-row run"
+    )
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--in-flight", type=int, default=500)
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+    db_args = conninfo_to_dict(args.db)
+    proxy = LatencyProxy(
+        db_args.get("host", "localhost"),
+        int(db_args.get("port", 5432)),
+        args.rtt_ms / 2000,
+    )
+    proxied = dict(db_args, host="127.0.0.1", port=proxy.port)
+
+    events = {"sql": Event(), "killall": Event()}
+    pipe = PostgresPipe(
+        proxied,
+        Queue(),
+        events,
+        logging.getLogger("SQL_Database"),
+        max_batch_size=args.batch_size,
+        pool=get_pool(proxied),
+    )
+    writer = PipelineWriter(proxied, logging.getLogger("SQL_Database"), args.in_flight)
+
+    results = [
+        (
+            "row by row",
+            args.row_by_row,
+            run_row_by_row(pipe, make_rows(0, args.row_by_row)),
+        ),
+        ("COPY batches", args.rows, run_copy(pipe, make_rows(args.rows, args.rows))),
+        (
+            "pipeline",
+            args.rows,
+            run_pipeline(writer, make_rows(2 * args.rows, args.rows), args.batch_size),
+        ),
+    ]
+    pipe.pool.close()
+
+    with psycopg.connect(args.db) as conn:
+        conn.execute(
+            psql.SQL("DELETE FROM {} WHERE tweet_id >= %s").format(
+                psql.Identifier("tweets")
+            ),
+            (FIRST_ID,),
+        )
+
+    print(f"rtt {args.rtt_ms} ms, batch {args.batch_size}, in flight {args.in_flight}")
+    print(f"{'writer':<16}{'rows':>10}{'seconds':>10}{'rows/s':>12}")
+    for name, n, elapsed in results:
+        print(f"{name:<16}{n:>10}{elapsed:>10.2f}{n / elapsed:>12.0f}")
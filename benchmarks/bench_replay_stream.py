@@ -0,0 +1,83 @@
+"""
+End to end load test of TweetStream against tools.replay_server.
+The stream, rules and users endpoints all come from the local server; only the
+Postgres writer is replaced by RecordingPipe.
+
+Run from the repo root:
+    python -m benchmarks.bench_replay_stream --tweets 100000 --rate 10000 --engine async
+"""
+
+# native
+import argparse
+import logging
+import os
+import threading
+import time
+
+# lib
+from benchmarks.common import RecordingPipe, attach, print_results, summarize
+from classes.classesv2 import TweetStream
+from tools.replay_server import ReplayServer, make_corpus
+
+
+class TimedHandler:
+    """
+    Wraps the real TwitterHandler streams to record when each tweet was read off the socket
+    """
+
+    def __init__(self, handler):
+        self.handler = handler
+        self.received = {}
+
+    def stream(self):
+        for json_response in self.handler.stream():
+            self.received[int(json_response["data"]["id"])] = time.perf_counter()
+            yield json_response
+
+    def stream_records(self):
+        for record in self.handler.stream_records():
+            self.received[record.tweet_id] = time.perf_counter()
+            yield record
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tweets", type=int, default=100_000)
+    parser.add_argument("--authors", type=int, default=500)
+    parser.add_argument("--rate", type=float, default=10_000)
+    parser.add_argument("--burst-every", type=float, default=0)
+    parser.add_argument("--burst-seconds", type=float, default=0)
+    parser.add_argument("--burst-factor", type=float, default=1)
+    parser.add_argument("--engine", choices=TweetStream.engines, default="async")
+    args = parser.parse_args()
+
+    os.makedirs("logs", exist_ok=True)
+    logging.disable(logging.INFO)
+
+    corpus, mapping = make_corpus(args.tweets, args.authors)
+    server = ReplayServer(
+        ("127.0.0.1", 0),
+        corpus,
+        rate=args.rate,
+        burst_every=args.burst_every,
+        burst_seconds=args.burst_seconds,
+        burst_factor=args.burst_factor,
+    )
+    server.start()
+
+    pipe = RecordingPipe(mapping, len(corpus))
+    stream = TweetStream(
+        "bench_token", None, engine=args.engine, sql_pipe=pipe, api_url=server.url
+    )
+    timed = TimedHandler(stream.handler)
+    attach(stream, stream.handler, pipe)
+    stream.handler = timed
+
+    runner = threading.Thread(target=stream.run, daemon=True)
+    runner.start()
+    pipe.done.wait()
+    stream.kill()
+    runner.join()
+    server.stop()
+
+    print_results([summarize(args.engine, timed.received, pipe.committed)])
@@ -0,0 +1,99 @@
+"""
+Measures the write-ahead spool: append rate of the writer stage with and without fsync,
+and drain rate for a range of drain batch sizes.
+The drain writes to a stand-in for PostgresPipe.execute_batch that costs a fixed commit time
+per batch and a copy time per row, so larger batches pay the commit less often.
+
+Run from the repo root:
+    python -m benchmarks.bench_spool --tweets 200000 --commit-ms 5 --row-us 2
+"""
+
+# native
+import argparse
+import logging
+import tempfile
+import time
+
+# lib
+from benchmarks.common import make_corpus
+from classes.spool import SpoolDrainer, WriteAheadSpool
+
+
+def make_batches(n: int, authors: int, batch_size: int) -> list[list[tuple]]:
+    corpus, mapping = make_corpus(n, authors)
+    rows = [
+        (
+            int(payload["data"]["id"]),
+            int(payload["data"]["author_id"]),
+            mapping[int(payload["data"]["author_id"])],
+            payload["data"]["text"],
+        )
+        for payload in corpus
+    ]
+    return [rows[i : i + batch_size] for i in range(0, len(rows), batch_size)]
+
+
+def append_rate(batches, fsync: bool) -> float:
+    with tempfile.TemporaryDirectory() as spool_dir:
+        spool = WriteAheadSpool(spool_dir, fsync=fsync)
+        start = time.perf_counter()
+        for batch in batches:
+            spool.append(batch)
+        elapsed = time.perf_counter() - start
+        spool.close()
+    return sum(len(batch) for batch in batches) / elapsed
+
+
+def drain_rate(batches, batch_rows: int, commit_delay: float, row_cost: float) -> dict:
+    total = sum(len(batch) for batch in batches)
+
+    def write_batch(rows):
+        time.sleep(commit_delay + row_cost * len(rows))
+        return True
+
+    with tempfile.TemporaryDirectory() as spool_dir:
+        spool = WriteAheadSpool(spool_dir, fsync=False)
+        # a backlog built up during an outage
+        for batch in batches:
+            spool.append(batch)
+        drainer = SpoolDrainer(
+            spool, write_batch, logging.getLogger("Spool"), batch_rows
+        )
+        start = time.perf_counter()
+        drainer.start()
+        while drainer.drained < total:
+            time.sleep(0.01)
+        elapsed = time.perf_counter() - start
+        drainer.stop()
+        spool.close()
+    return {"batch_rows": batch_rows, "batches": drainer.batches, "seconds": elapsed}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tweets", type=int, default=100_000)
+    parser.add_argument("--authors", type=int, default=500)
+    parser.add_argument("--batch-size", type=int, default=500, help="writer batch")
+    parser.add_argument("--commit-ms", type=float, default=5.0)
+    parser.add_argument("--row-us", type=float, default=2.0)
+    parser.add_argument(
+        "--drain-rows", type=int, nargs="+", default=[500, 2000, 5000, 20000]
+    )
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+    batches = make_batches(args.tweets, args.authors, args.batch_size)
+
+    print(f"{'append':<16}{'rows/s':>12}")
+    for fsync in (True, False):
+        name = "fsync" if fsync else "no fsync"
+        print(f"{name:<16}{append_rate(batches, fsync):>12.0f}")
+
+    print()
+    print(f"{'drain batch':<16}{'batches':>10}{'seconds':>10}{'rows/s':>12}")
+    for batch_rows in args.drain_rows:
+        r = drain_rate(batches, batch_rows, args.commit_ms / 1000, args.row_us / 1e6)
+        print(
+            f"{r['batch_rows']:<16}{r['batches']:>10}{r['seconds']:>10.2f}"
+            f"{args.tweets / r['seconds']:>12.0f}"
+        )
@@ -0,0 +1,100 @@
+"""
+Soak test for the stage worker loop.
+Every item is handed to a stage sitting on an empty queue, so each one is a full
+idle -> wake transition. Reports wake latency, stack depth and traced memory per interval.
+
+Run from the repo root:
+    python -m benchmarks.bench_stage_soak --transitions 1000000
+"""
+
+# native
+import argparse
+import logging
+from queue import Queue
+import statistics
+import sys
+from threading import Event, Thread
+import time
+import tracemalloc
+
+# lib
+from classes.stage import run_stage
+
+
+def frame_depth() -> int:
+    frame, depth = sys._getframe(1), 0
+    while frame is not None:
+        frame, depth = frame.f_back, depth + 1
+    return depth
+
+
+def soak(transitions: int, intervals: int, poll_interval: float) -> list[dict]:
+    work_q = Queue()
+    killall = Event()
+    handled = Event()
+    depth = {}
+
+    def handle(item):
+        depth["now"] = frame_depth()
+        handled.set()
+
+    stage = Thread(
+        target=run_stage,
+        args=(
+            "Soak",
+            lambda timeout: work_q.get(timeout=timeout),
+            handle,
+            killall,
+            logging.getLogger("Soak"),
+            None,
+            poll_interval,
+        ),
+        daemon=True,
+    )
+    stage.start()
+    tracemalloc.start()
+    results = []
+    per_interval = transitions // intervals
+    for interval in range(intervals):
+        latencies = []
+        for num in range(per_interval):
+            handled.clear()
+            start = time.perf_counter()
+            work_q.put(num)
+            handled.wait()
+            latencies.append(time.perf_counter() - start)
+        latencies.sort()
+        results.append(
+            {
+                "done": (interval + 1) * per_interval,
+                "p50 us": statistics.median(latencies) * 1e6,
+                "p99 us": latencies[int(len(latencies) * 0.99)] * 1e6,
+                "stack": depth["now"],
+                "traced kB": tracemalloc.get_traced_memory()[0] / 1024,
+            }
+        )
+    tracemalloc.stop()
+    killall.set()
+    stage.join()
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--transitions", type=int, default=200_000)
+    parser.add_argument("--intervals", type=int, default=10)
+    parser.add_argument(
+        "--poll", type=float, default=1.0, help="seconds between shutdown checks"
+    )
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    results = soak(args.transitions, args.intervals, args.poll)
+    print(
+        f"{'transitions':>12}{'p50 us':>10}{'p99 us':>10}{'stack':>8}{'traced kB':>12}"
+    )
+    for row in results:
+        print(
+            f"{row['done']:>12}{row['p50 us']:>10.1f}{row['p99 us']:>10.1f}"
+            f"{row['stack']:>8}{row['traced kB']:>12.1f}"
+        )
@@ -0,0 +1,117 @@
+"""Synthetic corpus and stand-in pipeline stages shared by the benchmarks"""
+
+# native
+import logging
+import statistics
+from threading import Event
+import time
+
+# lib
+from classes.classesv2 import PostgresPipe
+from classes.decoder import StreamRecord
+from tools.replay_server import make_corpus
+
+
+class SyntheticHandler:
+    """
+    Stands in for TwitterHandler, yields a prepared corpus and records when each tweet arrived
+    """
+
+    def __init__(self, corpus: list[dict], events: dict[str, Event] = None, rate=None):
+        self.corpus = corpus
+        self.events = events
+        self.rate = rate
+        self.received = {}
+
+    def stream(self):
+        interval = 1 / self.rate if self.rate else 0
+        start = time.perf_counter()
+        for num, json_response in enumerate(self.corpus):
+            if interval:
+                delay = start + num * interval - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            self.received[int(json_response["data"]["id"])] = time.perf_counter()
+            yield json_response
+
+    def stream_records(self):
+        for json_response in self.stream():
+            yield StreamRecord.from_payload(json_response)
+
+    def kill(self):
+        for event in ("local_db", "sql", "killall"):
+            self.events[event].set()
+
+
+class RecordingPipe(PostgresPipe):
+    """
+    PostgresPipe without a database, execute_SQL only records when each row was committed
+    """
+
+    def __init__(
+        self,
+        mapping: dict,
+        expected: int,
+        commit_delay: float = 0.0,
+        max_batch_size: int = 500,
+        max_linger: float = 0.05,
+    ):
+        self.mapping = mapping
+        self.max_batch_size = max_batch_size
+        self.max_linger = max_linger
+        self.expected = expected
+        self.commit_delay = commit_delay
+        self.committed = {}
+        self.done = Event()
+        self.db_q = None
+        self.events = None
+        self.spool = None
+        self.drainer = None
+        self.partition_months_ahead = None
+        self.logger = logging.getLogger("SQL_Database")
+
+    def download_user_mapping(self):
+        return dict(self.mapping)
+
+    def execute_SQL(self, insert_values):
+        self.execute_batch([insert_values])
+
+    def execute_batch(self, batch: list[tuple]) -> bool:
+        # one simulated commit per batch
+        if self.commit_delay:
+            time.sleep(self.commit_delay)
+        now = time.perf_counter()
+        for insert_values in batch:
+            self.committed[insert_values[0]] = now
+        if len(self.committed) >= self.expected:
+            self.done.set()
+        return True
+
+
+def attach(stream, handler: SyntheticHandler, pipe: RecordingPipe) -> None:
+    """Points the stand-ins at the queues and events the TweetStream created"""
+    handler.events = stream.events
+    pipe.events = stream.events
+    pipe.db_q = stream.db_q
+
+
+def summarize(name: str, received: dict, committed: dict) -> dict:
+    latencies = sorted(committed[k] - received[k] for k in committed)
+    elapsed = max(committed.values()) - min(received.values())
+    result = {
+        "name": name,
+        "tweets": len(committed),
+        "tweets_per_sec": len(committed) / elapsed,
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p99_ms": latencies[int(len(latencies) * 0.99) - 1] * 1000,
+    }
+    return result
+
+
+def print_results(results: list[dict]) -> None:
+    print(f"{'run':<24}{'tweets':>10}{'tweets/s':>14}{'p50 ms':>12}{'p99 ms':>12}")
+    for r in results:
+        print(
+            f"{r['name']:<24}{r['tweets']:>10}{r['tweets_per_sec']:>14.0f}"
+            f"{r['p50_ms']:>12.2f}{r['p99_ms']:>12.2f}"
+        )
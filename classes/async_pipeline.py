@@ -0,0 +1,151 @@
+# native
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import logging
+from threading import Semaphore
+import time
+
+
+class AsyncPipeline:
+    """
+    asyncio version of the TweetStream pipeline.
+    The stream reader, parse stage and writer stage are joined by asyncio Queues,
+    so each stage wakes up as soon as work arrives instead of polling.
+    The queues hold at most maxsize items, a full queue holds back the stage feeding it
+    down to the stream reader. Once killall is set the reader stops and the stages
+    finish what is queued.
+    A batch Postgres could not take is retried with backoff, holding the stages back until
+    it is stored. Once killall is set it gets exit_retries more tries before it is dropped.
+
+    Arguments:
+        fast_decode (bool): read StreamRecords instead of full dicts from the handler
+        writer (PipelineWriter): writes on the event loop in pipeline mode instead of
+                                 handing batches to sql_pipe on a thread [optional]
+        maxsize (int): items each queue holds before the stage feeding it waits
+        retry_interval (float): seconds to wait after a failed batch, doubled on every
+                                failure in a row up to max_retry_interval
+        exit_retries (int): tries left for a failing batch once killall is set
+    """
+
+    def __init__(
+        self,
+        handler,
+        database,
+        sql_pipe,
+        logger: logging.Logger,
+        fast_decode: bool = False,
+        writer=None,
+        maxsize: int = 100_000,
+        retry_interval: float = 1.0,
+        max_retry_interval: float = 60.0,
+        exit_retries: int = 3,
+    ):
+        self.handler = handler
+        self.database = database
+        self.sql_pipe = sql_pipe
+        self.logger = logger
+        self.fast_decode = fast_decode
+        self.writer = writer
+        self.maxsize = maxsize
+        self.retry_interval = retry_interval
+        self.max_retry_interval = max_retry_interval
+        self.exit_retries = exit_retries
+        self.dropped = 0
+        # tweet_q is filled from the reader thread, which cannot await a full queue
+        self.slots = Semaphore(maxsize)
+        self.killall = database.events["killall"]
+
+    def read_stream(self, loop: asyncio.AbstractEventLoop, tweet_q: asyncio.Queue):
+        """
+        Pushes every stream response onto tweet_q.
+        requests has no async API, so this runs on its own thread and hands
+        responses over to the event loop, waiting while tweet_q is full;
+        None marks the end of the stream.
+        """
+        stream = (
+            self.handler.stream_records() if self.fast_decode else self.handler.stream()
+        )
+        try:
+            for json_response in stream:
+                if self.killall.is_set():
+                    break
+                # a slot of tweet_q, given back by parse
+                self.slots.acquire()
+                loop.call_soon_threadsafe(tweet_q.put_nowait, json_response)
+        finally:
+            self.logger.warning("Stream reader finished")
+            loop.call_soon_threadsafe(tweet_q.put_nowait, None)
+
+    async def parse(self, tweet_q: asyncio.Queue, db_q: asyncio.Queue) -> None:
+        while True:
+            json_obj = await tweet_q.get()
+            if json_obj is None:
+                await db_q.put(None)
+                break
+            self.slots.release()
+            row = self.database.extract_row(json_obj)
+            if row is not None and not self.database.is_duplicate(row[0]):
+                await db_q.put(row)
+
+    def write_rows(self, rows: list[tuple]) -> None:
+        batch_size = self.sql_pipe.max_batch_size
+        for i in range(0, len(rows), batch_size):
+            self.write_batch(rows[i : i + batch_size])
+
+    def write_batch(self, batch: list[tuple]) -> bool:
+        """
+        Stores a batch, retrying while Postgres cannot be reached.
+        Returns False if the batch was dropped at shutdown.
+        """
+        delay = self.retry_interval
+        exit_tries = 0
+        while not self.sql_pipe.execute_batch(batch):
+            if self.killall.is_set():
+                exit_tries += 1
+                if exit_tries > self.exit_retries:
+                    self.dropped += len(batch)
+                    self.logger.error(
+                        f"Dropping {len(batch)} rows, Postgres unreachable at shutdown"
+                    )
+                    return False
+                delay = min(delay, self.retry_interval)
+            self.logger.warning(
+                f"Batch of {len(batch)} rows not stored, retrying in {delay:.1f}s"
+            )
+            time.sleep(delay)
+            delay = min(delay * 2, self.max_retry_interval)
+        return True
+
+    async def offload(self, db_q: asyncio.Queue) -> None:
+        loop = asyncio.get_running_loop()
+        finished = False
+        # one writer thread keeps batches in the order they were parsed
+        with ThreadPoolExecutor(1) as executor:
+            while not finished:
+                rows = [await db_q.get()]
+                # hand everything already queued to the writer thread in one hop
+                while not db_q.empty():
+                    rows.append(db_q.get_nowait())
+                if rows[-1] is None:
+                    rows.pop()
+                    finished = True
+                if rows and self.writer is not None:
+                    await self.writer.write(rows)
+                elif rows:
+                    await loop.run_in_executor(executor, self.write_rows, rows)
+        self.logger.warning("Async writer finished")
+
+    async def run(self) -> None:
+        loop = asyncio.get_running_loop()
+        tweet_q = asyncio.Queue()
+        db_q = asyncio.Queue(self.maxsize)
+        try:
+            with ThreadPoolExecutor(1) as reader:
+                await asyncio.gather(
+                    loop.run_in_executor(reader, self.read_stream, loop, tweet_q),
+                    self.parse(tweet_q, db_q),
+                    self.offload(db_q),
+                )
+        finally:
+            if self.writer is not None:
+                await self.writer.close()
@@ -0,0 +1,211 @@
+"""
+Backfill of the tweets posted while the stream was disconnected.
+Every DisconnectWindow recorded by the StreamSupervisor is turned into recent-search queries
+(from:a OR from:b ..., packed up to the query length limit) or one user-timeline request per
+tracked account. The requests run concurrently, paced by the handler's rate limit scheduler,
+and the tweets found are merged into the tweets table, skipping the ones already stored.
+A window can only be fetched in full once its padded end is MIN_END_AGE seconds in the past,
+see ready_at().
+"""
+
+# native
+from concurrent.futures import ThreadPoolExecutor
+import logging
+import time
+
+# packages
+import psycopg.sql as psql
+from psycopg_pool import ConnectionPool
+
+# lib
+from .supervisor import DisconnectWindow
+
+# recent search only goes back 7 days, and end_time has to be 10 seconds in the past
+SEARCH_HORIZON = 7 * 24 * 60 * 60
+MIN_END_AGE = 10
+
+
+def iso_time(ts: float) -> str:
+    return time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(ts))
+
+
+class Backfill:
+    """
+    Arguments:
+        handler (TwitterHandler): sends the paced API requests
+        pool  (ConnectionPool): Postgres pool holding id_name_mapping and tweets
+        mode             (str): "search" for recent search, "timeline" for user timelines
+        max_workers      (int): requests in flight at once
+        padding        (float): seconds added on both sides of a window, a stall is only
+                                noticed once the stream read timeout runs out
+        max_query_length (int): longest recent-search query the API accepts
+    """
+
+    modes = ("search", "timeline")
+
+    def __init__(
+        self,
+        handler,
+        pool: ConnectionPool,
+        logger: logging.Logger,
+        mode: str = "search",
+        max_workers: int = 4,
+        padding: float = 90,
+        max_query_length: int = 512,
+    ):
+        if mode not in self.modes:
+            raise ValueError(
+                f"Unknown backfill mode {mode}, expected one of {self.modes}"
+            )
+        self.handler = handler
+        self.pool = pool
+        self.logger = logger
+        self.mode = mode
+        self.max_workers = max_workers
+        self.padding = padding
+        self.max_query_length = max_query_length
+
+    def tracked_users(self) -> dict:
+        """
+        user_id -> user_name of every account in id_name_mapping
+        """
+        with self.pool.connection() as conn:
+            cur = conn.cursor()
+            cur.execute(
+                psql.SQL("SELECT user_id,user_name FROM {};").format(
+                    psql.Identifier("id_name_mapping")
+                )
+            )
+            return dict(cur.fetchall())
+
+    def search_queries(self, usernames: list[str]) -> list[str]:
+        queries = []
+        query = ""
+        for name in sorted(usernames, key=len):
+            term = f"from:{name}"
+            if query and len(query) + 4 + len(term) > self.max_query_length:
+                queries.append(query)
+                query = ""
+            query = f"{query} OR {term}" if query else term
+        if query:
+            queries.append(query)
+        return queries
+
+    def ready_at(self, window: DisconnectWindow) -> float:
+        """
+        Epoch seconds from which the whole of a closed window can be fetched
+        """
+        return window.end + self.padding + MIN_END_AGE
+
+    def time_range(self, window: DisconnectWindow) -> tuple or None:
+        """
+        (start_time, end_time) to fetch for a window, None when nothing can be fetched
+        """
+        now = time.time()
+        start = window.start - self.padding
+        wanted = (window.end or now) + self.padding
+        end = min(wanted, now - MIN_END_AGE)
+        if window.end is not None and end < wanted:
+            self.logger.warning(
+                f"Window {window.get_dict()} backfilled before it is ready, "
+                f"its last {wanted - end:.0f}s are left out"
+            )
+        if self.mode == "search":
+            start = max(start, now - SEARCH_HORIZON + 60)
+        if end <= start:
+            self.logger.warning(f"Window {window.get_dict()} is out of reach")
+            return None
+        return iso_time(start), iso_time(end)
+
+    def plan(self, windows: list[DisconnectWindow], users: dict) -> list[tuple]:
+        """
+        (url, params) for the first page of every request the windows need
+        """
+        api_url = self.handler.api_url
+        fields = {"tweet.fields": "author_id,created_at", "max_results": 100}
+        planned = []
+        for window in windows:
+            time_range = self.time_range(window)
+            if time_range is None:
+                continue
+            params = dict(fields, start_time=time_range[0], end_time=time_range[1])
+            if self.mode == "search":
+                for query in self.search_queries(list(users.values())):
+                    planned.append(
+                        (f"{api_url}/2/tweets/search/recent", dict(params, query=query))
+                    )
+            else:
+                for user_id in users:
+                    planned.append((f"{api_url}/2/users/{user_id}/tweets", params))
+        return planned
+
+    def fetch(self, url: str, params: dict) -> list[dict]:
+        """
+        Every page of one request, a failing request keeps the pages fetched before it
+        """
+        token_param = "next_token" if self.mode == "search" else "pagination_token"
+        tweets = []
+        while True:
+            try:
+                response = self.handler.get_from_endpoint(url, params)
+            except Exception as err:
+                self.logger.error(f"Backfill request {url} {params} failed: {err}")
+                return tweets
+            tweets.extend(response.get("data", []))
+            token = response.get("meta", {}).get("next_token")
+            if token is None:
+                return tweets
+            params = dict(params, **{token_param: token})
+
+    def store(self, rows: list[tuple]) -> int:
+        """
+        Inserts the rows that are not in the tweets table yet, returns how many were new
+        """
+        if not rows:
+            return 0
+        with self.pool.connection() as conn:
+            cur = conn.cursor()
+            cur.executemany(
+                psql.SQL(
+                    "INSERT INTO {} (tweet_id,author_id,author_name,tweet_text) "
+                    "VALUES (%s,%s,%s,%s) ON CONFLICT (tweet_id) DO NOTHING;"
+                ).format(psql.Identifier("tweets")),
+                rows,
+            )
+            inserted = cur.rowcount
+            conn.commit()
+        return inserted
+
+    def run(self, windows: list[DisconnectWindow], users: dict = None) -> dict:
+        """
+        Fetches and stores the tweets missed in windows, returns what it did
+        """
+        started = time.perf_counter()
+        users = users if users is not None else self.tracked_users()
+        planned = self.plan(windows, users)
+        self.logger.info(
+            f"Backfilling {len(windows)} windows with {len(planned)} {self.mode} requests"
+        )
+        with ThreadPoolExecutor(self.max_workers) as executor:
+            pages = list(executor.map(lambda request: self.fetch(*request), planned))
+
+        rows = {}
+        for tweet in (tweet for page in pages for tweet in page):
+            author_id = int(tweet["author_id"])
+            if author_id in users:
+                rows[int(tweet["id"])] = (
+                    int(tweet["id"]),
+                    author_id,
+                    users[author_id],
+                    tweet["text"].replace("\n", ""),
+                )
+        inserted = self.store(list(rows.values()))
+        stats = {
+            "windows": len(windows),
+            "requests": len(planned),
+            "fetched": len(rows),
+            "inserted": inserted,
+            "seconds": time.perf_counter() - started,
+        }
+        self.logger.info(f"Backfill done {stats}")
+        return stats
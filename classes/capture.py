@@ -0,0 +1,135 @@
+"""
+Raw capture of the filtered stream.
+Every stream line is appended with its receive time to gzip segment files that rotate on
+size or age, so history can be re-ingested after schema changes without refetching.
+
+Segment records are one per line:
+    <receive time, epoch seconds>\\t<raw stream line>\\n
+Segments are written as .part files and renamed once closed, so readers only see complete files.
+"""
+
+# native
+import gzip
+import logging
+import os
+import queue
+from threading import Thread
+import time
+
+SEGMENT_SUFFIX = ".jsonl.gz"
+
+
+class StreamCapture:
+    """
+    Buffers raw stream lines in memory and writes them from a background thread,
+    write() never blocks the stream reader.
+
+    Arguments:
+        capture_dir       (str): directory for the segment files
+        max_segment_bytes (int): compressed size at which a segment is rotated
+        max_segment_age (float): seconds after which a segment is rotated
+        compresslevel     (int): gzip level, low levels keep up with bursts more easily
+    """
+
+    def __init__(
+        self,
+        capture_dir: str,
+        logger: logging.Logger,
+        max_segment_bytes: int = 64 * 1024 * 1024,
+        max_segment_age: float = 60 * 60,
+        compresslevel: int = 3,
+    ):
+        self.capture_dir = capture_dir
+        self.logger = logger
+        self.max_segment_bytes = max_segment_bytes
+        self.max_segment_age = max_segment_age
+        self.compresslevel = compresslevel
+        self.lines = queue.SimpleQueue()
+        self.segment = None
+        self.segment_path = None
+        self.segment_started = 0
+        self.segment_count = 0
+        self.captured = 0
+        os.makedirs(capture_dir, exist_ok=True)
+        self.writer = Thread(target=self.write_segments, daemon=True)
+        self.writer.start()
+
+    def write(self, line: bytes) -> None:
+        self.lines.put((time.time(), line))
+
+    def close(self) -> None:
+        """
+        Writes out everything still buffered and closes the current segment
+        """
+        if self.writer.is_alive():
+            self.lines.put(None)
+            self.writer.join()
+
+    def open_segment(self) -> None:
+        timestr = time.strftime("%Y%m%d-%H%M%S")
+        name = f"stream-{timestr}-{self.segment_count:06d}{SEGMENT_SUFFIX}"
+        self.segment_path = os.path.join(self.capture_dir, name)
+        self.raw_file = open(self.segment_path + ".part", "wb")
+        self.segment = gzip.GzipFile(
+            fileobj=self.raw_file, mode="wb", compresslevel=self.compresslevel
+        )
+        self.segment_started = time.monotonic()
+        self.segment_count += 1
+
+    def close_segment(self) -> None:
+        if self.segment is None:
+            return
+        self.segment.close()
+        self.raw_file.close()
+        os.replace(self.segment_path + ".part", self.segment_path)
+        self.logger.info(f"Closed capture segment {self.segment_path}")
+        self.segment = None
+
+    def needs_rotation(self) -> bool:
+        return (
+            self.raw_file.tell() >= self.max_segment_bytes
+            or time.monotonic() - self.segment_started >= self.max_segment_age
+        )
+
+    def write_segments(self) -> None:
+        running = True
+        while running:
+            try:
+                batch = [self.lines.get(timeout=1)]
+            except queue.Empty:
+                batch = []
+            while len(batch) < 10_000:
+                try:
+                    batch.append(self.lines.get_nowait())
+                except queue.Empty:
+                    break
+            if None in batch:
+                running = False
+                batch = batch[: batch.index(None)]
+            if batch:
+                if self.segment is None:
+                    self.open_segment()
+                self.segment.write(
+                    b"".join(b"%.6f\t%s\n" % (ts, line) for ts, line in batch)
+                )
+                self.captured += len(batch)
+            if self.segment is not None and (not running or self.needs_rotation()):
+                self.close_segment()
+
+
+def list_segments(capture_dir: str) -> list[str]:
+    """
+    Returns the finished segments in capture_dir, oldest first
+    """
+    names = sorted(f for f in os.listdir(capture_dir) if f.endswith(SEGMENT_SUFFIX))
+    return [os.path.join(capture_dir, name) for name in names]
+
+
+def read_segment(path: str):
+    """
+    Yields (receive time, raw stream line) for every record in a segment
+    """
+    with gzip.open(path, "rb") as f:
+        for record in f:
+            ts, _, line = record.rstrip(b"\n").partition(b"\t")
+            yield float(ts), line
@@ -1,7 +1,9 @@
 # native
+import asyncio
 import atexit
 from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
+from datetime import datetime, timezone
 from http.client import responses
 import json
 import logging
@@ -10,32 +12,140 @@ import pickle
 import queue
 from queue import Queue
 import requests
+from requests.adapters import HTTPAdapter
 import sqlite3
-from threading import Event
+from threading import Event, Thread, Timer
 import time
 import warnings
 
 # packages
 import psycopg
 import psycopg.sql as psql
+from psycopg_pool import ConnectionPool, PoolTimeout
+from urllib3.util.retry import Retry
 
 # lib
 from . import PG_ARGS
+from .async_pipeline import AsyncPipeline
+from .backfill import Backfill
+from .capture import StreamCapture
+from .compact_mapping import CompactMapping
+from .db_pool import get_pool
+from .decoder import StreamNotice, StreamRecord, decode_line, included_user
+from .dedupe import RecentIdFilter
+from .framing import LineFramer
+from .log_queue import (
+    NameFilter,
+    SampledLogger,
+    StructuredFormatter,
+    start_queue_logging,
+    stop_queue_logging,
+)
+from .mapping_refresh import MappingRefresher
+from .mapping_snapshot import load_snapshot, write_snapshot
+from .mapping_writer import MappingWriter
+from .parse_workers import ParseWorkerPool
+from .partitions import create_partitions, is_partitioned, month_start
+from .pipeline_writer import PipelineWriter
+from .rate_limit import RateLimitScheduler
+from .spill_queue import SpillQueue
+from .spool import SpoolDrainer, WriteAheadSpool
+from .stage import run_stage
+from .supervisor import StreamSupervisor
 
 
 class TwitterHandler:
     """
     Python Object to control TwitterAPIv2 stream
+
+    All requests go through one keep-alive session, so consecutive calls reuse
+    the same TCP+TLS connection instead of handshaking every time.
+
+    Arguments:
+        pool_size       (int): connections kept open per host
+        timeout       (tuple): (connect, read) timeout in seconds for API calls
+        stream_timeout(tuple): (connect, read) timeout for the stream, the read timeout
+                               must stay above the 20 second heartbeat interval, a
+                               supervisor's stall_timeout caps it
+        retries         (int): retries for failed GETs, other methods are never retried
+        max_429_retries (int): times a request waits out a 429 before giving up
+        api_url         (str): base url of the API, point it at tools.replay_server for load tests
+        capture (StreamCapture): records every raw stream line [optional]
+        supervisor (StreamSupervisor): reconnects a dropped or stalled stream [optional,
+                                       without one the pipeline is killed when the stream ends]
+
+    Requests are paced per endpoint by a RateLimitScheduler fed from the x-rate-limit
+    headers; rate_limits.budget() shows what is left of each endpoint's window.
     """
 
     def __init__(
-        self, bearer_token: str, events: dict[str, Event], logger: logging.Logger
+        self,
+        bearer_token: str,
+        events: dict[str, Event],
+        logger: logging.Logger,
+        pool_size: int = 10,
+        timeout: tuple = (3.05, 30),
+        stream_timeout: tuple = (3.05, 30),
+        retries: int = 3,
+        max_429_retries: int = 3,
+        api_url: str = "https://api.twitter.com",
+        capture: StreamCapture = None,
+        supervisor: StreamSupervisor = None,
     ):
         # To set your enviornment variables in your terminal run the following line:
         # export 'BEARER_TOKEN'='<your_bearer_token>'
         self.bearer_token = bearer_token
         self.logger = logger
         self.events = events
+        self.api_url = api_url.rstrip("/")
+        self.capture = capture
+        self.supervisor = supervisor
+        self.notices = 0
+        self.timeout = timeout
+        self.stream_timeout = stream_timeout
+        self.session = self.create_session(pool_size, retries)
+        self.max_429_retries = max_429_retries
+        self.rate_limits = RateLimitScheduler(logger)
+
+    def create_session(self, pool_size: int, retries: int) -> requests.Session:
+        session = requests.Session()
+        session.auth = self.bearer_oauth
+        retry = Retry(
+            total=retries,
+            backoff_factor=0.5,
+            status_forcelist=(500, 502, 503, 504),
+            allowed_methods=frozenset(["GET"]),
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(
+            pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry
+        )
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        return session
+
+    def close(self):
+        self.session.close()
+
+    def request(self, method: str, url: str, **kwargs) -> requests.Response:
+        """
+        Sends a request once the endpoint has rate limit budget left.
+        A 429 response marks the endpoint empty until its reset time and the request is retried.
+        """
+        for _ in range(self.max_429_retries + 1):
+            self.rate_limits.acquire(url, method)
+            try:
+                response = self.session.request(method, url, **kwargs)
+            except Exception:
+                self.rate_limits.release(url, method)
+                raise
+            self.rate_limits.update(url, response.headers, method)
+            if response.status_code != 429:
+                return response
+            reset = response.headers.get("x-rate-limit-reset")
+            self.rate_limits.exhaust(url, float(reset) if reset else None, method)
+            self.logger.warning(f"429 received from {url}, retrying after reset")
+        return response
 
     def bearer_oauth(self, r):
         """
@@ -53,7 +163,7 @@ class TwitterHandler:
             url     (str): the url genereated by a function
             params  (str): parameters that need to be passed with the url [optional]
         """
-        response = requests.request("GET", url, auth=self.bearer_oauth, params=params)
+        response = self.request("GET", url, params=params, timeout=self.timeout)
         if response.status_code != 200:
             raise Exception(
                 "Request returned an error: {} {}".format(
@@ -63,7 +173,7 @@ class TwitterHandler:
         return response.json()
 
     def post_to_endpoint(self, url: str, payload: dict) -> dict:
-        response = requests.post(url, auth=self.bearer_oauth, json=payload)
+        response = self.request("POST", url, json=payload, timeout=self.timeout)
         # if response.status_code != 200 or response.status_code != 201:
         #     raise Exception(
         #         "Cannot delete rules (HTTP {}): {}".format(
@@ -76,7 +186,7 @@ class TwitterHandler:
         """
         Gets the current deployed rules on the stream associated with the current BEARER_TOKEN
         """
-        url = "https://api.twitter.com/2/tweets/search/stream/rules"
+        url = f"{self.api_url}/2/tweets/search/stream/rules"
         response = self.get_from_endpoint(url)
         self.logger.debug(f"Rule Get Response: {json.dumps(response)}")
         try:
@@ -99,7 +209,7 @@ class TwitterHandler:
 
         ids = list(map(lambda rule: rule["id"], rules_response["data"]))
         payload = {"delete": {"ids": ids}}
-        url = "https://api.twitter.com/2/tweets/search/stream/rules"
+        url = f"{self.api_url}/2/tweets/search/stream/rules"
         response = self.post_to_endpoint(url, payload)
 
         try:
@@ -115,7 +225,7 @@ class TwitterHandler:
             ids (list):
         """
         payload = {"delete": {"ids": ids}}
-        url = "https://api.twitter.com/2/tweets/search/stream/rules"
+        url = f"{self.api_url}/2/tweets/search/stream/rules"
 
         response = self.post_to_endpoint(url, payload)
         self.logger.debug(f"Rule Deletion Response: {json.dumps(response)}")
@@ -125,7 +235,7 @@ class TwitterHandler:
         Adds given rules to the stream associated with the current BEARER_TOKEN
         """
         payload = {"add": rules}
-        url = "https://api.twitter.com/2/tweets/search/stream/rules"
+        url = f"{self.api_url}/2/tweets/search/stream/rules"
         response = self.post_to_endpoint(url, payload).json()
         self.logger.debug(f"Rule Addition Respone: {json.dumps(response)}")
         try:
@@ -155,14 +265,83 @@ class TwitterHandler:
         """
         Connects to the stream associated with the current BEARER_TOKEN
         """
+        for frame in self.tweet_frames():
+            json_response = json.loads(frame.tobytes())
+            self.logger.debug("json respone: %s", json_response)
+            yield json_response
+
+    def stream_records(self):
+        """
+        Connects to the stream associated with the current BEARER_TOKEN and yields
+        a StreamRecord for every tweet
+        """
+        for frame in self.stream_frames():
+            record = decode_line(frame)
+            if isinstance(record, StreamNotice):
+                self.handle_notice(record)
+            elif record is not None:
+                yield record
+
+    def stream_lines(self):
+        """
+        Connects to the stream associated with the current BEARER_TOKEN and yields the raw lines,
+        heartbeats and notices are skipped
+        """
+        for frame in self.tweet_frames():
+            yield frame.tobytes()
+
+    def tweet_frames(self):
+        """
+        stream_frames without the frames that hold no tweet.
+        Tweets start with their data, anything else is decoded to tell a notice from a tweet.
+        """
+        for frame in self.stream_frames():
+            if frame[:8] != b'{"data":' and not self.is_tweet(frame):
+                continue
+            yield frame
+
+    def is_tweet(self, frame) -> bool:
+        record = decode_line(frame)
+        if isinstance(record, StreamNotice):
+            self.handle_notice(record)
+        return isinstance(record, StreamRecord)
+
+    def handle_notice(self, notice: StreamNotice) -> None:
+        """
+        Logs an error or disconnect message of the stream, a disconnect becomes the reason of
+        the supervisor's next disconnect window
+        """
+        self.notices += 1
+        if not notice.disconnect:
+            self.logger.error(f"Stream error: {notice.summary()}")
+            return
+        self.logger.error(f"Stream disconnect announced: {notice.summary()}")
+        if self.supervisor is not None:
+            self.supervisor.announce(notice.summary())
+
+    def stream_frames(self):
+        """
+        Connects to the stream associated with the current BEARER_TOKEN and yields every record
+        as a memoryview into the framing buffer, valid until the next record is requested.
+        With a supervisor the stream is reopened whenever it drops or stalls.
+        """
+        if self.supervisor is None:
+            yield from self.read_frames(self.open_stream())
+        else:
+            yield from self.supervisor.supervise(self.open_stream, self.read_frames)
+        self.logger.error("STREAM BROKEN! ATTEMPTING TO TERMINATE!")
+        self.kill()
+
+    def open_stream(self) -> requests.Response:
         # response = requests.get(
         #     "https://api.twitter.com/2/tweets/search/stream", auth=self.bearer_oauth, stream=True,
         # )
 
-        response = requests.get(
-            "https://api.twitter.com/2/tweets/search/stream?expansions=author_id",
-            auth=self.bearer_oauth,
+        response = self.request(
+            "GET",
+            f"{self.api_url}/2/tweets/search/stream?expansions=author_id",
             stream=True,
+            timeout=(self.stream_timeout[0], self.stall_timeout()),
         )
 
         if response.status_code != 200:
@@ -176,14 +355,37 @@ class TwitterHandler:
                     response.status_code, response.text
                 )
             )
+        return response
 
-        for response_line in response.iter_lines():
-            if response_line:
-                json_response = json.loads(response_line)
-                self.logger.debug(f"json respone: {json_response}")
-                yield json_response
-        self.logger.error("STREAM BROKEN! ATTEMPTING TO TERMINATE!")
-        self.kill()
+    def stall_timeout(self) -> float:
+        """
+        Seconds without a record or heartbeat before the stream counts as stalled
+        """
+        if self.supervisor is None:
+            return self.stream_timeout[1]
+        return min(self.stream_timeout[1], self.supervisor.stall_timeout)
+
+    def read_frames(self, response: requests.Response):
+        framer = LineFramer(logger=self.logger)
+        stall_timeout = self.stall_timeout()
+        heartbeats = 0
+        last_heard = time.monotonic()
+        # chunk_size=None hands over whatever arrived, however it splits the records
+        for chunk in response.iter_content(chunk_size=None):
+            for frame in framer.feed(chunk):
+                if self.capture is not None:
+                    self.capture.write(frame.tobytes())
+                yield frame
+                # time spent downstream is not silence
+                last_heard = time.monotonic()
+            if framer.heartbeats != heartbeats:
+                heartbeats = framer.heartbeats
+                last_heard = time.monotonic()
+            elif time.monotonic() - last_heard > stall_timeout:
+                # the read timeout only catches a socket with no bytes at all
+                raise requests.exceptions.ReadTimeout(
+                    f"Stream timed out, no record or heartbeat for {stall_timeout}s"
+                )
 
     def kill(self):
         self.logger.warning("Setting local_db flag")
@@ -236,31 +438,6 @@ class SQLlitePipe:
         self.logger = logger
         self.sleep_status = True
 
-    # --- adapted from realpython.org
-    # --- https://realpython.com/python-sleep/
-    def sleep_db(timeout, retry=3):
-        def the_real_decorator(function):
-            def wrapper(self, *args, **kwargs):
-                retries = 0
-                while retries < retry:
-                    try:
-                        value = function(self, *args, **kwargs)
-                        if value is None:
-                            return
-                    except:
-                        self.logger.info(f"Sleeping SQL for {timeout} seconds")
-                        time.sleep(timeout)
-                        retries += 1
-                self.logger.info("Sleeping SQL DB")
-                self.events["sql"].clear()
-                self.wait_to_wake()
-
-            return wrapper
-
-        return the_real_decorator
-
-    # ---
-
     def download_user_mapping(self):
         user_mapping = {}
         with sqlite3.connect(self.db_path) as conn:
@@ -272,25 +449,12 @@ class SQLlitePipe:
     def get_sleep_status(self):
         return self.sleep_status
 
-    def wait_to_wake(self):
-        # while self.sleep_status:
-        #     time.sleep(60)
-        #     self.logger.info("Checking for Queue status")
-        #     self.logger.info(f"Queue is empty: {self.db_q.empty()}")
-        self.logger.info("Waiting...")
-        self.events["sql"].wait()
-        if self.events["killall"].is_set():
-            self.logger.error("Kill command received while waiting to wake")
-            self.logger.error("No longer attempting to connect to queue (SQLite)!")
-        else:
-            self.connect_to_queue()
-
     def execute_SQL(self, insert_values):
         self.logger.info("Executing SQL Commands")
         with sqlite3.connect(self.db_path) as conn:
             try:
                 conn.execute(
-                    """INSERT INTO TWEETS (TWEET_ID,AUTHOR_ID,AUTHOR_NAME,TWEET_TEXT) VALUES (?,?,?,?)""",
+                    """INSERT OR IGNORE INTO TWEETS (TWEET_ID,AUTHOR_ID,AUTHOR_NAME,TWEET_TEXT) VALUES (?,?,?,?)""",
                     insert_values,
                 )
                 conn.commit()
@@ -300,62 +464,61 @@ class SQLlitePipe:
                 conn.commit()
             self.logger.info("Change Commited")
 
-    # @sleep_db(timeout=10)
     def connect_to_queue(self):
-        self.logger.debug(f"SQL Thread Unlocked:{self.events['sql'].is_set()}")
-        self.events["sql"].wait()
         self.logger.debug("Got to connect_to_queue function SQL")
-        while self.db_q:
-            try:
-                sql_values = self.db_q.get(timeout=10)
-                self.logger.debug(f"parsing values: {sql_values}")
-                self.execute_SQL(sql_values)
-            except queue.Empty:
-                self.logger.info("Queue is empty, sleeping")
-                self.logger.info("Sleeping SQL DB")
-                self.events["sql"].clear()
-                self.wait_to_wake()
-
-                # raise queue.Empty
+        run_stage(
+            "SQL",
+            lambda timeout: self.db_q.get(timeout=timeout),
+            self.execute_SQL,
+            self.events["killall"],
+            self.logger,
+            self.events.get("parsed"),
+        )
 
 
 class PostgresPipe:
-    def __init__(self, db_args, db_q, events: dict[str, Event], logger: logging.Logger):
+    """
+    Writes parsed tweets from db_q into the tweets table.
+    Rows are pulled off the queue in batches of at most max_batch_size, waiting at most
+    max_linger seconds for a batch to fill, and each batch is loaded with one COPY and one commit.
+
+    Arguments:
+        spool (WriteAheadSpool): batches are appended to the spool instead, and a SpoolDrainer
+                                 stores them in batches of drain_batch_rows once Postgres
+                                 takes them [optional, batches are written directly]
+        partition_months_ahead (int): if tweets is partitioned, keep partitions created
+                                      this many months ahead, None leaves them alone
+    """
+
+    def __init__(
+        self,
+        db_args,
+        db_q,
+        events: dict[str, Event],
+        logger: logging.Logger,
+        max_batch_size: int = 500,
+        max_linger: float = 0.05,
+        pool: ConnectionPool = None,
+        spool: WriteAheadSpool = None,
+        drain_batch_rows: int = 5000,
+        partition_months_ahead: int = 3,
+    ):
         self.db_args = db_args
-        self.connection = psycopg.connect(**self.db_args)
+        self.pool = pool or get_pool(self.db_args)
         self.db_q = db_q
         self.events = events
         self.logger = logger
         self.sleep_status = True
-
-    # --- adapted from realpython.org
-    # --- https://realpython.com/python-sleep/
-    def sleep_db(timeout, retry=3):
-        def the_real_decorator(function):
-            def wrapper(self, *args, **kwargs):
-                retries = 0
-                while retries < retry:
-                    try:
-                        value = function(self, *args, **kwargs)
-                        if value is None:
-                            return
-                    except:
-                        self.logger.info(f"Sleeping SQL for {timeout} seconds")
-                        time.sleep(timeout)
-                        retries += 1
-                self.logger.info("Sleeping SQL DB")
-                self.events["sql"].clear()
-                self.wait_to_wake()
-
-            return wrapper
-
-        return the_real_decorator
-
-    # ---
+        self.max_batch_size = max_batch_size
+        self.max_linger = max_linger
+        self.spool = spool
+        self.drain_batch_rows = drain_batch_rows
+        self.drainer = None
+        self.partition_months_ahead = partition_months_ahead
 
     def download_user_mapping(self):
         user_mapping = {}
-        with self.connection as conn:
+        with self.pool.connection() as conn:
             cur = conn.cursor()
             try:
                 cur.execute(
@@ -380,53 +543,147 @@ class PostgresPipe:
     def get_sleep_status(self):
         return self.sleep_status
 
-    def wait_to_wake(self):
-        # while self.sleep_status:
-        #     time.sleep(60)
-        #     self.logger.info("Checking for Queue status")
-        #     self.logger.info(f"Queue is empty: {self.db_q.empty()}")
-        self.logger.info("Waiting...")
-        self.events["sql"].wait()
-        if self.events["killall"].is_set():
-            self.logger.error("Kill command received while waiting to wake")
-            self.logger.error("No longer attempting to connect to queue (Postgres)!")
-        else:
-            self.connect_to_queue()
-
     def execute_SQL(self, insert_values):
         self.logger.info("Executing SQL Commands")
-        with self.connection as conn:
-            cur = conn.cursor()
-            try:
+        try:
+            with self.pool.connection() as conn:
+                cur = conn.cursor()
+                try:
+                    cur.execute(
+                        psql.SQL(
+                            """INSERT INTO {} (tweet_id,author_id,author_name,tweet_text) VALUES (%s,%s,%s,%s) ON CONFLICT (tweet_id) DO NOTHING"""
+                        ).format(psql.Identifier("tweets")),
+                        insert_values,
+                    )
+                    conn.commit()
+                    self.logger.info("Change Commited")
+                except psycopg.Error as err:
+                    self.logger.error(f"Failure to add data {err}")
+                    conn.rollback()
+        except PoolTimeout as err:
+            self.logger.error(f"Failure to add data, no connection available {err}")
+
+    def execute_batch(self, batch: list[tuple]) -> bool:
+        """
+        Loads a batch of rows with a single COPY and commit.
+        The COPY goes into a temporary staging table and is merged with ON CONFLICT DO NOTHING,
+        so tweets already stored (reconnects, backfills, replays) are skipped instead of
+        aborting the batch. If the batch still fails, it is rolled back and each row is
+        retried on its own, so only the bad rows are dropped.
+        Returns False if Postgres could not be reached and nothing was stored.
+        """
+        self.logger.info(f"Copying batch of {len(batch)} rows")
+        try:
+            with self.pool.connection() as conn:
+                cur = conn.cursor()
+                # one per connection, emptied by every commit
                 cur.execute(
                     psql.SQL(
-                        """INSERT INTO {} (tweet_id,author_id,author_name,tweet_text) VALUES (%s,%s,%s,%s)"""
-                    ).format(psql.Identifier("tweets")),
-                    insert_values,
+                        "CREATE TEMP TABLE IF NOT EXISTS {} "
+                        "(LIKE {} INCLUDING DEFAULTS) ON COMMIT DELETE ROWS"
+                    ).format(psql.Identifier("tweets_stage"), psql.Identifier("tweets"))
                 )
+                with cur.copy(
+                    psql.SQL(
+                        "COPY {} (tweet_id,author_id,author_name,tweet_text) FROM STDIN"
+                    ).format(psql.Identifier("tweets_stage"))
+                ) as copy:
+                    for row in batch:
+                        copy.write_row(row)
+                cur.execute(
+                    psql.SQL(
+                        "INSERT INTO {} (tweet_id,author_id,author_name,tweet_text) "
+                        "SELECT tweet_id,author_id,author_name,tweet_text FROM {} "
+                        "ON CONFLICT (tweet_id) DO NOTHING"
+                    ).format(psql.Identifier("tweets"), psql.Identifier("tweets_stage"))
+                )
+                skipped = len(batch) - cur.rowcount
                 conn.commit()
-                self.logger.info("Change Commited")
-            except psycopg.Error as err:
-                self.logger.error(f"Failure to add data {err}")
-                # conn.commit()
-
-    # @sleep_db(timeout=10)
-    def connect_to_queue(self):
-        self.logger.debug(f"SQL Thread Unlocked:{self.events['sql'].is_set()}")
-        self.events["sql"].wait()
-        self.logger.info("Connecting to SQL Queue")
-        while self.db_q:
+                self.logger.info("Batch Commited")
+                if skipped:
+                    self.logger.info(f"Skipped {skipped} tweets already stored")
+        except PoolTimeout as err:
+            self.logger.error(f"Failure to add batch, no connection available {err}")
+            return False
+        except psycopg.OperationalError as err:
+            self.logger.error(f"Failure to add batch, connection lost {err}")
+            return False
+        except psycopg.Error as err:
+            # the pool rolls the failed transaction back when the connection is returned
+            self.logger.warning(f"Batch failed, retrying rows one at a time {err}")
+            for row in batch:
+                self.execute_SQL(row)
+        return True
+
+    def collect_batch(self, timeout: float = 10) -> list[tuple]:
+        """
+        Blocks up to timeout seconds for the first row, then keeps pulling rows until the
+        batch is full or max_linger seconds have passed. Raises queue.Empty if no row arrives.
+        """
+        batch = [self.db_q.get(timeout=timeout)]
+        deadline = time.monotonic() + self.max_linger
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
             try:
-                sql_values = self.db_q.get(timeout=10)
-                self.logger.debug(f"parsing values: {sql_values}")
-                self.execute_SQL(sql_values)
+                batch.append(self.db_q.get(timeout=remaining))
             except queue.Empty:
-                self.logger.info("Queue is empty, sleeping")
-                self.logger.info("Sleeping SQL DB")
-                self.events["sql"].clear()
-                self.wait_to_wake()
+                break
+        return batch
+
+    def ensure_partitions(self) -> None:
+        """
+        Creates the coming months' partitions of tweets, if the table is partitioned
+        """
+        now = time.time()
+        try:
+            with self.pool.connection() as conn:
+                if is_partitioned(conn):
+                    create_partitions(
+                        conn,
+                        now,
+                        month_start(now, self.partition_months_ahead).timestamp(),
+                        self.logger,
+                    )
+        except (PoolTimeout, psycopg.Error) as err:
+            self.logger.error(f"Failure to create partitions {err}")
+
+    def maintain_partitions(self, interval: float = 24 * 60 * 60) -> None:
+        self.ensure_partitions()
+        while not self.events["killall"].wait(interval):
+            self.ensure_partitions()
 
-                # raise queue.Empty
+    def connect_to_queue(self):
+        self.logger.info("Connecting to SQL Queue")
+        if self.partition_months_ahead is not None:
+            Thread(target=self.maintain_partitions, daemon=True).start()
+        if self.spool is None:
+            run_stage(
+                "SQL",
+                self.collect_batch,
+                self.execute_batch,
+                self.events["killall"],
+                self.logger,
+                self.events.get("parsed"),
+            )
+            return
+        self.drainer = SpoolDrainer(
+            self.spool, self.execute_batch, self.logger, self.drain_batch_rows
+        )
+        self.drainer.start()
+        try:
+            run_stage(
+                "SQL",
+                self.collect_batch,
+                self.spool.append,
+                self.events["killall"],
+                self.logger,
+                self.events.get("parsed"),
+            )
+        finally:
+            self.drainer.stop()
+            self.spool.close()
 
 
 class TweetDB:
@@ -434,6 +691,14 @@ class TweetDB:
     Maintains all the tweets that are coming in from the stream.
     Allows for text processing to be moved to a different thread to reduce load on Stream thread
     Maps tweet_ids to Tweet objects
+
+    Arguments:
+        recent_ids (RecentIdFilter): drops tweets seen recently before they reach db_q
+                                     [optional, every tweet is passed on]. Ids are
+                                     remembered as they are parsed, or only once stored()
+                                     reports them committed if mark_when_stored is set
+        mapping_writer (MappingWriter): saves authors resolved from payloads to
+                                        id_name_mapping [optional, kept in memory only]
     """
 
     def __init__(
@@ -444,6 +709,8 @@ class TweetDB:
         events: dict[str, Event],
         id_mapping: dict,
         logger: logging.Logger,
+        recent_ids: RecentIdFilter = None,
+        mapping_writer: MappingWriter = None,
     ):
         self.tweet_dict = tweet_dict
         self.response_q = response_q
@@ -451,105 +718,190 @@ class TweetDB:
         self.id_mapping = id_mapping
         self.db_q = db_q
         self.logger = logger
-
-    # --- adapted from realpython.org
-    # --- https://realpython.com/python-sleep/
-    def sleep_db(timeout, retry=3):
-        def the_real_decorator(function):
-            def wrapper(self, *args, **kwargs):
-                retries = 0
-                while retries < retry:
-                    try:
-                        value = function(self, *args, **kwargs)
-                        if value is None:
-                            return
-                    except:
-                        self.logger.info(f"Sleeping DB for {timeout} seconds")
-                        time.sleep(timeout)
-                        retries += 1
-                # self.offload_db()
-                self.logger.info("Sleeping DB")
-                self.events["local_db"].clear()
-                self.wait_to_wake()
-
-            return wrapper
-
-        return the_real_decorator
-
-    # ---
-
-    def wait_to_wake(self):
-        # while self.sleep_status:
-        #     time.sleep(60)
-        #     self.logger.info("Checking for Queue status")
-        #     self.logger.info(f"Queue is empty: {self.response_q.empty()}")
-        self.logger.info("Waiting...")
-        self.events["local_db"].wait()
-        if self.events["killall"].is_set():
-            self.logger.error("Kill command received while waiting to wake")
-            self.logger.error("No longer attempting to connect to queue (local_db)!")
-        else:
-            self.connect_to_queue()
+        self.recent_ids = recent_ids
+        self.mark_when_stored = False
+        self.duplicates = 0
+        self.mapping_writer = mapping_writer
+        self.resolved = 0
 
     def get_sleep_status(self):
         return self.sleep_status
 
     def cache(self, json_response: dict) -> None:
-        self.logger.info(f"Adding to Cache {json_response}")
+        self.logger.info("Adding to Cache %s", json_response)
         self.response_q.put(json_response)
         self.events["local_db"].set()
-        self.logger.info(f"Local DB awoken {self.events['local_db'].is_set()}!")
+        self.logger.info("Local DB awoken %s!", self.events["local_db"].is_set())
 
     def parse(self, tweet_data: dict) -> None:
+        row = self.extract_row(tweet_data)
+        if row is not None and not self.is_duplicate(row[0]):
+            self.db_q.put(row)
+            self.logger.info("Tweet Parsed, Adding to DB Q")
+
+    def is_duplicate(self, tweet_id: int) -> bool:
+        """
+        True if tweet_id went through recently, and records it as seen otherwise
+        """
+        if self.recent_ids is None:
+            return False
+        if self.mark_when_stored:
+            seen = tweet_id in self.recent_ids
+        else:
+            seen = self.recent_ids.check_and_add(tweet_id)
+        if not seen:
+            return False
+        self.duplicates += 1
+        self.logger.info("Dropping duplicate tweet %s", tweet_id)
+        return True
+
+    def stored(self, tweet_ids: list[int]) -> None:
+        """
+        Remembers tweet ids the writer has committed, see mark_when_stored
+        """
+        if self.recent_ids is not None:
+            for tweet_id in tweet_ids:
+                self.recent_ids.check_and_add(tweet_id)
+
+    def extract_row(self, tweet_data: dict) -> tuple or None:
+        """
+        Parses a stream response into the row that gets written to the tweets table.
+        Returns None if the row cannot be built.
+        """
+        if isinstance(tweet_data, StreamRecord):
+            return self.extract_record(tweet_data)
         tweet_id = tweet_data["data"]["id"]
-        self.logger.info(f"Parsing Tweet {tweet_id}")
+        self.logger.info("Parsing Tweet %s", tweet_id, extra={"tweet_id": tweet_id})
         tweet_text = tweet_data["data"]["text"].replace("\n", "")
-        self.logger.debug(f"Tweet Text: {tweet_text}")
+        self.logger.debug("Tweet Text: %s", tweet_text)
         tweet_author = tweet_data["data"]["author_id"]
-        self.logger.debug(f"Tweet Author: {tweet_author}")
+        self.logger.debug("Tweet Author: %s", tweet_author)
         self.tweet_dict[tweet_id] = Tweet(tweet_id, tweet_text, tweet_author)
         # tweet_author = get_author(tweet_id) # ! add an error catch for this !
         # self.tweet_dict[tweet_id].set_author_id(tweet_author)
         try:
-            self.db_q.put(
-                (
-                    int(tweet_id),
-                    int(tweet_author),
-                    self.id_mapping[int(tweet_author)],
-                    str(tweet_text),
-                )
+            return (
+                int(tweet_id),
+                int(tweet_author),
+                self.id_mapping[int(tweet_author)],
+                str(tweet_text),
             )
         except KeyError:
-            self.logger.warning(f"Mapping unavailable for {tweet_author}")
+            user = included_user(tweet_data, tweet_author) or {}
+            author_name = self.resolve_author(
+                int(tweet_author), user.get("username"), user.get("name")
+            )
+            if author_name is not None:
+                return (int(tweet_id), int(tweet_author), author_name, str(tweet_text))
 
         except:
             self.logger.error("UNKNOWN EXCEPTION")
 
-        self.logger.info("Tweet Parsed, Adding to DB Q")
+        return None
+
+    def extract_record(self, record: StreamRecord) -> tuple or None:
+        """
+        extract_row for a StreamRecord from the fast decoder
+        """
+        self.logger.info(
+            "Parsing Tweet %s", record.tweet_id, extra={"tweet_id": record.tweet_id}
+        )
+        tweet_text = record.text.replace("\n", "")
+        self.tweet_dict[record.tweet_id] = Tweet(
+            record.tweet_id, tweet_text, record.author_id
+        )
+        author_name = self.id_mapping.get(record.author_id)
+        if author_name is None:
+            author_name = self.resolve_author(
+                record.author_id, record.author_username, record.author_full_name
+            )
+            if author_name is None:
+                return None
+        return (record.tweet_id, record.author_id, author_name, tweet_text)
+
+    def resolve_author(
+        self, author_id: int, username: str, full_name: str = None
+    ) -> str or None:
+        """
+        Adds an author missing from the mapping under the username from the payload's
+        includes.users, and queues it for id_name_mapping.
+        Returns the username, None if the payload did not include the author.
+        """
+        if username is None:
+            self.logger.warning("Mapping unavailable for %s", author_id)
+            return None
+        self.id_mapping[author_id] = username
+        self.resolved += 1
+        if self.mapping_writer is not None:
+            self.mapping_writer.put(author_id, username, full_name)
+        self.logger.info(
+            "Resolved author %s as %s from the payload", author_id, username
+        )
+        return username
+
+    def handle_response(self, json_obj: dict) -> None:
+        self.logger.debug("parsing obj: %s", json_obj)
+        # self.parse(json_obj, self.get_author)
+        self.parse(json_obj)
+        self.logger.debug("SQL DB Unlocked %s", self.events["sql"].is_set())
+        if not self.events["sql"].is_set():
+            self.logger.debug("Unlocking SQL DB Thread")
+            self.events["sql"].set()
 
-    # @sleep_db(timeout=1)
     def connect_to_queue(self):
-        self.logger.debug(f"Local DB Unlocked: {self.events['local_db'].is_set()}")
-        self.events["local_db"].wait()
         self.logger.debug("Got to connect_to_queue function DB")
-        while self.response_q:
+        run_stage(
+            "Local DB",
+            lambda timeout: self.response_q.get(timeout=timeout),
+            self.handle_response,
+            self.events["killall"],
+            self.logger,
+        )
+
+    def line_chunks(self, chunk_size: int):
+        """
+        Yields the raw lines waiting in response_q in chunks of at most chunk_size,
+        until killall is set and the queue is empty
+        """
+        while True:
             try:
-                json_obj = self.response_q.get(timeout=10)
-                self.logger.debug(f"parsing obj: {json_obj}")
-                # self.parse(json_obj, self.get_author)
-                self.parse(json_obj)
-                self.logger.debug(f"SQL DB Unlocked {self.events['sql'].is_set()}")
-                if not self.events["sql"].is_set():
-                    self.logger.debug(f"Unlocking SQL DB Thread")
-                    self.events["sql"].set()
+                chunk = [self.response_q.get(timeout=1)]
             except queue.Empty:
-                self.logger.info("Queue is empty, sleeping")
-                # self.offload_db()
-                self.logger.info("Sleeping DB")
-                self.events["local_db"].clear()
-                self.wait_to_wake()
-
-                # raise queue.Empty
+                if self.events["killall"].is_set():
+                    return
+                continue
+            while len(chunk) < chunk_size:
+                try:
+                    chunk.append(self.response_q.get_nowait())
+                except queue.Empty:
+                    break
+            yield chunk
+
+    def connect_to_workers(self, pool: ParseWorkerPool) -> None:
+        """
+        Parses raw lines from response_q on the worker processes instead of this thread.
+        Author names come from this process's mapping, which the mapping refresher keeps
+        current, the workers only name authors it does not have.
+        """
+        self.logger.info(f"Parsing on {pool.workers} worker processes")
+        try:
+            for rows in pool.parse(self.line_chunks(pool.chunk_size)):
+                for row in rows:
+                    author_name = self.id_mapping.get(row[1])
+                    if author_name is None:
+                        # named by the worker from the payload, if it could
+                        author_name = self.resolve_author(row[1], row[2])
+                        if author_name is None:
+                            continue
+                    elif author_name != row[2]:
+                        # renamed since the workers were started
+                        row = (row[0], row[1], author_name, row[3])
+                    if not self.is_duplicate(row[0]):
+                        self.db_q.put(row)
+                if rows and not self.events["sql"].is_set():
+                    self.events["sql"].set()
+        finally:
+            pool.close()
 
     def offload_db(self):
         timestr = time.strftime("%Y%m%d-%H%M%S")
@@ -560,38 +912,264 @@ class TweetDB:
 
 
 class TweetStream:
-    def __init__(self, bearer_token: str, db_path: str):
-        self.log_root = self.create_loggers()
+    """
+    Runs the full stream -> parse -> Postgres pipeline.
+
+    Arguments:
+        engine  (str): "thread" for the ThreadPoolExecutor pipeline,
+                       "async" for the asyncio pipeline in AsyncPipeline
+        handler      : TwitterHandler to read from [optional, for testing]
+        sql_pipe     : PostgresPipe to write to [optional, for testing]
+        api_url (str): base url of the Twitter API [optional, for load testing]
+        capture_dir (str): directory to capture the raw stream into [optional]
+        parse_workers (int): parse on this many worker processes, 0 parses on a thread.
+                             Only the thread engine supports worker processes
+        queue_high_watermark (int): items tweet_q and db_q hold in memory, past it they spill
+                                    to disk or, without spill_dir, the stage feeding them
+                                    waits. The async engine's queues hold at most this many
+        spill_dir (str): spill tweet_q and db_q to overflow files in this directory instead of
+                         keeping them in memory [optional]. One directory per TweetStream
+        max_spill_bytes (int): size of each queue's overflow past which the stage feeding it
+                               waits for the next stage
+        async_logging (bool): write the logs from a background thread, see create_loggers
+        log_sample (dict): logger name -> keep 1 in n of its per-tweet INFO/DEBUG records
+        structured_logs (bool): write the log files as JSON lines
+        fast_decode (bool): decode the stream into StreamRecords instead of full dicts
+        reconnect (bool): reopen a dropped or stalled stream instead of shutting down,
+                          outages are listed by disconnects()
+        backfill (str): "search" or "timeline", fetch the tweets missed during each outage
+                        once the stream is back [optional, needs reconnect and a pooled sql_pipe]
+        dedupe_capacity (int): tweet ids the duplicate filter remembers per generation
+                               [optional, 0 leaves duplicates to ON CONFLICT DO NOTHING].
+                               The filter drops a small share of new tweets as false
+                               positives, and without the pipeline writer remembers ids
+                               before their batch is committed, so a tweet redelivered after
+                               a failed write is dropped too. Only for deployments that can
+                               lose tweets
+        dedupe_bytes (int): memory of the duplicate filter, more bytes per id means fewer new
+                            tweets dropped as false positives, see classes/dedupe.py
+        pipeline_writer (bool): write with a PipelineWriter on its own connection, keeping
+                                many inserts in flight. Only the async engine supports it.
+                                Its commit acknowledgements feed the duplicate filter, which
+                                then only remembers tweets once they are stored
+        spool_dir (str): append batches to a write-ahead spool in this directory and store
+                         them from there, so a Postgres outage delays tweets instead of
+                         dropping them [optional]. Only the thread engine supports it
+        live_mapping (bool): apply changes to id_name_mapping while running instead of
+                             only loading it at start, see classes/mapping_refresh.py.
+                             With parse_workers the names are corrected after parsing,
+                             in the process that holds the live mapping
+        compact_mapping (bool): keep the author mapping packed in one buffer instead of a
+                                dict, for watchlists of hundreds of thousands of accounts.
+                                Parse workers share it read-only, see classes/compact_mapping.py
+        mapping_snapshot (str): file to keep a snapshot of the author mapping in. Startup
+                                memory-maps it and reads only the rows of id_name_mapping
+                                changed since, see classes/mapping_snapshot.py [optional,
+                                needs a pooled sql_pipe]
+    """
+
+    engines = ("thread", "async")
+
+    def __init__(
+        self,
+        bearer_token: str,
+        db_path: str,
+        engine: str = "thread",
+        handler=None,
+        sql_pipe=None,
+        api_url: str = "https://api.twitter.com",
+        capture_dir: str = None,
+        parse_workers: int = 0,
+        queue_high_watermark: int = 100_000,
+        spill_dir: str = None,
+        max_spill_bytes: int = 1 << 30,
+        async_logging: bool = False,
+        log_sample: dict = None,
+        structured_logs: bool = False,
+        fast_decode: bool = True,
+        reconnect: bool = True,
+        backfill: str = None,
+        dedupe_capacity: int = 0,
+        dedupe_bytes: int = 8 * 1024 * 1024,
+        pipeline_writer: bool = False,
+        spool_dir: str = None,
+        live_mapping: bool = True,
+        compact_mapping: bool = False,
+        mapping_snapshot: str = None,
+    ):
+        if engine not in self.engines:
+            raise ValueError(f"Unknown engine {engine}, expected one of {self.engines}")
+        if parse_workers and engine != "thread":
+            raise ValueError("parse_workers needs the thread engine")
+        if pipeline_writer and engine != "async":
+            raise ValueError("pipeline_writer needs the async engine")
+        if spool_dir and engine != "thread":
+            raise ValueError("spool_dir needs the thread engine")
+        self.engine = engine
+        self.parse_workers = parse_workers
+        self.fast_decode = fast_decode
+        self.queue_high_watermark = queue_high_watermark
+        self.log_root = self.create_loggers(async_logging, structured_logs)
+        self.log_sample = log_sample or {}
 
         atexit.register(self.kill)
 
         # self.log_root.info(self.user_mapping)
         self.tweet_dict = {}
-        self.tweet_q = Queue(0)
-        self.db_q = Queue(0)
-
-        self.events = {"local_db": Event(), "sql": Event(), "killall": Event()}
+        if spill_dir:
+            self.tweet_q = SpillQueue(
+                os.path.join(spill_dir, "tweet_q.spill"),
+                queue_high_watermark,
+                max_spill_bytes,
+            )
+            self.db_q = SpillQueue(
+                os.path.join(spill_dir, "db_q.spill"),
+                queue_high_watermark,
+                max_spill_bytes,
+            )
+        else:
+            self.tweet_q = Queue(queue_high_watermark)
+            self.db_q = Queue(queue_high_watermark)
+
+        # parsed is set once the parse stage has drained tweet_q, the SQL stage stops after it
+        self.events = {
+            "local_db": Event(),
+            "sql": Event(),
+            "killall": Event(),
+            "parsed": Event(),
+        }
         # self.events['local_db'].set()
         # self.events['sql'].set()
-        self.handler = TwitterHandler(
-            bearer_token, self.events, logging.getLogger("Handler")
+        self.capture = (
+            StreamCapture(capture_dir, logging.getLogger("Capture"))
+            if capture_dir
+            else None
+        )
+        self.supervisor = (
+            StreamSupervisor(self.events["killall"], logging.getLogger("Handler"))
+            if reconnect
+            else None
+        )
+        self.handler = handler or TwitterHandler(
+            bearer_token,
+            self.events,
+            self.get_logger("Handler"),
+            api_url=api_url,
+            capture=self.capture,
+            supervisor=self.supervisor,
         )
         # self.handler = fakeTwitterHandler(logging.getLogger("Handler"))
         # self.sql_pipe = SQLlitePipe(
         #     db_path, self.db_q, self.events, logging.getLogger("SQL_Database")
         # )
-        self.sql_pipe = PostgresPipe(
-            db_path, self.db_q, self.events, logging.getLogger("SQL_Database")
+        self.sql_pipe = sql_pipe or PostgresPipe(
+            db_path,
+            self.db_q,
+            self.events,
+            self.get_logger("SQL_Database"),
+            spool=(
+                WriteAheadSpool(spool_dir, logging.getLogger("Spool"))
+                if spool_dir
+                else None
+            ),
         )
-        self.user_mapping = self.sql_pipe.download_user_mapping()
+        self.backfill = None
+        self.backfill_executor = None
+        self.backfill_timers = []
+        if backfill and self.supervisor is not None:
+            self.backfill = Backfill(
+                self.handler,
+                self.sql_pipe.pool,
+                logging.getLogger("Backfill"),
+                backfill,
+            )
+            # one backfill at a time, they share the search rate limit
+            self.backfill_executor = ThreadPoolExecutor(1)
+            self.supervisor.on_reconnect = self.queue_backfill
+        self.writer = (
+            PipelineWriter(
+                db_path,
+                self.get_logger("SQL_Database"),
+                killall=self.events["killall"],
+            )
+            if pipeline_writer
+            else None
+        )
+        self.mapping_snapshot = (
+            mapping_snapshot
+            if getattr(self.sql_pipe, "pool", None) is not None
+            else None
+        )
+        self.user_mapping, loaded_at = self.load_mapping()
+        if compact_mapping and isinstance(self.user_mapping, dict):
+            self.user_mapping = CompactMapping.from_dict(self.user_mapping)
+        if parse_workers and isinstance(self.user_mapping, CompactMapping):
+            self.user_mapping = self.user_mapping.share()
+        # authors missing from the mapping are named from the payloads and saved from here
+        self.mapping_writer = (
+            MappingWriter(self.sql_pipe.pool, logging.getLogger("Mapping"))
+            if getattr(self.sql_pipe, "pool", None) is not None
+            else None
+        )
+        self.refresher = None
+        if live_mapping and db_path is not None and self.user_mapping is not None:
+            self.refresher = MappingRefresher(
+                db_path,
+                self.user_mapping,
+                self.events["killall"],
+                logging.getLogger("Mapping"),
+                loaded_at,
+            )
         self.database = TweetDB(
             self.tweet_dict,
             self.tweet_q,
             self.db_q,
             self.events,
             self.user_mapping,
-            logging.getLogger("Local_Dict"),
+            self.get_logger("Local_Dict"),
+            RecentIdFilter(dedupe_capacity, dedupe_bytes) if dedupe_capacity else None,
+            self.mapping_writer,
         )
+        if self.writer is not None and self.database.recent_ids is not None:
+            self.database.mark_when_stored = True
+            self.writer.on_ack = self.database.stored
+
+    def database_now(self) -> datetime:
+        """
+        The database server's clock, updated_at watermarks are compared against it
+        """
+        if getattr(self.sql_pipe, "pool", None) is None:
+            return datetime.now(timezone.utc)
+        with self.sql_pipe.pool.connection() as conn:
+            return conn.execute("SELECT now();").fetchone()[0]
+
+    def load_mapping(self) -> tuple:
+        """
+        Returns the author mapping and the updated_at it is current up to.
+        With a snapshot, loads it and applies the rows changed since its watermark,
+        otherwise downloads id_name_mapping and writes a new snapshot.
+        """
+        logger = logging.getLogger("Mapping")
+        snapshot = None
+        if self.mapping_snapshot is not None:
+            snapshot = load_snapshot(self.mapping_snapshot, logger)
+        if snapshot is not None:
+            mapping, watermark = snapshot
+            catch_up = MappingRefresher(
+                None, mapping, self.events["killall"], logger, watermark
+            )
+            with self.sql_pipe.pool.connection() as conn:
+                changed = catch_up.catch_up(conn)
+            logger.info(
+                f"Loaded {len(mapping)} authors from {self.mapping_snapshot}, "
+                f"{changed} changed since"
+            )
+            return mapping, catch_up.watermark
+        loaded_at = self.database_now()
+        mapping = self.sql_pipe.download_user_mapping()
+        if self.mapping_snapshot is not None and mapping is not None:
+            write_snapshot(self.mapping_snapshot, mapping, loaded_at)
+        return mapping, loaded_at
 
     def kill(self):
         self.log_root.warning("Setting local_db flag")
@@ -606,11 +1184,114 @@ class TweetStream:
         self.events["killall"].set()
         self.log_root.warning("killall flag set")
 
+        if self.capture is not None:
+            self.capture.close()
+            self.log_root.warning("capture closed")
+
+        for timer in self.backfill_timers:
+            timer.cancel()
+        if self.backfill_executor is not None:
+            self.backfill_executor.shutdown(wait=False, cancel_futures=True)
+
+        if self.mapping_writer is not None:
+            self.mapping_writer.stop()
+
+        # keep the changes seen while running for the next start
+        if self.mapping_snapshot is not None and self.refresher is not None:
+            if self.refresher.applied or self.database.resolved:
+                write_snapshot(
+                    self.mapping_snapshot, self.user_mapping, self.refresher.watermark
+                )
+                self.log_root.warning("mapping snapshot written")
+
+        if isinstance(self.user_mapping, CompactMapping):
+            self.user_mapping.unlink()
+
+        for q in (self.tweet_q, self.db_q):
+            if isinstance(q, SpillQueue):
+                q.close()
+
+        stop_queue_logging()
+
+    def queue_backfill(self, window) -> None:
+        """
+        Backfills a closed disconnect window in the background, once the API can return
+        all of it
+        """
+        delay = max(0.0, self.backfill.ready_at(window) - time.time())
+        timer = Timer(delay, self.submit_backfill, args=(window,))
+        timer.daemon = True
+        self.backfill_timers = [t for t in self.backfill_timers if t.is_alive()]
+        self.backfill_timers.append(timer)
+        timer.start()
+
+    def submit_backfill(self, window) -> None:
+        future = self.backfill_executor.submit(self.backfill.run, [window])
+        future.add_done_callback(self.log_backfill_error)
+
+    def log_backfill_error(self, future) -> None:
+        if not future.cancelled() and future.exception() is not None:
+            self.log_root.error(f"Backfill failed: {future.exception()}")
+
+    def disconnects(self) -> dict:
+        """
+        Stream outages so far and the total downtime in seconds
+        """
+        if self.supervisor is None:
+            return {"windows": [], "downtime": 0.0}
+        return {
+            "windows": self.supervisor.report(),
+            "downtime": self.supervisor.downtime(),
+        }
+
+    def queue_stats(self) -> dict:
+        """
+        Depth and spill volume of the stage queues, and the spool backlog if there is one
+        """
+        stats = {
+            name: (
+                q.stats() if isinstance(q, SpillQueue) else {"memory_depth": q.qsize()}
+            )
+            for name, q in (("tweet_q", self.tweet_q), ("db_q", self.db_q))
+        }
+        if getattr(self.sql_pipe, "drainer", None) is not None:
+            stats["spool"] = self.sql_pipe.drainer.stats()
+        return stats
+
+    def write_stats(self) -> dict:
+        """
+        Rows acknowledged as committed by the pipeline writer, None without one
+        """
+        return self.writer.stats() if self.writer is not None else None
+
+    def get_logger(self, name: str) -> logging.Logger:
+        """
+        The named logger, wrapped in a SampledLogger if log_sample asks for it
+        """
+        logger = logging.getLogger(name)
+        if name in self.log_sample:
+            return SampledLogger(logger, self.log_sample[name])
+        return logger
+
     @staticmethod
-    def create_loggers() -> logging.Logger:
-        formatter = logging.Formatter(
-            "%(asctime)s [%(name)s][%(levelname)s] %(message)s"
-        )
+    def create_loggers(
+        async_logging: bool = False, structured: bool = False
+    ) -> logging.Logger:
+        """
+        Arguments:
+            async_logging (bool): write the logs from a background thread
+            structured    (bool): write the log files as JSON lines
+        """
+        if structured:
+            formatter = StructuredFormatter()
+        else:
+            formatter = logging.Formatter(
+                "%(asctime)s [%(name)s][%(levelname)s] %(message)s"
+            )
+
+        if async_logging:
+            return TweetStream.create_queue_loggers(formatter)
+
         logging.basicConfig(
             level=logging.DEBUG,
             filename="logs/ROOT_LOG.log",
@@ -651,24 +1332,78 @@ class TweetStream:
 
         return log_root
 
+    @staticmethod
+    def create_queue_loggers(formatter: logging.Formatter) -> logging.Logger:
+        """
+        Same files and console output as create_loggers, written by one background listener.
+        Records only go onto a queue on the root logger, the listener routes them by logger name.
+        """
+        log_root = logging.getLogger()
+        log_root.setLevel(logging.DEBUG)
+
+        routes = {
+            "logs/HANDLER_LOG.log": "Handler",
+            "logs/DB_LOG.log": "Local_Dict",
+            "logs/SQL_LOG.log": "SQL_Database",
+        }
+        ch = logging.StreamHandler()
+        ch.setLevel(logging.INFO)
+        ch.addFilter(NameFilter(list(routes.values())))
+        handlers = [ch, logging.FileHandler("logs/ROOT_LOG.log")]
+        for path, name in routes.items():
+            fh = logging.FileHandler(path, mode="w+")
+            fh.addFilter(NameFilter([name]))
+            handlers.append(fh)
+        for handler in handlers:
+            handler.setFormatter(formatter)
+
+        start_queue_logging(log_root, handlers)
+        return log_root
+
     def cache(self):
-        for json_response in self.handler.stream():
+        # worker processes decode the JSON themselves, hand them the raw lines
+        if self.parse_workers:
+            stream = self.handler.stream_lines()
+        elif self.fast_decode:
+            stream = self.handler.stream_records()
+        else:
+            stream = self.handler.stream()
+        for json_response in stream:
             self.database.cache(json_response)
             if not self.events["local_db"].is_set():
                 self.log_root.debug("Waking Local DB")
                 self.events["local_db"].set()
 
     def parse(self):
-        self.database.connect_to_queue()
+        try:
+            if self.parse_workers:
+                pool = ParseWorkerPool(
+                    self.parse_workers,
+                    self.user_mapping or {},
+                    self.get_logger("Local_Dict"),
+                )
+                self.database.connect_to_workers(pool)
+            else:
+                self.database.connect_to_queue()
+        finally:
+            self.events["parsed"].set()
 
     def offload(self):
         self.sql_pipe.connect_to_queue()
 
     def run(self):
+        if self.refresher is not None:
+            self.refresher.start()
+        if self.mapping_writer is not None:
+            self.mapping_writer.start()
+        if self.engine == "async":
+            self.run_async()
+            return
+
         with ThreadPoolExecutor(4) as executor:
             cache_future = executor.submit(self.cache)
-            parse_future = executor.submit(self.parse, daemon=True)
-            offload_future = executor.submit(self.offload, daemon=True)
+            parse_future = executor.submit(self.parse)
+            offload_future = executor.submit(self.offload)
             # self.log_root(threading.excepthook(cache_future))
             # if cache_future:
             #     self.log_root(cache_future)
@@ -677,6 +1412,18 @@ class TweetStream:
             # if offload_future:
             #     self.log_root(offload_future)
 
+    def run_async(self):
+        pipeline = AsyncPipeline(
+            self.handler,
+            self.database,
+            self.sql_pipe,
+            logging.getLogger("Async"),
+            self.fast_decode,
+            self.writer,
+            self.queue_high_watermark,
+        )
+        asyncio.run(pipeline.run())
+
 
 # ! Add Author DB, maps author to tweet items
 
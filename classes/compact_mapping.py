@@ -0,0 +1,232 @@
+"""
+Compact user_id -> user_name mapping for very large watchlists.
+A dict spends well over 100 bytes per author on the int and str objects and the hash table.
+CompactMapping packs the mapping into one flat buffer instead:
+    header   <magic 8s><authors uint64><names uint64><name bytes uint64><slot bits uint64>
+    ids      sorted int64, one per author
+    offsets  uint64, where each name starts in the name bytes, plus the end of the last one
+    names    uint32, index of each author's name
+    slots    uint32, open addressing table of 1 + position in ids, 0 for an empty slot
+    UTF-8 name bytes, every distinct name stored once
+The slot table is at most half full and hashed with Fibonacci hashing, which spreads the
+snowflake user ids whose low bits are mostly zero, so a lookup reads one or two slots.
+Lookups decode the name from the buffer, which holds no Python objects and can be shared
+read-only between processes: see share(), parse workers attach to the same shared memory
+instead of each holding a copy of the mapping.
+
+The buffer never changes after it is built. Authors added or removed afterwards, by the
+mapping refresher or from stream payloads, go into a small dict checked before the buffer.
+"""
+
+# native
+from array import array
+from itertools import accumulate
+from multiprocessing import shared_memory
+import struct
+
+MAGIC = b"TAMAP\x00\x00\x01"
+_HEADER = struct.Struct("<8sQQQQ")
+FIBONACCI = 0x9E3779B97F4A7C15
+MASK = (1 << 64) - 1
+_MISSING = object()
+
+
+def pack(mapping: dict) -> bytes:
+    """
+    Packs a user_id -> user_name dict into the CompactMapping layout
+    """
+    ids = array("q", sorted(mapping))
+    indexes = {}
+    names = array("I", (indexes.setdefault(mapping[i], len(indexes)) for i in ids))
+    encoded = [name.encode() for name in indexes]
+    offsets = array("Q", accumulate(map(len, encoded), initial=0))
+    bits = max(1, (2 * len(ids) - 1).bit_length())
+    slots = array("I", bytes(4 << bits))
+    shift, mask = 64 - bits, (1 << bits) - 1
+    for pos, user_id in enumerate(ids, 1):
+        slot = (user_id * FIBONACCI & MASK) >> shift
+        while slots[slot]:
+            slot = (slot + 1) & mask
+        slots[slot] = pos
+    return b"".join(
+        (
+            _HEADER.pack(MAGIC, len(ids), len(encoded), offsets[-1], bits),
+            ids.tobytes(),
+            offsets.tobytes(),
+            names.tobytes(),
+            slots.tobytes(),
+            *encoded,
+        )
+    )
+
+
+class CompactMapping:
+    """
+    Arguments:
+        buffer (bytes): a mapping packed by pack(), or any buffer holding one (shared memory,
+                        a memory-mapped snapshot)
+        changes (dict): user_id -> user_name changed since the buffer was packed, None for
+                        removed authors [optional]
+    """
+
+    def __init__(self, buffer, changes: dict = None):
+        view = memoryview(buffer)
+        magic, count, names, name_bytes, bits = _HEADER.unpack_from(view)
+        if magic != MAGIC:
+            raise ValueError("Not a packed author mapping")
+        end = _HEADER.size + 12 * count + 8 * (names + 1) + (4 << bits) + name_bytes
+        if len(view) < end:
+            raise ValueError("Truncated author mapping")
+        start = _HEADER.size
+        self.ids = view[start : start + 8 * count].cast("q")
+        start += 8 * count
+        self.offsets = view[start : start + 8 * (names + 1)].cast("Q")
+        start += 8 * (names + 1)
+        self.names = view[start : start + 4 * count].cast("I")
+        start += 4 * count
+        self.slots = view[start : start + (4 << bits)].cast("I")
+        start += 4 << bits
+        self.shift, self.mask = 64 - bits, (1 << bits) - 1
+        self.name_bytes = view[start : start + name_bytes]
+        self.view = view[: start + name_bytes]
+        self.shm = None
+        self.owner = False
+        self.changes = {}
+        self.size = count
+        for user_id, user_name in (changes or {}).items():
+            if user_name is None:
+                self.pop(user_id, None)
+            else:
+                self[user_id] = user_name
+
+    @classmethod
+    def from_dict(cls, mapping: dict):
+        return cls(pack(mapping))
+
+    @classmethod
+    def attach(cls, name: str, changes: dict = None):
+        """
+        Opens a mapping another process shared with share()
+        """
+        # worker processes share their parent's resource tracker, which already knows the block
+        shm = shared_memory.SharedMemory(name)
+        mapping = cls(shm.buf, changes)
+        mapping.shm = shm
+        return mapping
+
+    def share(self):
+        """
+        Copies the buffer into shared memory and returns the mapping over it.
+        Pickling the returned mapping, as multiprocessing does for worker arguments, sends
+        the name of the shared block instead of the whole buffer.
+        """
+        shm = shared_memory.SharedMemory(create=True, size=len(self.view))
+        shm.buf[: len(self.view)] = self.view
+        mapping = CompactMapping(shm.buf, self.changes)
+        mapping.shm = shm
+        mapping.owner = True
+        return mapping
+
+    def close(self) -> None:
+        """
+        Releases the shared memory, and removes it if this process created it
+        """
+        if self.shm is None:
+            return
+        for view in (
+            self.ids,
+            self.offsets,
+            self.names,
+            self.slots,
+            self.name_bytes,
+            self.view,
+        ):
+            view.release()
+        self.unlink()
+        self.shm.close()
+        self.shm = None
+
+    def unlink(self) -> None:
+        """
+        Removes the shared block this process created, processes that have it open keep
+        reading it until they exit
+        """
+        if self.owner and self.shm is not None:
+            self.shm.unlink()
+            self.owner = False
+
+    def __reduce__(self):
+        if self.shm is not None:
+            return (CompactMapping.attach, (self.shm.name, self.changes))
+        return (CompactMapping, (bytes(self.view), self.changes))
+
+    def find(self, user_id: int) -> int:
+        """
+        Position of user_id in the packed ids, -1 if it is not there
+        """
+        slot = (user_id * FIBONACCI & MASK) >> self.shift
+        while pos := self.slots[slot]:
+            if self.ids[pos - 1] == user_id:
+                return pos - 1
+            slot = (slot + 1) & self.mask
+        return -1
+
+    def name(self, pos: int) -> str:
+        index = self.names[pos]
+        offsets = self.offsets
+        return self.name_bytes[offsets[index] : offsets[index + 1]].tobytes().decode()
+
+    def get(self, user_id: int, default=None):
+        user_name = self.changes.get(user_id, _MISSING)
+        if user_name is not _MISSING:
+            return default if user_name is None else user_name
+        pos = self.find(user_id)
+        return default if pos < 0 else self.name(pos)
+
+    def __getitem__(self, user_id: int) -> str:
+        user_name = self.get(user_id)
+        if user_name is None:
+            raise KeyError(user_id)
+        return user_name
+
+    def __contains__(self, user_id: int) -> bool:
+        return self.get(user_id) is not None
+
+    def __setitem__(self, user_id: int, user_name: str) -> None:
+        if self.get(user_id) is None:
+            self.size += 1
+        self.changes[user_id] = user_name
+
+    def pop(self, user_id: int, *default):
+        user_name = self.get(user_id)
+        if user_name is None:
+            if default:
+                return default[0]
+            raise KeyError(user_id)
+        self.size -= 1
+        if self.find(user_id) < 0:
+            del self.changes[user_id]
+        else:
+            self.changes[user_id] = None
+        return user_name
+
+    def __len__(self) -> int:
+        return self.size
+
+    def __iter__(self):
+        for user_id, _ in self.items():
+            yield user_id
+
+    def items(self):
+        for pos, user_id in enumerate(self.ids):
+            if user_id not in self.changes:
+                yield user_id, self.name(pos)
+        for user_id, user_name in list(self.changes.items()):
+            if user_name is not None:
+                yield user_id, user_name
+
+    def memory_bytes(self) -> int:
+        """
+        Size of the packed buffer, the changes dict not included
+        """
+        return len(self.view)
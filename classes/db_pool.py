@@ -0,0 +1,77 @@
+"""
+Postgres connection pools shared by Toolkit and the pipeline stages.
+Borrow a connection with:
+
+    with pool.connection() as conn:
+        ...
+
+Connections are checked before they are handed out, so a connection broken by a
+server restart is thrown away and replaced instead of killing the caller.
+"""
+
+# native
+import logging
+from threading import Event, Lock, Thread
+
+# packages
+import psycopg
+from psycopg.conninfo import make_conninfo
+from psycopg_pool import ConnectionPool
+
+_pools = {}
+_pools_lock = Lock()
+
+
+class SharedPool(ConnectionPool):
+    """
+    ConnectionPool that also checks its idle connections every health_check_interval seconds
+    """
+
+    def __init__(
+        self,
+        db_args: dict,
+        min_size: int = 1,
+        max_size: int = 8,
+        max_idle: float = 600.0,
+        health_check_interval: float = 60.0,
+        logger: logging.Logger = logging.getLogger("Pool"),
+    ):
+        super().__init__(
+            make_conninfo(**db_args),
+            min_size=min_size,
+            max_size=max_size,
+            max_idle=max_idle,
+            check=ConnectionPool.check_connection,
+            name="tweet_audit",
+            open=True,
+        )
+        self.logger = logger
+        self.health_check_interval = health_check_interval
+        self.closing = Event()
+        self.health_thread = Thread(target=self.check_idle, daemon=True)
+        self.health_thread.start()
+
+    def check_idle(self) -> None:
+        while not self.closing.wait(self.health_check_interval):
+            try:
+                self.check()
+            except psycopg.Error as err:
+                self.logger.warning(f"Pool health check failed {err}")
+
+    def close(self, timeout: float = 5.0) -> None:
+        self.closing.set()
+        super().close(timeout)
+
+
+def get_pool(db_args: dict, **pool_args) -> SharedPool:
+    """
+    Returns the pool for db_args, creating it on first use.
+    Every caller with the same connection arguments shares one pool.
+    """
+    key = make_conninfo(**db_args)
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None or pool.closed:
+            pool = SharedPool(db_args, **pool_args)
+            _pools[key] = pool
+    return pool
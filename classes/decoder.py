@@ -0,0 +1,107 @@
+"""
+Decoding of filtered-stream lines into compact typed records.
+Only the fields the pipeline uses are kept: tweet id, author id, text, the author's username
+from includes.users and the ids of the matching rules. Messages without a tweet, errors and
+operational disconnects, become StreamNotices. orjson is used when it is installed, the
+stdlib json module otherwise.
+"""
+
+# native
+from dataclasses import dataclass
+import json
+
+# packages
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def json_loads(data):
+    # json.loads takes bytes and bytearray, not the memoryviews the framer hands out
+    if isinstance(data, memoryview):
+        data = data.tobytes()
+    return json.loads(data)
+
+
+BACKEND = "orjson" if orjson is not None else "json"
+loads = orjson.loads if orjson is not None else json_loads
+
+
+def included_user(payload: dict, user_id: str) -> dict or None:
+    """
+    The user object for user_id from the payload's includes.users, if it is there
+    """
+    for user in payload.get("includes", {}).get("users", ()):
+        if user["id"] == user_id:
+            return user
+    return None
+
+
+@dataclass(slots=True)
+class StreamRecord:
+    """
+    One tweet from the filtered stream
+    """
+
+    tweet_id: int
+    author_id: int
+    text: str
+    author_username: str = None
+    rule_ids: tuple = ()
+    author_full_name: str = None
+
+    @classmethod
+    def from_payload(cls, payload: dict):
+        data = payload["data"]
+        author_id = data["author_id"]
+        user = included_user(payload, author_id) or {}
+        return cls(
+            int(data["id"]),
+            int(author_id),
+            data["text"],
+            user.get("username"),
+            tuple(int(rule["id"]) for rule in payload.get("matching_rules", ())),
+            user.get("name"),
+        )
+
+
+@dataclass(slots=True)
+class StreamNotice:
+    """
+    A stream message without a tweet: errors, or an operational disconnect announcing that
+    the connection is about to be closed
+    """
+
+    errors: tuple
+
+    @classmethod
+    def from_payload(cls, payload: dict):
+        return cls(tuple(payload["errors"]))
+
+    @property
+    def disconnect(self) -> bool:
+        return any("disconnect_type" in error for error in self.errors)
+
+    def summary(self) -> str:
+        return "; ".join(
+            f"{error.get('title', 'error')}: {error.get('detail', '')}".rstrip(": ")
+            for error in self.errors
+        )
+
+
+def decode_line(line: bytes, loads=loads) -> StreamRecord or StreamNotice or None:
+    """
+    Decodes one stream line. Returns a StreamNotice for errors and disconnect messages,
+    None for lines with neither a tweet nor errors (heartbeats)
+
+    Arguments:
+        line  (bytes): raw stream line, or a memoryview of one from LineFramer
+        loads (callable): JSON backend [optional, the fastest one installed by default]
+    """
+    if not line or line[0] in b"\r\n":
+        return None
+    payload = loads(line)
+    if "data" not in payload:
+        return StreamNotice.from_payload(payload) if "errors" in payload else None
+    return StreamRecord.from_payload(payload)
@@ -0,0 +1,100 @@
+"""
+Filter of recently seen tweet ids.
+Reconnects, backfills and replays hand the pipeline tweets it already stored. The filter is
+two rotating Bloom filters in fixed bytearrays: ids are added to the current generation and
+checked against both, and once the current one holds capacity ids the older one is dropped.
+Memory stays at max_bytes no matter how long the stream runs, and every id seen in the last
+capacity to 2 * capacity tweets is remembered.
+
+A Bloom filter never misses an id it holds, but can report one it never saw: about
+false_positive_rate() of new tweets get dropped as duplicates. More bytes per id lower that
+rate, the database's ON CONFLICT DO NOTHING catches whatever the filter lets through.
+Ids are added as they are parsed, before their batch is stored, so a tweet replayed after a
+failed write is dropped as well. With the pipeline writer they are only added once the
+server has acknowledged their commit. The filter is off unless TweetStream is given a
+dedupe_capacity: the archive relies on ON CONFLICT DO NOTHING alone by default.
+"""
+
+# native
+import math
+
+MASK = (1 << 64) - 1
+MAX_HASHES = 8
+
+
+def mix(value: int) -> int:
+    """
+    splitmix64 finalizer, spreads sequential snowflake ids over the whole 64 bits
+    """
+    value = (value ^ (value >> 30)) * 0xBF58476D1CE4E5B9 & MASK
+    value = (value ^ (value >> 27)) * 0x94D049BB133111EB & MASK
+    return value ^ (value >> 31)
+
+
+class RecentIdFilter:
+    """
+    Arguments:
+        capacity  (int): ids per generation, the filter remembers between capacity and
+                         2 * capacity of the latest ids
+        max_bytes (int): memory for both generations together
+    """
+
+    def __init__(self, capacity: int = 1_000_000, max_bytes: int = 8 * 1024 * 1024):
+        if capacity <= 0 or max_bytes < 2:
+            raise ValueError("capacity and max_bytes have to be positive")
+        self.capacity = capacity
+        self.bits = max_bytes // 2 * 8
+        # number of hashes minimizing the false positive rate of a full generation, capped
+        # since past 8 every extra hash costs more time than the rate it saves is worth
+        self.hashes = min(MAX_HASHES, max(1, round(self.bits / capacity * math.log(2))))
+        self.current = bytearray(self.bits // 8)
+        self.previous = bytearray(self.bits // 8)
+        self.count = 0
+        self.rotations = 0
+
+    def positions(self, tweet_id: int) -> list[int]:
+        # double hashing, k positions from two halves of one 64 bit hash
+        hashed = mix(tweet_id & MASK)
+        first, second = hashed & 0xFFFFFFFF, (hashed >> 32) | 1
+        return [(first + i * second) % self.bits for i in range(self.hashes)]
+
+    @staticmethod
+    def holds(bits: bytearray, positions: list[int]) -> bool:
+        return all(bits[p >> 3] & (1 << (p & 7)) for p in positions)
+
+    def __contains__(self, tweet_id: int) -> bool:
+        positions = self.positions(tweet_id)
+        return self.holds(self.current, positions) or self.holds(
+            self.previous, positions
+        )
+
+    def check_and_add(self, tweet_id: int) -> bool:
+        """
+        Adds tweet_id, returns True if it was (probably) seen before
+        """
+        positions = self.positions(tweet_id)
+        current = self.current
+        if self.holds(current, positions) or self.holds(self.previous, positions):
+            return True
+        for p in positions:
+            current[p >> 3] |= 1 << (p & 7)
+        self.count += 1
+        if self.count >= self.capacity:
+            self.rotate()
+        return False
+
+    def rotate(self) -> None:
+        self.previous, self.current = self.current, self.previous
+        self.current[:] = bytes(len(self.current))
+        self.count = 0
+        self.rotations += 1
+
+    def memory_bytes(self) -> int:
+        return len(self.current) + len(self.previous)
+
+    def false_positive_rate(self) -> float:
+        """
+        Chance a new id is reported as seen once both generations are full
+        """
+        full = (1 - math.exp(-self.hashes * self.capacity / self.bits)) ** self.hashes
+        return 1 - (1 - full) ** 2
@@ -0,0 +1,100 @@
+"""
+Framing of the filtered stream.
+Records are \\r\\n terminated, but the network hands them over in arbitrary chunks: a chunk can
+end mid-record, hold several records, or be nothing but a \\r\\n heartbeat. The framer
+collects chunks in a reusable bytearray and hands out every complete record as a
+memoryview slice of it, so records reach the decoder without being copied again.
+A bytearray cannot be resized while a view into it is alive, and a caller chaining
+generators still holds the last record when the buffer is compacted. The partial record
+then moves to a second, spare bytearray and the two take turns, so neither is reallocated.
+"""
+
+# native
+import logging
+
+
+class LineFramer:
+    """
+    Arguments:
+        max_record_bytes (int): longest partial record kept before the stream is considered corrupt
+    """
+
+    def __init__(
+        self,
+        max_record_bytes: int = 16 * 1024 * 1024,
+        logger: logging.Logger = logging.getLogger("Framer"),
+    ):
+        self.max_record_bytes = max_record_bytes
+        self.logger = logger
+        self.buffer = bytearray()
+        self.spare = bytearray()
+        self.searched = 0  # bytes at the front of buffer already known to hold no \n
+        self.records = 0
+        self.heartbeats = 0
+
+    def feed(self, chunk: bytes):
+        """
+        Adds a chunk and yields a memoryview for every record it completes.
+        A view is only valid until the next call to feed(), decode it or copy it before then.
+        """
+        buffer = self.buffer
+        buffer += chunk
+        view = memoryview(buffer)
+        start = 0
+        scanned = False
+        try:
+            while True:
+                end = buffer.find(b"\n", max(start, self.searched))
+                if end == -1:
+                    scanned = True
+                    break
+                stop = end - 1 if end > start and buffer[end - 1] == 13 else end
+                # no local keeps the view alive, compact() resizes the buffer in place when it can
+                record_start, start = start, end + 1
+                if stop > record_start:
+                    self.records += 1
+                    yield view[record_start:stop]
+                else:
+                    self.heartbeats += 1
+        finally:
+            view.release()
+            self.compact(start, scanned)
+
+    def compact(self, consumed: int, scanned: bool = True) -> None:
+        """
+        Drops the consumed records from the front of the buffer, keeping the partial record.
+        scanned is False when the caller stopped early and complete records are still left.
+        """
+        if len(self.buffer) - consumed > self.max_record_bytes:
+            self.buffer = bytearray()
+            self.searched = 0
+            raise ValueError(
+                f"Stream record longer than {self.max_record_bytes} bytes, dropped"
+            )
+        try:
+            del self.buffer[:consumed]
+        except BufferError:
+            # the caller still holds a record, leave it the buffer and switch to the spare
+            self.buffer, self.spare = self.move_partial(consumed), self.buffer
+        self.searched = len(self.buffer) if scanned else 0
+
+    def move_partial(self, consumed: int) -> bytearray:
+        """
+        Copies what is left after consumed into the spare buffer and returns it
+        """
+        spare = self.spare
+        try:
+            spare.clear()
+        except BufferError:
+            # views into both buffers are still in use
+            self.logger.debug("Record views still in use, reallocating framing buffer")
+            spare = bytearray()
+        with memoryview(self.buffer) as view:
+            spare += view[consumed:]
+        return spare
+
+    def pending(self) -> int:
+        """
+        Bytes of the partial record waiting for the rest of its chunk
+        """
+        return len(self.buffer)
@@ -0,0 +1,130 @@
+"""
+Non-blocking logging for the ingest hot path.
+Stages only put LogRecords on a queue; a background listener formats them and does the
+file and console I/O, so a slow disk never stalls the stream reader or the parser.
+"""
+
+# native
+import json
+import logging
+from logging.handlers import QueueHandler, QueueListener
+import queue
+import sys
+
+# attributes every LogRecord has, anything else was passed in with extra={...}
+_RECORD_ATTRS = set(vars(logging.makeLogRecord({}))) | {"message", "asctime"}
+
+
+class LazyQueueHandler(QueueHandler):
+    """
+    Enqueues records as they are, message and args are only merged on the listener thread.
+    Args have to stay unchanged after logging, which holds for the payloads the stages log.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+class SampledLogger(logging.LoggerAdapter):
+    """
+    Passes one in every `every` calls at or below max_level on to the logger, anything above
+    always goes through. Skipped calls return before a LogRecord is even built, which is most
+    of what a per-tweet log line costs.
+    Calls are counted per call site, so each of the lines logged for a tweet is kept equally
+    often whatever the number of lines per tweet.
+
+    Arguments:
+        every     (int): keep one call out of this many
+        max_level (int): most severe level that gets sampled
+    """
+
+    def __init__(self, logger: logging.Logger, every: int, max_level=logging.INFO):
+        super().__init__(logger, None)
+        self.every = every
+        self.max_level = max_level
+        # (code, line number) of the caller -> calls so far
+        self.calls = {}
+
+    def log(self, level: int, msg, *args, **kwargs) -> None:
+        if level <= self.max_level:
+            frame = sys._getframe(1)
+            # step out of LoggerAdapter.info and friends
+            while frame.f_globals.get("__name__") == "logging":
+                frame = frame.f_back
+            site = (frame.f_code, frame.f_lineno)
+            calls = self.calls.get(site, 0)
+            self.calls[site] = calls + 1
+            if calls % self.every:
+                return
+        super().log(level, msg, *args, **kwargs)
+
+    def process(self, msg, kwargs):
+        return msg, kwargs
+
+
+class NameFilter(logging.Filter):
+    """
+    Passes records from any of the given loggers, used to route records off the shared queue
+    """
+
+    def __init__(self, names: list[str]):
+        super().__init__()
+        self.names = set(names)
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        return record.name in self.names
+
+
+class StructuredFormatter(logging.Formatter):
+    """
+    One JSON object per line: time, logger, level, message and any extra={...} fields
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": record.created,
+            "logger": record.name,
+            "level": record.levelname,
+            "msg": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS:
+                entry[key] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+_listener = None
+
+
+def start_queue_logging(
+    logger: logging.Logger, handlers: list[logging.Handler]
+) -> QueueListener:
+    """
+    Replaces the direct handlers with a queue on logger, and starts a listener that feeds
+    every record to handlers from a background thread. A listener from an earlier call is
+    flushed and stopped first.
+    """
+    global _listener
+    stop_queue_logging()
+    for handler in list(logger.handlers):
+        if isinstance(handler, LazyQueueHandler):
+            logger.removeHandler(handler)
+    log_q = queue.SimpleQueue()
+    logger.addHandler(LazyQueueHandler(log_q))
+    _listener = QueueListener(log_q, *handlers, respect_handler_level=True)
+    _listener.start()
+    return _listener
+
+
+def stop_queue_logging() -> None:
+    """
+    Writes out every queued record and stops the listener, safe to call more than once
+    """
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
@@ -0,0 +1,193 @@
+"""
+Persistent cache in front of the Twitter user lookups of the Toolkit.
+Responses are kept per key (a username, a tweet id, a timeline) in a SQLite file, so they
+survive between runs of the onboarding scripts, and expire after a TTL set per endpoint.
+Once the file holds max_entries the least recently used keys are evicted. When a key was
+last used is only recorded to within touch_interval, so most hits are plain reads.
+
+Lookups of the same key from several threads at once (update_author_to_id runs its lookups
+on a thread pool) are merged: the first thread fetches the key, the others wait for its
+result instead of making their own API call.
+"""
+
+# native
+from concurrent.futures import Future
+import json
+import logging
+import os
+import sqlite3
+from threading import Lock
+import time
+
+# seconds a cached response is used for, per endpoint
+DEFAULT_TTLS = {
+    "user_id": 24 * 3600,
+    "tweet_author": 30 * 24 * 3600,
+    "user_timeline": 15 * 60,
+}
+
+
+class LookupCache:
+    """
+    Arguments:
+        path        (str): SQLite file of the cache, created if missing
+        ttls       (dict): endpoint -> seconds a response stays fresh [optional, DEFAULT_TTLS]
+        max_entries (int): keys kept before the least recently used are evicted
+        touch_interval (float): seconds before a hit records its key as used again
+    """
+
+    def __init__(
+        self,
+        path: str,
+        logger: logging.Logger,
+        ttls: dict = None,
+        max_entries: int = 100_000,
+        touch_interval: float = 3600,
+    ):
+        self.logger = logger
+        self.ttls = {**DEFAULT_TTLS, **(ttls or {})}
+        self.max_entries = max_entries
+        self.touch_interval = touch_interval
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL;")
+        self.conn.execute("""CREATE TABLE IF NOT EXISTS lookups (
+            endpoint TEXT NOT NULL,
+            key TEXT NOT NULL,
+            value TEXT NOT NULL,
+            fetched_at REAL NOT NULL,
+            used_at REAL NOT NULL,
+            PRIMARY KEY (endpoint, key));""")
+        self.conn.execute(
+            "CREATE INDEX IF NOT EXISTS lookups_used_at ON lookups (used_at);"
+        )
+        self.conn.commit()
+        # guards the connection and in_flight
+        self.lock = Lock()
+        self.in_flight = {}
+        self.counts = {}
+
+    def count(self, endpoint: str, outcome: str, n: int = 1) -> None:
+        counts = self.counts.setdefault(
+            endpoint, {"hits": 0, "misses": 0, "merged": 0, "calls": 0}
+        )
+        counts[outcome] += n
+
+    def read(self, endpoint: str, keys: list[str]) -> dict:
+        """
+        Fresh cached values of keys, marking the ones not used for touch_interval as used
+        """
+        now = time.time()
+        placeholders = ",".join("?" * len(keys))
+        rows = self.conn.execute(
+            f"SELECT key, value, used_at FROM lookups WHERE endpoint=? AND fetched_at>? "
+            f"AND key IN ({placeholders});",
+            (endpoint, now - self.ttls[endpoint], *keys),
+        ).fetchall()
+        touched = [
+            (now, endpoint, key)
+            for key, _, used_at in rows
+            if used_at < now - self.touch_interval
+        ]
+        if touched:
+            self.conn.executemany(
+                "UPDATE lookups SET used_at=? WHERE endpoint=? AND key=?;", touched
+            )
+            self.conn.commit()
+        return {key: json.loads(value) for key, value, _ in rows}
+
+    def write(self, endpoint: str, values: dict) -> None:
+        now = time.time()
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO lookups VALUES (?,?,?,?,?);",
+            [
+                (endpoint, key, json.dumps(value), now, now)
+                for key, value in values.items()
+                if value is not None
+            ],
+        )
+        excess = (
+            self.conn.execute("SELECT count(*) FROM lookups;").fetchone()[0]
+            - self.max_entries
+        )
+        if excess > 0:
+            self.conn.execute(
+                "DELETE FROM lookups WHERE rowid IN "
+                "(SELECT rowid FROM lookups ORDER BY used_at LIMIT ?);",
+                (excess,),
+            )
+        self.conn.commit()
+
+    def get_many(self, endpoint: str, keys: list[str], fetch) -> dict:
+        """
+        Returns key -> value for keys, None for keys fetch did not find.
+        Keys that are not cached and not being fetched by another thread are fetched with
+        one call of fetch(keys), which returns a dict of the keys it found.
+        """
+        keys = list(dict.fromkeys(keys))
+        waiting = {}
+        claimed = []
+        with self.lock:
+            found = self.read(endpoint, keys) if keys else {}
+            for key in keys:
+                if key in found:
+                    continue
+                future = self.in_flight.get((endpoint, key))
+                if future is None:
+                    future = self.in_flight[(endpoint, key)] = Future()
+                    claimed.append(key)
+                waiting[key] = future
+            self.count(endpoint, "hits", len(found))
+            self.count(endpoint, "misses", len(claimed))
+            self.count(endpoint, "merged", len(waiting) - len(claimed))
+            if claimed:
+                self.count(endpoint, "calls")
+
+        if claimed:
+            try:
+                fetched = fetch(claimed)
+            except Exception as err:
+                with self.lock:
+                    for key in claimed:
+                        self.in_flight.pop((endpoint, key)).set_exception(err)
+                raise
+            with self.lock:
+                self.write(endpoint, fetched)
+                for key in claimed:
+                    self.in_flight.pop((endpoint, key)).set_result(fetched.get(key))
+
+        for key, future in waiting.items():
+            found[key] = future.result()
+        return found
+
+    def get(self, endpoint: str, key: str, fetch):
+        """
+        Value of key, fetch(key) is called on a miss
+        """
+        found = self.get_many(endpoint, [key], lambda _: {key: fetch(key)})
+        return found[key]
+
+    def stats(self) -> dict:
+        """
+        Hits, misses, lookups merged into another thread's call, API calls made and the hit
+        ratio, per endpoint
+        """
+        stats = {}
+        with self.lock:
+            for endpoint, counts in self.counts.items():
+                lookups = counts["hits"] + counts["misses"] + counts["merged"]
+                stats[endpoint] = {
+                    **counts,
+                    "hit_ratio": (
+                        (counts["hits"] + counts["merged"]) / lookups
+                        if lookups
+                        else 0.0
+                    ),
+                }
+        return stats
+
+    def close(self) -> None:
+        with self.lock:
+            self.conn.close()
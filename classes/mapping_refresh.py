@@ -0,0 +1,174 @@
+"""
+Live refresh of the user_id -> user_name mapping the parse stage looks authors up in.
+A trigger on id_name_mapping (see install_mapping_trigger) stamps every changed row with
+updated_at and sends it on the id_name_mapping channel. MappingRefresher LISTENs on its own
+connection and writes each change straight into the mapping dict.
+
+The parse stage never takes a lock for this: it only reads single keys, and single-key
+assignment and removal are atomic for a dict, so a lookup sees either the old or the new
+name. After connecting, or reconnecting, the refresher catches up on the rows changed since
+its watermark, the newest updated_at it has applied, instead of reloading the table.
+"""
+
+# native
+from datetime import datetime, timedelta
+import json
+import logging
+from threading import Event, Thread
+
+# packages
+import psycopg
+from psycopg.conninfo import make_conninfo
+import psycopg.sql as psql
+
+CHANNEL = "id_name_mapping"
+# how far back a catch-up reaches before the watermark, for transactions that stamped
+# updated_at before the last applied row but committed after it
+CATCH_UP_OVERLAP = timedelta(seconds=60)
+
+
+def install_mapping_trigger(conn: psycopg.Connection) -> None:
+    """
+    Adds updated_at to id_name_mapping and the trigger that stamps and announces changes
+    """
+    conn.execute(
+        psql.SQL(
+            "ALTER TABLE {} ADD COLUMN IF NOT EXISTS updated_at "
+            "TIMESTAMPTZ NOT NULL DEFAULT now();"
+        ).format(psql.Identifier("id_name_mapping"))
+    )
+    conn.execute(
+        psql.SQL("""CREATE OR REPLACE FUNCTION {}() RETURNS trigger AS $$
+            BEGIN
+                IF TG_OP = 'DELETE' THEN
+                    PERFORM pg_notify({}, json_build_object(
+                        'user_id', OLD.user_id, 'user_name', NULL)::text);
+                    RETURN OLD;
+                END IF;
+                NEW.updated_at := clock_timestamp();
+                PERFORM pg_notify({}, json_build_object(
+                    'user_id', NEW.user_id, 'user_name', NEW.user_name,
+                    'updated_at', NEW.updated_at)::text);
+                RETURN NEW;
+            END;
+            $$ LANGUAGE plpgsql;""").format(
+            psql.Identifier("notify_id_name_mapping"),
+            psql.Literal(CHANNEL),
+            psql.Literal(CHANNEL),
+        )
+    )
+    conn.execute(
+        psql.SQL("DROP TRIGGER IF EXISTS {} ON {};").format(
+            psql.Identifier("id_name_mapping_changed"),
+            psql.Identifier("id_name_mapping"),
+        )
+    )
+    conn.execute(
+        psql.SQL(
+            "CREATE TRIGGER {} BEFORE INSERT OR UPDATE OR DELETE ON {} "
+            "FOR EACH ROW EXECUTE FUNCTION {}();"
+        ).format(
+            psql.Identifier("id_name_mapping_changed"),
+            psql.Identifier("id_name_mapping"),
+            psql.Identifier("notify_id_name_mapping"),
+        )
+    )
+
+
+class MappingRefresher:
+    """
+    Arguments:
+        mapping      (dict): user_id -> user_name, updated in place
+        watermark (datetime): changes at or before this are already in mapping
+                              [optional, catch up on the whole table]
+        reconnect_interval (float): seconds between attempts while the connection is down
+    """
+
+    def __init__(
+        self,
+        db_args: dict,
+        mapping: dict,
+        killall: Event,
+        logger: logging.Logger,
+        watermark: datetime = None,
+        reconnect_interval: float = 5.0,
+    ):
+        self.db_args = db_args
+        self.mapping = mapping
+        self.killall = killall
+        self.logger = logger
+        self.watermark = watermark
+        self.reconnect_interval = reconnect_interval
+        self.applied = 0
+        self.thread = Thread(target=self.run, daemon=True)
+
+    def start(self) -> None:
+        self.thread.start()
+
+    def apply(self, user_id: int, user_name: str or None, updated_at=None) -> None:
+        if user_name is None:
+            self.mapping.pop(user_id, None)
+        else:
+            self.mapping[user_id] = user_name
+        self.applied += 1
+        if updated_at is not None and (
+            self.watermark is None or updated_at > self.watermark
+        ):
+            self.watermark = updated_at
+
+    def apply_notify(self, payload: str) -> None:
+        change = json.loads(payload)
+        updated_at = change.get("updated_at")
+        self.apply(
+            int(change["user_id"]),
+            change["user_name"],
+            datetime.fromisoformat(updated_at) if updated_at else None,
+        )
+
+    def catch_up(self, conn: psycopg.Connection) -> int:
+        """
+        Applies the rows changed since the watermark, returns how many there were
+        """
+        query = psql.SQL("SELECT user_id,user_name,updated_at FROM {}").format(
+            psql.Identifier("id_name_mapping")
+        )
+        params = ()
+        if self.watermark is not None:
+            query += psql.SQL(" WHERE updated_at > %s")
+            params = (self.watermark - CATCH_UP_OVERLAP,)
+        try:
+            rows = conn.execute(query, params).fetchall()
+        except psycopg.errors.UndefinedColumn:
+            self.logger.warning(
+                "id_name_mapping has no updated_at, run Toolkit.install_mapping_trigger"
+            )
+            return 0
+        for row in rows:
+            self.apply(*row)
+        return len(rows)
+
+    def run(self) -> None:
+        while not self.killall.is_set():
+            try:
+                with psycopg.connect(
+                    make_conninfo(**self.db_args), autocommit=True
+                ) as conn:
+                    # listen first, so nothing committed during the catch-up is missed
+                    conn.execute(
+                        psql.SQL("LISTEN {};").format(psql.Identifier(CHANNEL))
+                    )
+                    caught_up = self.catch_up(conn)
+                    self.logger.info(f"Mapping refresher caught up on {caught_up} rows")
+                    while not self.killall.is_set():
+                        for notify in conn.notifies(timeout=1.0):
+                            self.apply_notify(notify.payload)
+            except psycopg.Error as err:
+                self.logger.error(f"Mapping refresher lost its connection {err}")
+                self.killall.wait(self.reconnect_interval)
+
+    def stats(self) -> dict:
+        return {
+            "applied": self.applied,
+            "watermark": self.watermark,
+            "mapped": len(self.mapping),
+        }
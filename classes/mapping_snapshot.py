@@ -0,0 +1,66 @@
+"""
+On-disk snapshot of the author mapping, so the pipeline starts without reading all of
+id_name_mapping. The snapshot is a CompactMapping buffer behind a small header:
+    <magic 8s><version uint64><watermark float64, epoch seconds>
+load_snapshot memory-maps the file and reads the mapping straight from the page cache, then
+only the rows changed after the watermark need to be applied (MappingRefresher.catch_up).
+Authors deleted from id_name_mapping while the pipeline was down stay in the mapping until
+the next full download, a missing or outdated snapshot.
+"""
+
+# native
+from datetime import datetime, timezone
+import logging
+import mmap
+import os
+import struct
+
+# lib
+from .compact_mapping import CompactMapping, pack
+
+MAGIC = b"TASNAP\x00\x00"
+VERSION = 1
+_HEADER = struct.Struct("<8sQd")
+
+
+def write_snapshot(path: str, mapping, watermark: datetime) -> None:
+    """
+    Writes mapping and the updated_at it is current up to, replacing any older snapshot
+    """
+    # a copy, the mapping refresher may be changing it
+    packed = pack(
+        mapping.copy() if isinstance(mapping, dict) else dict(mapping.items())
+    )
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as snapshot:
+        snapshot.write(_HEADER.pack(MAGIC, VERSION, watermark.timestamp()))
+        snapshot.write(packed)
+        snapshot.flush()
+        os.fsync(snapshot.fileno())
+    # readers see either the old snapshot or the new one
+    os.replace(tmp_path, path)
+
+
+def load_snapshot(
+    path: str, logger: logging.Logger
+) -> tuple[CompactMapping, datetime] or None:
+    """
+    Memory-maps the snapshot at path, returns the mapping and its watermark.
+    Returns None if there is no usable snapshot.
+    """
+    try:
+        with open(path, "rb") as snapshot:
+            buffer = mmap.mmap(snapshot.fileno(), 0, access=mmap.ACCESS_READ)
+    except (FileNotFoundError, ValueError):
+        # ValueError for an empty file, which cannot be mapped
+        return None
+    try:
+        magic, version, watermark = _HEADER.unpack_from(buffer)
+        if magic != MAGIC or version != VERSION:
+            logger.warning(f"Ignoring mapping snapshot {path}, version {version}")
+            return None
+        mapping = CompactMapping(memoryview(buffer)[_HEADER.size :])
+    except (struct.error, ValueError, TypeError) as err:
+        logger.warning(f"Ignoring damaged mapping snapshot {path} {err}")
+        return None
+    return mapping, datetime.fromtimestamp(watermark, timezone.utc)
@@ -0,0 +1,106 @@
+"""
+Write-behind upsert of authors the parse stage resolved from stream payloads.
+The stream asks for expansions=author_id, so every payload carries its author's user object
+in includes.users. When an author is missing from the mapping, the parse stage takes the
+name from there and hands it to MappingWriter, which upserts the new authors into
+id_name_mapping in batches from its own thread: no extra API call, and no round trip on
+the parse path.
+"""
+
+# native
+import logging
+import queue
+from threading import Event, Thread
+
+# packages
+import psycopg
+import psycopg.sql as psql
+from psycopg_pool import ConnectionPool, PoolTimeout
+
+
+class MappingWriter:
+    """
+    Arguments:
+        pool  (ConnectionPool): Postgres pool holding id_name_mapping
+        flush_interval (float): seconds between upserts
+        max_batch        (int): most authors per upsert
+    """
+
+    def __init__(
+        self,
+        pool: ConnectionPool,
+        logger: logging.Logger,
+        flush_interval: float = 5.0,
+        max_batch: int = 500,
+    ):
+        self.pool = pool
+        self.logger = logger
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self.pending = queue.SimpleQueue()
+        self.stopping = Event()
+        self.written = 0
+        self.thread = Thread(target=self.run, daemon=True)
+
+    def start(self) -> None:
+        self.thread.start()
+
+    def put(self, user_id: int, user_name: str, full_name: str = None) -> None:
+        self.pending.put((user_id, user_name, full_name))
+
+    def take(self) -> list[tuple]:
+        # the latest name wins when an author shows up twice
+        batch = {}
+        while len(batch) < self.max_batch:
+            try:
+                user = self.pending.get_nowait()
+            except queue.Empty:
+                break
+            batch[user[0]] = user
+        return list(batch.values())
+
+    def flush(self) -> int:
+        """
+        Upserts the authors waiting, returns how many were written.
+        If Postgres is unavailable they are kept for the next flush.
+        """
+        written = 0
+        while batch := self.take():
+            try:
+                with self.pool.connection() as conn:
+                    cur = conn.cursor()
+                    cur.executemany(
+                        psql.SQL(
+                            """INSERT INTO {} (user_id,user_name,user_full_name) VALUES (%s,%s,%s)
+                            ON CONFLICT (user_id) DO UPDATE SET user_name=EXCLUDED.user_name,
+                            user_full_name=COALESCE(EXCLUDED.user_full_name, {}.user_full_name);"""
+                        ).format(
+                            psql.Identifier("id_name_mapping"),
+                            psql.Identifier("id_name_mapping"),
+                        ),
+                        batch,
+                    )
+                    conn.commit()
+            except (PoolTimeout, psycopg.Error) as err:
+                self.logger.error(f"Failure to add {len(batch)} authors {err}")
+                for user in batch:
+                    self.pending.put(user)
+                break
+            written += len(batch)
+        if written:
+            self.written += written
+            self.logger.info(f"Added {written} authors resolved from the stream")
+        return written
+
+    def run(self) -> None:
+        while not self.stopping.wait(self.flush_interval):
+            self.flush()
+
+    def stop(self) -> None:
+        """
+        Stops the thread and writes whatever is still waiting
+        """
+        self.stopping.set()
+        if self.thread.is_alive():
+            self.thread.join()
+        self.flush()
@@ -0,0 +1,109 @@
+"""
+Parse stage sharded across worker processes.
+JSON decoding, field extraction and the author-name join run outside the process that
+reads the stream and writes to Postgres, so they no longer compete for its GIL.
+At most max_in_flight chunks are handed to the workers before their rows are taken, so a
+burst waits in the bounded stage queue instead of the pool's unbounded task queue.
+"""
+
+# native
+import logging
+import multiprocessing
+from queue import Queue
+from threading import Semaphore, Thread
+
+# lib
+from .decoder import StreamRecord, decode_line
+
+_id_mapping = None
+
+
+def init_worker(id_mapping: dict) -> None:
+    global _id_mapping
+    _id_mapping = id_mapping
+
+
+def parse_lines(lines: list[bytes]) -> list[tuple]:
+    """
+    Parses raw stream lines into tweets table rows.
+    Authors missing from the mapping are named from the payload's includes.users, or left
+    as None without one. The mapping a worker starts with goes stale while the pipeline
+    runs, so the process that receives the rows has the final say on author names.
+    """
+    rows = []
+    for line in lines:
+        record = decode_line(line)
+        # notices are logged by the handler before the lines get here
+        if not isinstance(record, StreamRecord):
+            continue
+        author_name = _id_mapping.get(record.author_id)
+        if author_name is None and record.author_username is not None:
+            author_name = _id_mapping[record.author_id] = record.author_username
+        rows.append(
+            (
+                record.tweet_id,
+                record.author_id,
+                author_name,
+                record.text.replace("\n", ""),
+            )
+        )
+    return rows
+
+
+class ParseWorkerPool:
+    """
+    Arguments:
+        workers    (int): number of parse processes
+        id_mapping (dict): user_id -> user_name, copied into every worker at start.
+                           A shared CompactMapping is attached to instead of copied
+        chunk_size (int): most lines sent to a worker at once
+        max_in_flight (int): chunks sent to the workers and not yet taken back
+                             [optional, 4 per worker]
+    """
+
+    def __init__(
+        self,
+        workers: int,
+        id_mapping: dict,
+        logger: logging.Logger,
+        chunk_size: int = 256,
+        max_in_flight: int = None,
+    ):
+        self.workers = workers
+        self.chunk_size = chunk_size
+        self.max_in_flight = max_in_flight or 4 * workers
+        self.logger = logger
+        self.pool = multiprocessing.Pool(
+            workers, initializer=init_worker, initargs=(id_mapping,)
+        )
+
+    def parse(self, line_chunks):
+        """
+        Yields the rows of each chunk of lines, in the order the chunks were given,
+        so every author's tweets reach the writer in the order they were received.
+        line_chunks is read on a feeder thread, rows are handed on as soon as they are
+        parsed even while it waits for more lines.
+        """
+        slots = Semaphore(self.max_in_flight)
+        results = Queue()
+
+        def feed():
+            try:
+                for lines in line_chunks:
+                    slots.acquire()
+                    results.put(self.pool.apply_async(parse_lines, (lines,)))
+                results.put(None)
+            except Exception as err:
+                results.put(err)
+
+        Thread(target=feed, name="Parse_Feeder", daemon=True).start()
+        while (result := results.get()) is not None:
+            if isinstance(result, Exception):
+                raise result
+            rows = result.get()
+            slots.release()
+            yield rows
+
+    def close(self) -> None:
+        self.pool.close()
+        self.pool.join()
@@ -0,0 +1,134 @@
+"""
+Monthly range partitions for the tweets table.
+Tweet ids are snowflakes: the top 42 bits are milliseconds since the Twitter epoch, so a
+time range is an id range and the table can be partitioned on tweet_id, its primary key,
+without storing a timestamp. Each month gets its own partition, named tweets_y2022m03, and
+anything outside the months created so far (the id=1 test tweet, a stream that outran
+create_partitions) lands in tweets_default instead of failing the insert.
+
+Postgres checks tweets_default for rows of a month before that month's partition can be
+created, so partitions are created ahead of time: see PostgresPipe.maintain_partitions.
+"""
+
+# native
+from datetime import datetime, timezone
+import logging
+
+# packages
+import psycopg
+import psycopg.sql as psql
+
+TWITTER_EPOCH_MS = 1288834974657
+TIMESTAMP_SHIFT = 22
+
+
+def snowflake_id(ts: float) -> int:
+    """
+    Smallest tweet id posted at epoch seconds ts or later
+    """
+    return max(0, int(ts * 1000) - TWITTER_EPOCH_MS) << TIMESTAMP_SHIFT
+
+
+def snowflake_time(tweet_id: int) -> float:
+    """
+    Epoch seconds at which tweet_id was posted
+    """
+    return ((tweet_id >> TIMESTAMP_SHIFT) + TWITTER_EPOCH_MS) / 1000
+
+
+def month_start(ts: float, months: int = 0) -> datetime:
+    """
+    Start of the month holding ts, moved by months
+    """
+    date = datetime.fromtimestamp(ts, timezone.utc)
+    month = date.year * 12 + date.month - 1 + months
+    return datetime(month // 12, month % 12 + 1, 1, tzinfo=timezone.utc)
+
+
+def month_ranges(start_ts: float, end_ts: float, table: str = "tweets") -> list[tuple]:
+    """
+    (partition name, first tweet id, first tweet id of the next month) for every month
+    from the one holding start_ts through the one holding end_ts
+    """
+    ranges = []
+    month = month_start(start_ts)
+    while month.timestamp() <= end_ts:
+        following = month_start(month.timestamp(), 1)
+        ranges.append(
+            (
+                f"{table}_y{month.year}m{month.month:02d}",
+                snowflake_id(month.timestamp()),
+                snowflake_id(following.timestamp()),
+            )
+        )
+        month = following
+    return ranges
+
+
+def is_partitioned(conn: psycopg.Connection, table: str = "tweets") -> bool:
+    cur = conn.execute(
+        "SELECT EXISTS (SELECT 1 FROM pg_partitioned_table "
+        "WHERE partrelid = to_regclass(%s))",
+        (table,),
+    )
+    return cur.fetchone()[0]
+
+
+def create_partitioned_table(conn: psycopg.Connection, table: str = "tweets") -> None:
+    """
+    Creates the partitioned table with its default partition and author_id index
+    """
+    conn.execute(
+        psql.SQL("""CREATE TABLE {} (
+            tweet_id BIGINT NOT NULL,
+            author_id BIGINT NOT NULL,
+            author_name TEXT NOT NULL,
+            tweet_text TEXT NOT NULL,
+            PRIMARY KEY (tweet_id)) PARTITION BY RANGE (tweet_id);""").format(
+            psql.Identifier(table)
+        )
+    )
+    conn.execute(
+        psql.SQL("CREATE TABLE {} PARTITION OF {} DEFAULT;").format(
+            psql.Identifier(f"{table}_default"), psql.Identifier(table)
+        )
+    )
+    # created on every partition, current and future
+    conn.execute(
+        psql.SQL("CREATE INDEX {} ON {} (author_id, tweet_id);").format(
+            psql.Identifier(f"{table}_author_id_idx"), psql.Identifier(table)
+        )
+    )
+
+
+def create_partitions(
+    conn: psycopg.Connection,
+    start_ts: float,
+    end_ts: float,
+    logger: logging.Logger,
+    table: str = "tweets",
+) -> list[str]:
+    """
+    Creates the monthly partitions from start_ts through end_ts that do not exist yet,
+    returns the names of the new ones
+    """
+    created = []
+    for name, low, high in month_ranges(start_ts, end_ts, table):
+        cur = conn.execute("SELECT to_regclass(%s) IS NULL", (name,))
+        if not cur.fetchone()[0]:
+            continue
+        # DDL takes no bind parameters, the bounds go in as literals
+        conn.execute(
+            psql.SQL(
+                "CREATE TABLE {} PARTITION OF {} FOR VALUES FROM ({}) TO ({});"
+            ).format(
+                psql.Identifier(name),
+                psql.Identifier(table),
+                psql.Literal(low),
+                psql.Literal(high),
+            )
+        )
+        created.append(name)
+    if created:
+        logger.info(f"Created partitions {created}")
+    return created
@@ -0,0 +1,170 @@
+"""
+Pipeline-mode writer for the tweets table.
+PostgresPipe waits for the server after every statement of a batch and after its commit, so
+on a link to a remote Postgres most of its time goes to round trips. PipelineWriter sends up
+to max_in_flight inserts on one async connection without waiting for any of them, then
+collects every result with a single sync: one round trip per window instead of one per
+statement. The statements between two syncs run as one implicit transaction, so a window
+is committed, or rolled back, as a whole.
+
+Rows are durable once they are acknowledged: on_ack is called with the tweet ids of every
+window the server has committed, and acked counts them. A window that could not reach the
+server is retried on a new connection with backoff, holding the pipeline back until it is
+stored; once killall is set it gets exit_retries more tries before it is dropped.
+"""
+
+# native
+import asyncio
+import logging
+from threading import Event
+import time
+
+# packages
+import psycopg
+from psycopg.conninfo import make_conninfo
+import psycopg.sql as psql
+
+INSERT = psql.SQL(
+    "INSERT INTO {} (tweet_id,author_id,author_name,tweet_text) "
+    "VALUES (%s,%s,%s,%s) ON CONFLICT (tweet_id) DO NOTHING"
+).format(psql.Identifier("tweets"))
+
+
+class PipelineWriter:
+    """
+    Arguments:
+        db_args        (dict): Postgres connection arguments, like get_pool takes
+        max_in_flight   (int): inserts sent before waiting for their results
+        on_ack     (callable): called with the tweet ids of each committed window,
+                               from the event loop so it must not block [optional]
+        killall       (Event): set when the pipeline is shutting down [optional]
+        retry_interval (float): seconds to wait after losing the connection, doubled on
+                                every failure in a row up to max_retry_interval
+        exit_retries    (int): tries left for a window once killall is set
+    """
+
+    def __init__(
+        self,
+        db_args: dict,
+        logger: logging.Logger,
+        max_in_flight: int = 500,
+        on_ack=None,
+        killall: Event = None,
+        retry_interval: float = 1.0,
+        max_retry_interval: float = 60.0,
+        exit_retries: int = 3,
+    ):
+        self.db_args = db_args
+        self.logger = logger
+        self.max_in_flight = max_in_flight
+        self.on_ack = on_ack
+        self.killall = killall or Event()
+        self.retry_interval = retry_interval
+        self.max_retry_interval = max_retry_interval
+        self.exit_retries = exit_retries
+        self.conn = None
+        self.acked = 0
+        self.failed = 0
+        self.retries = 0
+        self.syncs = 0
+        self.last_ack = None
+
+    async def connect(self) -> None:
+        self.conn = await psycopg.AsyncConnection.connect(
+            make_conninfo(**self.db_args), autocommit=True
+        )
+        self.logger.info("Pipeline writer connected")
+
+    async def close(self) -> None:
+        if self.conn is not None:
+            await self.conn.close()
+            self.conn = None
+
+    async def write(self, rows: list[tuple]) -> None:
+        """
+        Sends rows in windows of max_in_flight inserts, returns once all of them are acked.
+        A window that fails is retried one row at a time, so only the bad rows are dropped.
+        """
+        for start in range(0, len(rows), self.max_in_flight):
+            await self.write_window(rows[start : start + self.max_in_flight])
+
+    async def write_window(self, window: list[tuple]) -> bool:
+        """
+        Stores one window, retrying on a new connection while the server cannot be reached.
+        Returns False if the window was dropped at shutdown.
+        """
+        delay = self.retry_interval
+        exit_tries = 0
+        while True:
+            try:
+                await self.send_window(window)
+                return True
+            except psycopg.OperationalError as err:
+                await self.close()
+                if self.killall.is_set():
+                    exit_tries += 1
+                    if exit_tries > self.exit_retries:
+                        self.failed += len(window)
+                        self.logger.error(
+                            f"Dropping {len(window)} rows, Postgres unreachable at "
+                            f"shutdown {err}"
+                        )
+                        return False
+                    delay = min(delay, self.retry_interval)
+                self.retries += 1
+                self.logger.warning(
+                    f"Window of {len(window)} rows not stored, retrying in "
+                    f"{delay:.1f}s {err}"
+                )
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, self.max_retry_interval)
+
+    async def send_window(self, window: list[tuple]) -> None:
+        if self.conn is None or self.conn.closed:
+            await self.connect()
+        try:
+            async with self.conn.pipeline() as pipeline:
+                async with self.conn.cursor() as cur:
+                    await cur.executemany(INSERT, window)
+                await pipeline.sync()
+        except psycopg.OperationalError:
+            raise
+        except psycopg.Error as err:
+            self.logger.warning(f"Window failed, retrying rows one at a time {err}")
+            await self.write_rows(window)
+        else:
+            self.ack(window)
+
+    async def write_rows(self, rows: list[tuple]) -> None:
+        """
+        Inserts rows one at a time, dropping the bad ones.
+        If the connection is lost the rows already acked are removed from rows before the
+        error is raised, so a retry only sends the rest.
+        """
+        for done, row in enumerate(rows):
+            try:
+                await self.conn.execute(INSERT, row)
+            except psycopg.OperationalError:
+                del rows[:done]
+                raise
+            except psycopg.Error as err:
+                self.failed += 1
+                self.logger.error(f"Failure to add data {row[0]} {err}")
+            else:
+                self.ack([row])
+
+    def ack(self, rows: list[tuple]) -> None:
+        self.syncs += 1
+        self.acked += len(rows)
+        self.last_ack = time.time()
+        if self.on_ack is not None:
+            self.on_ack([row[0] for row in rows])
+
+    def stats(self) -> dict:
+        return {
+            "acked": self.acked,
+            "failed": self.failed,
+            "retries": self.retries,
+            "syncs": self.syncs,
+            "last_ack": self.last_ack,
+        }
@@ -0,0 +1,146 @@
+"""
+Per-endpoint rate limit tracking for the Twitter API.
+Every response carries x-rate-limit-limit/-remaining/-reset headers; the scheduler keeps
+a token bucket per endpoint (method and path) from them. Requests go out as fast as the
+bucket allows and callers wait for the next window once it is empty, instead of running
+into 429s.
+While an endpoint's budget is unknown, before its first response or once its window has
+reset, a single request goes out and the others wait for the headers it brings back.
+"""
+
+# native
+from dataclasses import dataclass
+import logging
+import re
+from threading import Condition
+import time
+from urllib.parse import urlparse
+
+
+@dataclass
+class TokenBucket:
+    """
+    Request budget for one endpoint in the current rate limit window
+    """
+
+    limit: int
+    remaining: int
+    reset: float  # epoch seconds when the window resets
+
+    def get_dict(self):
+        return {"limit": self.limit, "remaining": self.remaining, "reset": self.reset}
+
+
+class RateLimitScheduler:
+    """
+    Thread safe, callers block in acquire() until their endpoint has budget left.
+
+    Arguments:
+        margin        (float): seconds to wait past the reset time for clock skew
+        probe_timeout (float): seconds the request learning an endpoint's budget has before
+                               another one is let through
+    """
+
+    def __init__(
+        self, logger: logging.Logger, margin: float = 1.0, probe_timeout: float = 60.0
+    ):
+        self.logger = logger
+        self.margin = margin
+        self.probe_timeout = probe_timeout
+        self.buckets = {}
+        # endpoint -> when the request learning its budget was let through
+        self.probes = {}
+        self.condition = Condition()
+
+    @staticmethod
+    def endpoint(url: str, method: str = "GET") -> str:
+        """
+        Maps a request onto its rate limit bucket, e.g. GET
+        https://api.twitter.com/2/users/1234/tweets?max_results=5 -> GET /2/users/:id/tweets
+        """
+        # ids are long numbers, the api version segment (/2) is not
+        path = re.sub(r"/\d{2,}(?=/|$)", "/:id", urlparse(url).path)
+        return f"{method.upper()} {path}"
+
+    def acquire(self, url: str, method: str = "GET") -> None:
+        endpoint = self.endpoint(url, method)
+        with self.condition:
+            while True:
+                bucket = self.buckets.get(endpoint)
+                now = time.time()
+                if bucket is None or now >= bucket.reset:
+                    # unknown budget or a new window, the next response tells us the real one
+                    since = self.probes.get(endpoint)
+                    if since is None or now - since >= self.probe_timeout:
+                        self.probes[endpoint] = now
+                        return
+                    self.condition.wait(since + self.probe_timeout - now)
+                    continue
+                if bucket.remaining > 0:
+                    bucket.remaining -= 1
+                    return
+                wait = bucket.reset - now + self.margin
+                self.logger.warning(
+                    f"Rate limit reached for {endpoint}, waiting {wait:.0f} seconds"
+                )
+                self.condition.wait(wait)
+
+    def update(self, url: str, headers, method: str = "GET") -> None:
+        """
+        Updates the endpoint's bucket from the rate limit headers of a response
+        """
+        try:
+            limit = int(headers["x-rate-limit-limit"])
+            remaining = int(headers["x-rate-limit-remaining"])
+            reset = float(headers["x-rate-limit-reset"])
+        except (KeyError, ValueError):
+            self.release(url, method)
+            return
+        endpoint = self.endpoint(url, method)
+        with self.condition:
+            self.probes.pop(endpoint, None)
+            bucket = self.buckets.get(endpoint)
+            if bucket is None or reset > bucket.reset:
+                self.buckets[endpoint] = TokenBucket(limit, remaining, reset)
+            else:
+                # responses can arrive out of order, trust the lowest count in a window
+                bucket.limit = limit
+                bucket.remaining = min(bucket.remaining, remaining)
+            self.condition.notify_all()
+
+    def release(self, url: str, method: str = "GET") -> None:
+        """
+        Lets the next request through after one that brought back no budget
+        (no rate limit headers, or no response at all)
+        """
+        with self.condition:
+            if self.probes.pop(self.endpoint(url, method), None) is not None:
+                self.condition.notify_all()
+
+    def exhaust(self, url: str, reset: float = None, method: str = "GET") -> None:
+        """
+        Marks the endpoint as empty until reset, used when the API answers 429
+        """
+        endpoint = self.endpoint(url, method)
+        with self.condition:
+            bucket = self.buckets.get(endpoint)
+            # a reset already in the past (clock skew) would retry straight into another 429
+            reset = max(reset or time.time() + 60, time.time() + max(self.margin, 1))
+            if bucket is None:
+                self.buckets[endpoint] = TokenBucket(0, 0, reset)
+            else:
+                bucket.remaining = 0
+                bucket.reset = max(bucket.reset, reset)
+
+    def budget(self, url: str = None, method: str = "GET") -> dict:
+        """
+        Returns the bucket for url as a dict, or every known bucket keyed by endpoint.
+        Unknown endpoints return None.
+        """
+        with self.condition:
+            if url is not None:
+                bucket = self.buckets.get(self.endpoint(url, method))
+                return bucket.get_dict() if bucket else None
+            return {
+                endpoint: bucket.get_dict() for endpoint, bucket in self.buckets.items()
+            }
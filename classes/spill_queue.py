@@ -0,0 +1,219 @@
+"""
+Bounded stage queue that spills to disk instead of growing without limit.
+Up to high_watermark items are kept in memory; past that, items are appended to overflow
+files and read back in order once the consumer catches up. The overflow is split into
+segment files of about segment_bytes, and each segment is deleted as soon as it has been
+read back, so the space is reclaimed while the consumer catches up rather than after.
+"""
+
+# native
+from collections import deque
+import os
+import pickle
+import queue
+import struct
+from threading import Condition
+import time
+
+_LENGTH = struct.Struct("<I")
+
+
+class SpillQueue:
+    """
+    Drop-in for queue.Queue (put/get/get_nowait/empty/qsize) between pipeline stages.
+
+    Arguments:
+        spill_path      (str): prefix of the overflow segments (spill_path.000000, ...),
+                               items left in them by a previous run are recovered
+        high_watermark  (int): items kept in memory before spilling
+        max_spill_bytes (int): once the overflow segments are this big, put() blocks until
+                               the consumer has read some back, None for no limit
+        segment_bytes   (int): size past which the next overflow segment is started
+    """
+
+    def __init__(
+        self,
+        spill_path: str,
+        high_watermark: int = 100_000,
+        max_spill_bytes: int = 1 << 30,
+        segment_bytes: int = 64 << 20,
+    ):
+        self.spill_path = spill_path
+        self.high_watermark = high_watermark
+        self.max_spill_bytes = max_spill_bytes
+        self.segment_bytes = segment_bytes
+        self.memory = deque()
+        self.condition = Condition()
+        self.spilled = 0
+        self.spilled_total = 0
+        self.max_depth = 0
+        # indexes of the overflow segments on disk, the reader is on the first one and the
+        # writer on the last one
+        self.segments = deque()
+        self.disk_bytes = 0
+
+        os.makedirs(os.path.dirname(spill_path) or ".", exist_ok=True)
+        self.spilled = self.count_records()
+        if not self.segments:
+            self.segments.append(0)
+        self.writer = open(self.segment_path(self.segments[-1]), "ab")
+        self.reader = open(self.segment_path(self.segments[0]), "rb")
+
+    def segment_path(self, index: int) -> str:
+        return f"{self.spill_path}.{index:06d}"
+
+    def count_records(self) -> int:
+        """
+        Counts the items a previous run left on disk, dropping a record cut off by a crash
+        """
+        directory = os.path.dirname(self.spill_path) or "."
+        prefix = f"{os.path.basename(self.spill_path)}."
+        indexes = sorted(
+            int(name[len(prefix) :])
+            for name in os.listdir(directory)
+            if name.startswith(prefix) and name[len(prefix) :].isdigit()
+        )
+        count = 0
+        for index in indexes:
+            path = self.segment_path(index)
+            records = 0
+            self.reader = open(path, "rb")
+            while self.read_record() is not None:
+                records += 1
+            end = self.reader.tell()
+            self.reader.close()
+            if records:
+                os.truncate(path, end)
+                self.segments.append(index)
+                self.disk_bytes += end
+                count += records
+            else:
+                os.remove(path)
+        return count
+
+    def read_record(self):
+        header = self.reader.read(_LENGTH.size)
+        if len(header) < _LENGTH.size:
+            return None
+        (length,) = _LENGTH.unpack(header)
+        data = self.reader.read(length)
+        if len(data) < length:
+            # cut off mid-write by a crash
+            self.reader.seek(-(len(header) + len(data)), os.SEEK_CUR)
+            return None
+        return pickle.loads(data)
+
+    def spill_bytes(self) -> int:
+        return self.disk_bytes
+
+    def rotate(self) -> None:
+        """
+        Starts a new segment for the writer
+        """
+        self.writer.close()
+        self.segments.append(self.segments[-1] + 1)
+        self.writer = open(self.segment_path(self.segments[-1]), "ab")
+
+    def drop_oldest(self) -> None:
+        """
+        Deletes the segment the reader has finished and moves it on to the next one
+        """
+        path = self.segment_path(self.segments.popleft())
+        self.disk_bytes -= os.path.getsize(path)
+        self.reader.close()
+        os.remove(path)
+        self.reader = open(self.segment_path(self.segments[0]), "rb")
+
+    def read_done(self) -> bool:
+        return self.reader.tell() >= os.fstat(self.reader.fileno()).st_size
+
+    def put(self, item, block=True, timeout=None) -> None:
+        with self.condition:
+            if self.max_spill_bytes is not None and block:
+                self.condition.wait_for(
+                    lambda: self.spill_bytes() < self.max_spill_bytes, timeout
+                )
+            # once anything is on disk, newer items go behind it to keep the order
+            if self.spilled or len(self.memory) >= self.high_watermark:
+                if self.writer.tell() >= self.segment_bytes:
+                    self.rotate()
+                data = pickle.dumps(item, pickle.HIGHEST_PROTOCOL)
+                self.writer.write(_LENGTH.pack(len(data)) + data)
+                self.disk_bytes += _LENGTH.size + len(data)
+                self.spilled += 1
+                self.spilled_total += 1
+            else:
+                self.memory.append(item)
+                self.max_depth = max(self.max_depth, len(self.memory))
+            self.condition.notify()
+
+    def refill(self) -> None:
+        """
+        Moves spilled items back into memory, oldest first
+        """
+        self.writer.flush()
+        while self.spilled and len(self.memory) < self.high_watermark:
+            if len(self.segments) > 1 and self.read_done():
+                self.drop_oldest()
+            self.memory.append(self.read_record())
+            self.spilled -= 1
+        if not self.spilled:
+            # everything is back in memory, start over in the writer's segment
+            while len(self.segments) > 1:
+                self.drop_oldest()
+            self.writer.truncate(0)
+            self.writer.seek(0)
+            self.reader.seek(0)
+            self.disk_bytes = 0
+        elif len(self.segments) > 1 and self.read_done():
+            self.drop_oldest()
+        self.condition.notify_all()
+
+    def get(self, block=True, timeout=None):
+        with self.condition:
+            if not block:
+                timeout = 0
+            deadline = None if timeout is None else time.monotonic() + timeout
+            while not self.memory and not self.spilled:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    raise queue.Empty
+                self.condition.wait(remaining)
+            if not self.memory:
+                self.refill()
+            item = self.memory.popleft()
+            if self.spilled and len(self.memory) < self.high_watermark // 2:
+                self.refill()
+            return item
+
+    def get_nowait(self):
+        return self.get(block=False)
+
+    def qsize(self) -> int:
+        with self.condition:
+            return len(self.memory) + self.spilled
+
+    def empty(self) -> bool:
+        return self.qsize() == 0
+
+    def stats(self) -> dict:
+        """
+        Current depth in memory and on disk, plus totals for sizing a deployment
+        """
+        with self.condition:
+            return {
+                "memory_depth": len(self.memory),
+                "max_memory_depth": self.max_depth,
+                "spilled": self.spilled,
+                "spilled_total": self.spilled_total,
+                "spill_bytes": self.spill_bytes(),
+                "segments": len(self.segments),
+            }
+
+    def close(self) -> None:
+        """
+        Closes the overflow segments, items still in memory are lost
+        """
+        with self.condition:
+            self.writer.close()
+            self.reader.close()
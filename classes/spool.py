@@ -0,0 +1,287 @@
+"""
+Write-ahead spool between the writer stage and Postgres.
+The writer stage appends every batch to the spool and moves on; a SpoolDrainer thread
+replays the spool into Postgres in large batches and only advances past a batch once it is
+committed. While Postgres is down or slow the batches wait on disk instead of being dropped,
+and they survive a restart of the pipeline.
+
+The spool is a directory of append-only segment files, read and written front to back:
+    <length uint32><crc32 uint32><pickled list of rows>
+The writer starts a new segment on startup and whenever one grows past max_segment_bytes.
+Drained segments are deleted, and the drain position is kept in a checkpoint file.
+A batch replayed twice after a crash is harmless, the tweets table ignores known tweet ids.
+"""
+
+# native
+import logging
+import os
+import pickle
+import struct
+from threading import Condition, Event, Lock, Thread
+import time
+import zlib
+
+_HEADER = struct.Struct("<II")
+SEGMENT_SUFFIX = ".spool"
+CHECKPOINT = "checkpoint"
+
+
+class WriteAheadSpool:
+    """
+    Arguments:
+        spool_dir         (str): directory for the segments, a spool left by a previous
+                                 run is drained first
+        max_segment_bytes (int): size at which the writer moves to a new segment
+        fsync            (bool): fsync every append, a batch is only lost to a power cut
+                                 if this is off
+    """
+
+    def __init__(
+        self,
+        spool_dir: str,
+        logger: logging.Logger = logging.getLogger("Spool"),
+        max_segment_bytes: int = 64 * 1024 * 1024,
+        fsync: bool = True,
+    ):
+        self.spool_dir = spool_dir
+        self.logger = logger
+        self.max_segment_bytes = max_segment_bytes
+        self.fsync = fsync
+        self.lock = Lock()
+        self.appended = Condition(self.lock)
+        os.makedirs(spool_dir, exist_ok=True)
+
+        self.segments = self.list_segments()
+        self.read_segment, self.read_offset = self.load_checkpoint()
+        self.reader = None
+        self.writer = None
+        self.write_segment = (self.segments[-1] + 1) if self.segments else 0
+        self.open_writer()
+        self.appended_rows = 0
+
+    def list_segments(self) -> list[int]:
+        return sorted(
+            int(name[: -len(SEGMENT_SUFFIX)])
+            for name in os.listdir(self.spool_dir)
+            if name.endswith(SEGMENT_SUFFIX)
+        )
+
+    def segment_path(self, segment: int) -> str:
+        return os.path.join(self.spool_dir, f"{segment:012d}{SEGMENT_SUFFIX}")
+
+    def load_checkpoint(self) -> tuple:
+        try:
+            with open(os.path.join(self.spool_dir, CHECKPOINT)) as f:
+                segment, offset = (int(x) for x in f.read().split())
+        except (FileNotFoundError, ValueError):
+            return (self.segments[0] if self.segments else 0), 0
+        if segment not in self.segments:
+            return (self.segments[0] if self.segments else 0), 0
+        return segment, offset
+
+    def open_writer(self) -> None:
+        if self.writer is not None:
+            self.writer.close()
+        self.writer = open(self.segment_path(self.write_segment), "ab")
+        if self.write_segment not in self.segments:
+            self.segments.append(self.write_segment)
+
+    def append(self, rows: list[tuple]) -> None:
+        """
+        Appends one batch, it is on disk once this returns
+        """
+        data = pickle.dumps(rows, pickle.HIGHEST_PROTOCOL)
+        record = _HEADER.pack(len(data), zlib.crc32(data)) + data
+        with self.lock:
+            if self.writer.tell() > self.max_segment_bytes:
+                self.write_segment += 1
+                self.open_writer()
+            self.writer.write(record)
+            self.writer.flush()
+            if self.fsync:
+                os.fsync(self.writer.fileno())
+            self.appended_rows += len(rows)
+            self.appended.notify_all()
+
+    def read_record(self):
+        header = self.reader.read(_HEADER.size)
+        if len(header) < _HEADER.size:
+            return None
+        length, crc = _HEADER.unpack(header)
+        data = self.reader.read(length)
+        if len(data) < length or zlib.crc32(data) != crc:
+            # cut off mid-write, the writer has moved on if this is not its segment
+            self.reader.seek(-(len(header) + len(data)), os.SEEK_CUR)
+            return None
+        return pickle.loads(data)
+
+    def read(self, max_rows: int) -> tuple:
+        """
+        Reads batches from the drain position until max_rows are collected.
+        Returns the rows and the position to commit once they are stored.
+        """
+        rows = []
+        with self.lock:
+            self.writer.flush()
+            segment, offset = self.read_segment, self.read_offset
+            while len(rows) < max_rows:
+                if self.reader is None:
+                    self.reader = open(self.segment_path(segment), "rb")
+                    self.reader.seek(offset)
+                batch = self.read_record()
+                if batch is not None:
+                    rows.extend(batch)
+                    offset = self.reader.tell()
+                    continue
+                if segment == self.write_segment:
+                    break
+                if self.reader.read(1):
+                    self.logger.warning(
+                        f"Dropping damaged tail of spool segment {segment} at {offset}"
+                    )
+                # the writer is done with this segment, go on with the next one
+                self.reader.close()
+                self.reader = None
+                segment = self.segments[self.segments.index(segment) + 1]
+                offset = 0
+        return rows, (segment, offset)
+
+    def commit(self, position: tuple) -> None:
+        """
+        Marks everything before position as stored, deleting the drained segments
+        """
+        segment, offset = position
+        with self.lock:
+            self.read_segment, self.read_offset = segment, offset
+            checkpoint = os.path.join(self.spool_dir, CHECKPOINT)
+            with open(checkpoint + ".tmp", "w") as f:
+                f.write(f"{segment} {offset}")
+            os.replace(checkpoint + ".tmp", checkpoint)
+            while self.segments[0] < segment:
+                os.remove(self.segment_path(self.segments.pop(0)))
+
+    def rewind(self) -> None:
+        """
+        Goes back to the last committed position after a failed write
+        """
+        with self.lock:
+            if self.reader is not None:
+                self.reader.close()
+                self.reader = None
+
+    def wait(self, timeout: float) -> None:
+        with self.lock:
+            if not self.backlog_bytes():
+                self.appended.wait(timeout)
+
+    def backlog_bytes(self) -> int:
+        """
+        Bytes appended but not drained yet
+        """
+        size = -self.read_offset
+        for segment in self.segments:
+            if segment >= self.read_segment:
+                size += (
+                    self.writer.tell()
+                    if segment == self.write_segment
+                    else os.path.getsize(self.segment_path(segment))
+                )
+        return size
+
+    def close(self) -> None:
+        with self.lock:
+            self.writer.close()
+            if self.reader is not None:
+                self.reader.close()
+                self.reader = None
+
+
+class SpoolDrainer:
+    """
+    Background thread replaying a WriteAheadSpool into Postgres.
+
+    Arguments:
+        write_batch (callable): stores a list of rows, returns False if Postgres could
+                                not be reached and the rows have to be retried
+        batch_rows       (int): rows read from the spool per write
+        retry_interval (float): seconds to wait after a failed write, doubled on every
+                                failure in a row up to max_retry_interval
+    """
+
+    def __init__(
+        self,
+        spool: WriteAheadSpool,
+        write_batch,
+        logger: logging.Logger,
+        batch_rows: int = 5000,
+        retry_interval: float = 1.0,
+        max_retry_interval: float = 60.0,
+    ):
+        self.spool = spool
+        self.write_batch = write_batch
+        self.logger = logger
+        self.batch_rows = batch_rows
+        self.retry_interval = retry_interval
+        self.max_retry_interval = max_retry_interval
+        self.stopping = Event()
+        self.drained = 0
+        self.batches = 0
+        self.failures = 0
+        self.write_seconds = 0.0
+        self.thread = Thread(target=self.drain, daemon=True)
+
+    def start(self) -> None:
+        self.thread.start()
+
+    def drain(self) -> None:
+        delay = self.retry_interval
+        while not self.stopping.is_set():
+            rows, position = self.spool.read(self.batch_rows)
+            if not rows:
+                if position != (self.spool.read_segment, self.spool.read_offset):
+                    # only empty batches or a finished segment, nothing to write
+                    self.spool.commit(position)
+                self.spool.wait(0.5)
+                continue
+            started = time.perf_counter()
+            if self.write_batch(rows):
+                self.write_seconds += time.perf_counter() - started
+                self.spool.commit(position)
+                self.drained += len(rows)
+                self.batches += 1
+                delay = self.retry_interval
+                continue
+            self.failures += 1
+            self.spool.rewind()
+            self.logger.warning(
+                f"Spool drain failed, {self.spool.backlog_bytes()} bytes waiting, "
+                f"retrying in {delay:.1f}s"
+            )
+            self.stopping.wait(delay)
+            delay = min(delay * 2, self.max_retry_interval)
+
+    def stop(self, timeout: float = 10.0) -> None:
+        """
+        Gives the drainer up to timeout seconds to empty the spool, then stops it after the
+        batch in progress. Whatever is left is drained on the next run.
+        """
+        deadline = time.monotonic() + timeout
+        while (
+            self.thread.is_alive()
+            and self.spool.backlog_bytes()
+            and time.monotonic() < deadline
+        ):
+            time.sleep(0.05)
+        self.stopping.set()
+        self.thread.join()
+
+    def stats(self) -> dict:
+        return {
+            "drained": self.drained,
+            "batches": self.batches,
+            "failures": self.failures,
+            "rows_per_second": (
+                self.drained / self.write_seconds if self.write_seconds else None
+            ),
+            "backlog_bytes": self.spool.backlog_bytes(),
+        }
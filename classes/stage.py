@@ -0,0 +1,52 @@
+"""
+Worker loop shared by the threaded pipeline stages.
+A stage blocks on its input queue and handles items in one flat loop, so going idle and
+waking up again costs no stack and no latency beyond the queue handoff itself.
+"""
+
+# native
+import logging
+import queue
+from threading import Event
+
+
+def run_stage(
+    name: str,
+    get_work,
+    handle,
+    killall: Event,
+    logger: logging.Logger,
+    upstream_done: Event = None,
+    poll_interval: float = 1.0,
+) -> int:
+    """
+    Handles items until killall is set, the upstream stage is done and the input is drained.
+    Returns the number of items handled.
+
+    Arguments:
+        name           (str): stage name for the logs
+        get_work  (callable): get_work(timeout) returns the next item or raises queue.Empty
+        handle    (callable): called with every item
+        killall      (Event): set when the pipeline is shutting down
+        upstream_done (Event): set once the stage feeding this one has stopped [optional]
+        poll_interval (float): seconds between shutdown checks while idle
+    """
+    handled = 0
+    idle = False
+    while True:
+        try:
+            item = get_work(poll_interval)
+        except queue.Empty:
+            if killall.is_set() and (upstream_done is None or upstream_done.is_set()):
+                break
+            if not idle:
+                logger.info(f"{name} queue is empty, waiting")
+                idle = True
+            continue
+        if idle:
+            logger.debug(f"{name} woke up")
+            idle = False
+        handle(item)
+        handled += 1
+    logger.info(f"{name} stopped after {handled} items")
+    return handled
@@ -0,0 +1,185 @@
+"""
+Supervision of the filtered-stream connection.
+A dropped or stalled connection is reopened with jittered exponential backoff instead of
+shutting the pipeline down, so the parse and writer stages keep their queued data. Every
+outage is recorded as a DisconnectWindow so downtime can be measured afterwards.
+
+Twitter sends a heartbeat every 20 seconds, so a stream that brings neither a record nor a
+heartbeat for stall_timeout (30 seconds by default, a missed heartbeat and then some) is
+dead even if the socket never closes. The handler reads the stream with that read timeout,
+and also gives up on a connection that keeps sending bytes without completing a line.
+"""
+
+# native
+from dataclasses import dataclass
+import logging
+import random
+from threading import Event, Lock
+import time
+
+# packages
+import requests
+
+
+@dataclass
+class DisconnectWindow:
+    """
+    One outage, from losing the stream to the next successful connect
+    """
+
+    start: float  # epoch seconds
+    reason: str
+    end: float = None  # None while still disconnected
+    attempts: int = 0  # failed connects before the stream came back
+
+    def duration(self, now: float = None) -> float:
+        end = self.end if self.end is not None else (now or time.time())
+        return end - self.start
+
+    def get_dict(self):
+        return {
+            "start": self.start,
+            "end": self.end,
+            "reason": self.reason,
+            "attempts": self.attempts,
+        }
+
+
+class StreamSupervisor:
+    """
+    Arguments:
+        killall       (Event): stops reconnecting once set
+        backoff_base  (float): seconds before the first reconnect
+        backoff_max   (float): longest wait between reconnects
+        max_reconnects  (int): reconnects in a row without a record before giving up
+                               [optional, never give up]
+        stall_timeout (float): seconds without a record or heartbeat before the stream is
+                               reopened
+        on_reconnect (callable): called with each DisconnectWindow once it is closed,
+                                 from the stream thread so it must not block [optional]
+    """
+
+    def __init__(
+        self,
+        killall: Event,
+        logger: logging.Logger,
+        backoff_base: float = 1.0,
+        backoff_max: float = 320.0,
+        max_reconnects: int = None,
+        stall_timeout: float = 30.0,
+        on_reconnect=None,
+    ):
+        self.killall = killall
+        self.logger = logger
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.max_reconnects = max_reconnects
+        self.stall_timeout = stall_timeout
+        self.on_reconnect = on_reconnect
+        self.windows = []
+        self.connects = 0
+        # disconnect the server announced on the current connection
+        self.announced = None
+        self.lock = Lock()
+
+    def backoff(self, attempt: int) -> float:
+        """
+        Exponential backoff with jitter, between half and all of base * 2^attempt
+        """
+        delay = min(self.backoff_max, self.backoff_base * 2**attempt)
+        return delay * random.uniform(0.5, 1)
+
+    @staticmethod
+    def reason(err: Exception) -> str:
+        if "timed out" in str(err).lower():
+            return "stalled"
+        if isinstance(err, requests.RequestException):
+            return f"connection error: {type(err).__name__}"
+        return f"error: {err}"
+
+    def announce(self, reason: str) -> None:
+        """
+        Records a disconnect the server announced in the stream, it becomes the reason of
+        the window opened when the connection ends
+        """
+        self.announced = reason
+
+    def open_window(self, reason: str, failed_connect: bool = False) -> None:
+        with self.lock:
+            if not self.windows or self.windows[-1].end is not None:
+                self.windows.append(DisconnectWindow(time.time(), reason))
+                self.logger.warning(f"Stream disconnected ({reason})")
+            if failed_connect:
+                self.windows[-1].attempts += 1
+
+    def close_window(self) -> None:
+        with self.lock:
+            self.connects += 1
+            if not self.windows or self.windows[-1].end is not None:
+                return
+            window = self.windows[-1]
+            window.end = time.time()
+        self.logger.warning(
+            f"Stream reconnected after {window.duration():.1f}s "
+            f"and {window.attempts} attempts"
+        )
+        if self.on_reconnect is not None:
+            self.on_reconnect(window)
+
+    def supervise(self, open_stream, read_frames):
+        """
+        Yields from read_frames(open_stream()) and reopens the stream whenever it ends,
+        until killall is set or max_reconnects reconnects in a row brought no records.
+
+        Arguments:
+            open_stream (callable): connects and returns the response, raises on failure
+            read_frames (callable): yields the records of a response
+        """
+        attempt = 0
+        while not self.killall.is_set():
+            try:
+                response = open_stream()
+            except Exception as err:
+                self.open_window(self.reason(err), failed_connect=True)
+            else:
+                self.close_window()
+                self.announced = None
+                reason = "closed by server"
+                try:
+                    for frame in read_frames(response):
+                        attempt = 0
+                        yield frame
+                        if self.killall.is_set():
+                            return
+                except (requests.RequestException, ValueError) as err:
+                    reason = self.reason(err)
+                finally:
+                    response.close()
+                if self.killall.is_set():
+                    return
+                if self.announced is not None:
+                    reason = f"disconnected by server: {self.announced}"
+                self.open_window(reason)
+
+            if self.max_reconnects is not None and attempt >= self.max_reconnects:
+                self.logger.error(f"Giving up after {attempt} reconnects")
+                return
+            delay = self.backoff(attempt)
+            attempt += 1
+            self.logger.warning(f"Reconnecting in {delay:.1f}s")
+            self.killall.wait(delay)
+
+    def downtime(self) -> float:
+        """
+        Seconds spent disconnected, an outage still going on counts up to now
+        """
+        now = time.time()
+        with self.lock:
+            return sum(window.duration(now) for window in self.windows)
+
+    def report(self) -> list[dict]:
+        """
+        Every disconnect window so far, oldest first
+        """
+        with self.lock:
+            return [window.get_dict() for window in self.windows]
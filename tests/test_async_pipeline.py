@@ -0,0 +1,139 @@
+# native
+import asyncio
+import logging
+from queue import Queue
+from threading import Event
+
+# lib
+from classes.async_pipeline import AsyncPipeline
+from classes.classesv2 import TweetDB
+
+log_tester = logging.getLogger("Tester")
+
+
+class fakeTwitterHandler:
+    def __init__(self, responses) -> None:
+        self.responses = responses
+
+    def stream(self):
+        for response in self.responses:
+            yield response
+
+
+class fakeSQLPipe:
+    def __init__(self) -> None:
+        self.rows = []
+        self.max_batch_size = 8
+
+    def execute_batch(self, batch):
+        assert len(batch) <= self.max_batch_size
+        self.rows.extend(batch)
+        return True
+
+
+def make_response(tweet_id, author_id, text):
+    return {"data": {"id": str(tweet_id), "author_id": str(author_id), "text": text}}
+
+
+def make_database():
+    events = {"local_db": Event(), "sql": Event(), "killall": Event()}
+    return TweetDB({}, Queue(), Queue(), events, {1: "one", 2: "two"}, log_tester)
+
+
+def test_async_pipeline_writes_rows_in_order():
+    responses = [make_response(i, 1 + i % 2, f"text\n{i}") for i in range(50)]
+    sql_pipe = fakeSQLPipe()
+    pipeline = AsyncPipeline(
+        fakeTwitterHandler(responses), make_database(), sql_pipe, log_tester
+    )
+    asyncio.run(pipeline.run())
+
+    assert sql_pipe.rows == [
+        (i, 1 + i % 2, "one" if i % 2 == 0 else "two", f"text{i}") for i in range(50)
+    ]
+
+
+def test_async_pipeline_skips_unmapped_authors():
+    responses = [make_response(1, 1, "kept"), make_response(2, 3, "dropped")]
+    sql_pipe = fakeSQLPipe()
+    pipeline = AsyncPipeline(
+        fakeTwitterHandler(responses), make_database(), sql_pipe, log_tester
+    )
+    asyncio.run(pipeline.run())
+
+    assert sql_pipe.rows == [(1, 1, "one", "kept")]
+
+
+class killingTwitterHandler(fakeTwitterHandler):
+    """Sets killall after handing out kill_after responses"""
+
+    def __init__(self, responses, events, kill_after) -> None:
+        super().__init__(responses)
+        self.events = events
+        self.kill_after = kill_after
+
+    def stream(self):
+        for num, response in enumerate(self.responses):
+            if num == self.kill_after:
+                self.events["killall"].set()
+            yield response
+
+
+def test_async_pipeline_stops_on_killall():
+    database = make_database()
+    responses = [make_response(i, 1, "text") for i in range(100)]
+    sql_pipe = fakeSQLPipe()
+    pipeline = AsyncPipeline(
+        killingTwitterHandler(responses, database.events, 10),
+        database,
+        sql_pipe,
+        log_tester,
+        maxsize=2,
+    )
+    asyncio.run(pipeline.run())
+
+    assert [row[0] for row in sql_pipe.rows] == list(range(10))
+
+
+class flakySQLPipe(fakeSQLPipe):
+    """Cannot reach Postgres for the first failures batches"""
+
+    def __init__(self, failures) -> None:
+        super().__init__()
+        self.failures = failures
+        self.calls = 0
+
+    def execute_batch(self, batch):
+        self.calls += 1
+        if self.calls <= self.failures:
+            return False
+        return super().execute_batch(batch)
+
+
+def test_async_pipeline_retries_failed_batches():
+    responses = [make_response(i, 1, "text") for i in range(20)]
+    sql_pipe = flakySQLPipe(3)
+    pipeline = AsyncPipeline(
+        fakeTwitterHandler(responses),
+        make_database(),
+        sql_pipe,
+        log_tester,
+        retry_interval=0.01,
+    )
+    asyncio.run(pipeline.run())
+
+    assert [row[0] for row in sql_pipe.rows] == list(range(20))
+    assert pipeline.dropped == 0
+
+
+def test_failed_batch_dropped_at_shutdown():
+    database = make_database()
+    sql_pipe = flakySQLPipe(100)
+    pipeline = AsyncPipeline(
+        fakeTwitterHandler([]), database, sql_pipe, log_tester, retry_interval=0.01
+    )
+    database.events["killall"].set()
+
+    assert not pipeline.write_batch([(1, 1, "one", "text")])
+    assert sql_pipe.calls == pipeline.exit_retries + 1
+    assert pipeline.dropped == 1
@@ -0,0 +1,184 @@
+# native
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+import logging
+from threading import Event
+import time
+
+# packages
+import psycopg.sql as psql
+import pytest
+from pytest_postgresql import factories
+
+# lib
+from classes.backfill import MIN_END_AGE, Backfill
+from classes.classesv2 import TweetStream, TwitterHandler
+from classes.supervisor import DisconnectWindow
+from tools.replay_server import ReplayServer, make_corpus, parse_time
+from tools.tools_postgre import Toolkit as ToolkitPostgre
+
+log_tester = logging.getLogger("Tester")
+
+postgresql_my_proc = factories.postgresql_proc()
+postgresql = factories.postgresql("postgresql_my_proc")
+
+
+class FakeObject(object):
+    pass
+
+
+class FakeCursor(object):
+    def __init__(self, stored):
+        self.stored = stored
+        self.rowcount = 0
+
+    def executemany(self, query, rows):
+        new = [row for row in rows if row[0] not in self.stored]
+        self.stored.update((row[0], row) for row in new)
+        self.rowcount = len(new)
+
+
+class FakePool(object):
+    def __init__(self):
+        self.stored = {}
+
+    @contextmanager
+    def connection(self):
+        conn = FakeObject()
+        conn.cursor = lambda: FakeCursor(self.stored)
+        conn.commit = lambda: None
+        yield conn
+
+
+@pytest.fixture
+def replay():
+    # one tweet a second from two hours ago, inside the 7 day reach of recent search,
+    # and on whole seconds like the start_time/end_time the API takes
+    corpus, mapping = make_corpus(
+        2000, n_authors=30, start=int(time.time()) - 7200, interval=1
+    )
+    server = ReplayServer(("127.0.0.1", 0), corpus)
+    server.start()
+    yield server, corpus, mapping
+    server.stop()
+
+
+def make_backfill(server, mode, pool=None):
+    events = {"local_db": Event(), "sql": Event(), "killall": Event()}
+    handler = TwitterHandler("test_token", events, log_tester, api_url=server.url)
+    return Backfill(handler, pool or FakePool(), log_tester, mode=mode, padding=0)
+
+
+def missed_ids(corpus, window):
+    return {
+        int(p["data"]["id"])
+        for p in corpus
+        if window.start <= parse_time(p["data"]["created_at"]) < window.end
+    }
+
+
+@pytest.mark.parametrize("mode", Backfill.modes)
+def test_backfill_fetches_missed_tweets(replay, mode):
+    server, corpus, mapping = replay
+    created = [parse_time(p["data"]["created_at"]) for p in corpus]
+    # 500 tweets missed, several pages per request
+    window = DisconnectWindow(created[1000], "stalled", end=created[1500])
+    backfill = make_backfill(server, mode)
+
+    stats = backfill.run([window], mapping)
+
+    assert set(backfill.pool.stored) == missed_ids(corpus, window)
+    assert stats["inserted"] == 500
+    assert stats["requests"] == (1 if mode == "search" else len(mapping))
+
+
+def test_backfill_skips_stored_tweets(replay):
+    server, corpus, mapping = replay
+    created = [parse_time(p["data"]["created_at"]) for p in corpus]
+    backfill = make_backfill(server, "search")
+    backfill.run([DisconnectWindow(created[0], "stalled", end=created[100])], mapping)
+
+    overlap = DisconnectWindow(created[50], "stalled", end=created[150])
+    assert backfill.run([overlap], mapping)["inserted"] == 50
+
+
+def test_search_queries_fit_the_limit(replay):
+    server, _, _ = replay
+    backfill = make_backfill(server, "search")
+    backfill.max_query_length = 60
+    names = [f"user{i}" for i in range(40)]
+    queries = backfill.search_queries(names)
+
+    assert all(len(query) <= 60 for query in queries)
+    assert sorted(
+        n for q in queries for n in q.replace("from:", "").split(" OR ")
+    ) == sorted(names)
+
+
+def test_old_windows_are_out_of_reach(replay):
+    server, _, _ = replay
+    backfill = make_backfill(server, "search")
+    window = DisconnectWindow(time.time() - 30 * 24 * 3600, "stalled")
+    window.end = window.start + 60
+
+    assert backfill.plan([window], {1: "one"}) == []
+
+
+def test_store_skips_duplicates(postgresql):
+    fake_self = FakeObject()
+    fake_self.pool = FakeObject()
+
+    @contextmanager
+    def connection():
+        yield postgresql
+
+    fake_self.pool.connection = connection
+    fake_self.logger = log_tester
+    ToolkitPostgre.initialize_db(fake_self)
+
+    # tweet_id=1 is the test tweet added by initialize_db
+    rows = [(1, 10, "author", "dup"), (2, 10, "author", "new")]
+    assert Backfill.store(fake_self, rows) == 1
+
+    cur = postgresql.cursor()
+    cur.execute(psql.SQL("SELECT count(*) FROM {};").format(psql.Identifier("tweets")))
+    assert cur.fetchone()[0] == 2
+
+
+def test_just_closed_window_waits_until_ready(replay, monkeypatch):
+    server, _, _ = replay
+    backfill = make_backfill(server, "search")
+    backfill.padding = 90
+    now = time.time()
+    window = DisconnectWindow(now - 60, "stalled", end=now)
+
+    # fetched right away the end of the outage and its padding are cut off
+    end = parse_time(backfill.time_range(window)[1])
+    assert end < window.end
+
+    ready = backfill.ready_at(window)
+    assert ready == window.end + 90 + MIN_END_AGE
+    monkeypatch.setattr(time, "time", lambda: ready)
+    start, end = backfill.time_range(window)
+    assert parse_time(start) <= window.start - 90
+    assert parse_time(end) >= int(window.end) + 89
+
+
+def test_queue_backfill_runs_once_ready():
+    ran = Event()
+    fake_self = FakeObject()
+    fake_self.backfill = FakeObject()
+    fake_self.backfill.ready_at = lambda window: window.end
+    fake_self.backfill.run = lambda windows: ran.set()
+    fake_self.backfill_executor = ThreadPoolExecutor(1)
+    fake_self.backfill_timers = []
+    fake_self.log_backfill_error = lambda future: None
+    fake_self.submit_backfill = lambda window: TweetStream.submit_backfill(
+        fake_self, window
+    )
+    window = DisconnectWindow(time.time() - 10, "stalled", end=time.time() + 0.2)
+
+    TweetStream.queue_backfill(fake_self, window)
+    assert not ran.wait(0.1)
+    assert ran.wait(1)
+    fake_self.backfill_executor.shutdown()
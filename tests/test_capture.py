@@ -0,0 +1,74 @@
+# native
+import json
+import logging
+import time
+
+# lib
+from classes.capture import StreamCapture, list_segments, read_segment
+from tools.reingest import export_corpus, iter_capture, store
+
+log_tester = logging.getLogger("Tester")
+
+
+def make_line(i):
+    return json.dumps({"data": {"id": str(i), "author_id": "1", "text": "t"}}).encode()
+
+
+def test_capture_round_trip(tmp_path):
+    capture = StreamCapture(str(tmp_path), log_tester)
+    for i in range(100):
+        capture.write(make_line(i))
+    capture.close()
+
+    records = [r for path in list_segments(str(tmp_path)) for r in read_segment(path)]
+    assert [line for _, line in records] == [make_line(i) for i in range(100)]
+    assert all(a[0] <= b[0] for a, b in zip(records, records[1:]))
+
+
+def test_capture_rotates_segments(tmp_path):
+    capture = StreamCapture(str(tmp_path), log_tester, max_segment_bytes=1)
+    for i in range(5):
+        capture.write(make_line(i))
+        # let the writer pick each line up on its own
+        while capture.captured <= i:
+            time.sleep(0.001)
+    capture.close()
+
+    segments = list_segments(str(tmp_path))
+    assert len(segments) == 5
+    assert [line for _, line in iter_capture([str(tmp_path)])] == [
+        make_line(i) for i in range(5)
+    ]
+
+
+def test_export_corpus(tmp_path):
+    capture = StreamCapture(str(tmp_path / "capture"), log_tester)
+    for i in range(10):
+        capture.write(make_line(i))
+    capture.close()
+
+    out_path = str(tmp_path / "corpus.jsonl")
+    assert export_corpus([str(tmp_path / "capture")], out_path) == 10
+    with open(out_path, "rb") as f:
+        assert [json.loads(line)["data"]["id"] for line in f] == [
+            str(i) for i in range(10)
+        ]
+
+
+class flakySQLPipe:
+    """execute_batch fails the first failures calls"""
+
+    def __init__(self, failures):
+        self.failures = failures
+        self.calls = 0
+
+    def execute_batch(self, batch):
+        self.calls += 1
+        return self.calls > self.failures
+
+
+def test_store_retries_failed_batches():
+    assert store(flakySQLPipe(2), [(1,)], log_tester, retries=2, delay=0)
+    pipe = flakySQLPipe(5)
+    assert not store(pipe, [(1,)], log_tester, retries=2, delay=0)
+    assert pipe.calls == 3
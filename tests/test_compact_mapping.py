@@ -0,0 +1,67 @@
+# native
+import logging
+import pickle
+
+# lib
+from classes.compact_mapping import CompactMapping
+from classes.parse_workers import ParseWorkerPool
+from tests.test_parse_workers import make_line
+
+log_tester = logging.getLogger("Tester")
+
+
+def test_lookup_matches_dict():
+    mapping = {i * 7919: f"user{i % 50}" for i in range(1000)}
+    mapping[2**62] = "zoë"
+    compact = CompactMapping.from_dict(mapping)
+
+    assert len(compact) == len(mapping)
+    assert all(compact[user_id] == name for user_id, name in mapping.items())
+    assert compact.get(1) is None and 1 not in compact
+    assert dict(compact.items()) == mapping
+
+
+def test_names_are_stored_once():
+    shared = CompactMapping.from_dict({i: "same" for i in range(1000)})
+    distinct = CompactMapping.from_dict({i: f"{i:04d}" for i in range(1000)})
+
+    assert distinct.memory_bytes() - shared.memory_bytes() == 999 * 12
+
+
+def test_changes_override_the_buffer():
+    compact = CompactMapping.from_dict({1: "one", 2: "two"})
+    compact[3] = "three"
+    compact[1] = "uno"
+    assert compact.pop(2) == "two"
+    assert compact.pop(2, None) is None
+
+    assert dict(compact.items()) == {1: "uno", 3: "three"}
+    assert len(compact) == 2
+    # pickled changes come along
+    assert dict(pickle.loads(pickle.dumps(compact)).items()) == {1: "uno", 3: "three"}
+
+
+def test_shared_mapping_pickles_by_name():
+    shared = CompactMapping.from_dict({i: f"user{i}" for i in range(10_000)}).share()
+    try:
+        pickled = pickle.dumps(shared)
+        assert len(pickled) < 200
+        attached = pickle.loads(pickled)
+        assert attached[9999] == "user9999"
+        attached.close()
+    finally:
+        shared.close()
+
+
+def test_parse_workers_read_shared_mapping():
+    shared = CompactMapping.from_dict({1: "one", 2: "two"}).share()
+    pool = ParseWorkerPool(2, shared, log_tester, 4)
+    rows = [
+        row
+        for chunk in pool.parse([[make_line(10, 1), make_line(11, 2)]])
+        for row in chunk
+    ]
+    pool.close()
+    shared.close()
+
+    assert rows == [(10, 1, "one", "text"), (11, 2, "two", "text")]
@@ -0,0 +1,68 @@
+# native
+import json
+import logging
+from queue import Queue
+from threading import Event
+
+# lib
+from classes.classesv2 import TweetDB
+from classes.decoder import StreamNotice, StreamRecord, decode_line
+from tools.replay_server import make_corpus
+
+log_tester = logging.getLogger("Tester")
+
+
+def test_decode_line_keeps_the_used_fields():
+    corpus, mapping = make_corpus(1)
+    payload = corpus[0]
+    record = decode_line(json.dumps(payload).encode())
+
+    assert record.tweet_id == int(payload["data"]["id"])
+    assert record.author_id == int(payload["data"]["author_id"])
+    assert record.text == payload["data"]["text"]
+    assert record.author_username == mapping[record.author_id]
+    assert record.rule_ids == (1500677568919392257,)
+
+
+def test_decode_line_skips_heartbeats():
+    assert decode_line(b"\r\n") is None
+    assert decode_line(b"{}") is None
+
+
+def test_decode_line_returns_notices():
+    disconnect = decode_line(
+        b'{"errors": [{"title": "operational-disconnect", "disconnect_type":'
+        b' "UpstreamOperationalDisconnect", "detail": "Closing the stream"}]}'
+    )
+    error = decode_line(b'{"errors": [{"title": "ConnectionException"}]}')
+
+    assert isinstance(disconnect, StreamNotice)
+    assert disconnect.disconnect
+    assert disconnect.summary() == "operational-disconnect: Closing the stream"
+    assert not error.disconnect
+    assert error.summary() == "ConnectionException"
+
+
+def test_backends_agree():
+    corpus, _ = make_corpus(50)
+    lines = [json.dumps(payload).encode() for payload in corpus]
+
+    assert [decode_line(line, json.loads) for line in lines] == [
+        decode_line(line) for line in lines
+    ]
+
+
+def test_missing_includes():
+    line = b'{"data": {"id": "5", "author_id": "7", "text": "t"}}'
+    assert decode_line(line) == StreamRecord(5, 7, "t", None, ())
+
+
+def test_extract_record_matches_extract_row():
+    events = {"local_db": Event(), "sql": Event(), "killall": Event()}
+    database = TweetDB({}, Queue(), Queue(), events, {7: "seven"}, log_tester)
+    payload = {"data": {"id": "5", "author_id": "7", "text": "a\nb"}}
+    line = json.dumps(payload).encode()
+
+    assert database.extract_row(decode_line(line)) == database.extract_row(payload)
+    assert database.extract_row(decode_line(line)) == (5, 7, "seven", "ab")
+    assert database.extract_row(StreamRecord(6, 8, "t")) is None
@@ -0,0 +1,87 @@
+# native
+import logging
+from queue import Queue
+from threading import Event
+
+# lib
+from classes.classesv2 import TweetDB
+from classes.dedupe import RecentIdFilter
+from classes.decoder import StreamRecord
+
+log_tester = logging.getLogger("Tester")
+
+
+def test_check_and_add():
+    recent_ids = RecentIdFilter(capacity=1000, max_bytes=4096)
+
+    assert not recent_ids.check_and_add(1500677568919392257)
+    assert recent_ids.check_and_add(1500677568919392257)
+    assert 1500677568919392257 in recent_ids
+    assert 1500677568919392258 not in recent_ids
+
+
+def test_memory_is_fixed():
+    recent_ids = RecentIdFilter(capacity=1000, max_bytes=4096)
+    for tweet_id in range(10_000):
+        recent_ids.check_and_add(tweet_id)
+
+    assert recent_ids.memory_bytes() == 4096
+    # a few ids are false positives and never added, the last rotation can fall short
+    assert recent_ids.rotations in (9, 10)
+
+
+def test_remembers_the_previous_generation():
+    recent_ids = RecentIdFilter(capacity=100, max_bytes=4096)
+    for tweet_id in range(250):
+        recent_ids.check_and_add(tweet_id)
+
+    # 200-249 are in the current generation, 100-199 in the previous one
+    assert all(tweet_id in recent_ids for tweet_id in range(100, 250))
+
+
+def test_false_positive_rate():
+    recent_ids = RecentIdFilter(capacity=10_000, max_bytes=2 * 12_000)
+    base = 1500677568919392257
+    for tweet_id in range(base, base + 20_000):
+        recent_ids.check_and_add(tweet_id)
+    unseen = range(base + 1_000_000, base + 1_100_000)
+    measured = sum(tweet_id in recent_ids for tweet_id in unseen) / len(unseen)
+
+    # 9.6 bits per id, about 1% per generation
+    assert recent_ids.false_positive_rate() < 0.03
+    assert measured < 2 * recent_ids.false_positive_rate()
+
+
+def test_parse_drops_duplicates():
+    events = {"local_db": Event(), "sql": Event(), "killall": Event()}
+    db_q = Queue()
+    database = TweetDB(
+        {}, Queue(), db_q, events, {7: "seven"}, log_tester, RecentIdFilter(100, 1024)
+    )
+    for tweet_id in (5, 6, 5, 5):
+        database.parse(StreamRecord(tweet_id, 7, "t"))
+
+    assert [db_q.get_nowait()[0] for _ in range(db_q.qsize())] == [5, 6]
+    assert database.duplicates == 2
+
+
+def test_ids_remembered_once_stored():
+    events = {"local_db": Event(), "sql": Event(), "killall": Event()}
+    database = TweetDB(
+        {},
+        Queue(),
+        Queue(),
+        events,
+        {7: "seven"},
+        log_tester,
+        RecentIdFilter(100, 1024),
+    )
+    database.mark_when_stored = True
+
+    assert not database.is_duplicate(5)
+    # not stored yet, a redelivery is let through
+    assert not database.is_duplicate(5)
+
+    database.stored([5])
+    assert database.is_duplicate(5)
+    assert database.duplicates == 1
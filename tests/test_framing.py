@@ -0,0 +1,114 @@
+# native
+import json
+import random
+
+# packages
+import pytest
+
+# lib
+from classes.decoder import decode_line, json_loads
+from classes.framing import LineFramer
+from tools.replay_server import make_corpus
+
+
+def make_stream(n_tweets, seed):
+    """
+    Encoded stream with heartbeats mixed in, and the records it holds
+    """
+    rng = random.Random(seed)
+    corpus, _ = make_corpus(n_tweets, n_authors=20, seed=seed)
+    records = [json.dumps(payload).encode() for payload in corpus]
+    parts = []
+    for record in records:
+        parts.append(b"\r\n" * rng.choice([0, 0, 0, 1, 3]))
+        parts.append(record + b"\r\n")
+    return b"".join(parts), records
+
+
+def random_chunks(data, rng, max_size):
+    chunks, start = [], 0
+    while start < len(data):
+        size = rng.randint(1, max_size)
+        chunks.append(data[start : start + size])
+        start += size
+    return chunks
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_random_chunk_splits(seed):
+    rng = random.Random(seed)
+    data, records = make_stream(100, seed)
+    framer = LineFramer()
+
+    out = []
+    for chunk in random_chunks(data, rng, rng.choice([1, 7, 300, 5000, 100_000])):
+        out.extend(frame.tobytes() for frame in framer.feed(chunk))
+
+    assert out == records
+    assert framer.pending() == 0
+    assert framer.records == len(records)
+
+
+def test_split_between_cr_and_lf():
+    framer = LineFramer()
+    assert [f.tobytes() for f in framer.feed(b'{"a": 1}\r')] == []
+    assert [f.tobytes() for f in framer.feed(b'\n{"b": 2}\r')] == [b'{"a": 1}']
+    assert [f.tobytes() for f in framer.feed(b"\n\r")] == [b'{"b": 2}']
+    assert [f.tobytes() for f in framer.feed(b"\n")] == []
+    assert framer.heartbeats == 1
+
+
+def test_views_decode_without_copies():
+    data, records = make_stream(20, 0)
+    framer = LineFramer()
+    decoded = [decode_line(frame) for frame in framer.feed(data)]
+    stdlib = [decode_line(frame, json_loads) for frame in framer.feed(data)]
+
+    assert decoded == stdlib == [decode_line(record) for record in records]
+
+
+def test_views_kept_past_feed():
+    framer = LineFramer()
+    first = list(framer.feed(b"one\r\ntw"))
+    second = list(framer.feed(b"o\r\n"))
+
+    assert first[0].tobytes() == b"one"
+    assert second[0].tobytes() == b"two"
+
+
+def test_stopping_early_keeps_remaining_records():
+    framer = LineFramer()
+    frames = framer.feed(b"one\r\ntwo\r\nthree\r\n")
+    assert next(frames).tobytes() == b"one"
+    frames.close()
+
+    assert [f.tobytes() for f in framer.feed(b"")] == [b"two", b"three"]
+
+
+def test_oversized_record():
+    framer = LineFramer(max_record_bytes=10)
+    with pytest.raises(ValueError):
+        list(framer.feed(b"x" * 20))
+    assert [f.tobytes() for f in framer.feed(b"ok\r\n")] == [b"ok"]
+
+
+def test_buffers_reused_by_chained_generators():
+    data, records = make_stream(200, 1)
+    chunks = random_chunks(data, random.Random(1), 300)
+    framer = LineFramer()
+
+    def read_frames():
+        # the way TwitterHandler.read_frames hands frames on
+        for chunk in chunks:
+            for frame in framer.feed(chunk):
+                yield frame
+
+    buffers = {}
+    out = []
+    for frame in read_frames():
+        out.append(frame.tobytes())
+        buffers[id(framer.buffer)] = framer.buffer
+
+    assert out == records
+    assert len(chunks) > 100
+    assert len(buffers) <= 2
@@ -0,0 +1,118 @@
+# native
+import json
+import logging
+import threading
+
+# lib
+from classes.log_queue import (
+    NameFilter,
+    SampledLogger,
+    StructuredFormatter,
+    start_queue_logging,
+    stop_queue_logging,
+)
+
+
+class ListHandler(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.messages = []
+
+    def emit(self, record):
+        self.messages.append(self.format(record))
+
+
+class FormatThread:
+    """
+    Remembers which thread turned it into a string
+    """
+
+    def __init__(self):
+        self.threads = []
+
+    def __str__(self):
+        self.threads.append(threading.current_thread())
+        return "payload"
+
+
+def test_records_formatted_off_the_caller_thread():
+    logger = logging.getLogger("Tester.queue")
+    logger.setLevel(logging.DEBUG)
+    logger.propagate = False
+    handler = ListHandler()
+    start_queue_logging(logger, [handler])
+
+    payload = FormatThread()
+    logger.debug("got %s", payload)
+    stop_queue_logging()
+
+    assert handler.messages == ["got payload"]
+    assert threading.current_thread() not in payload.threads
+
+
+def test_sampled_logger_keeps_one_in_n():
+    logger = logging.getLogger("Tester.sampled")
+    logger.setLevel(logging.DEBUG)
+    logger.propagate = False
+    handler = ListHandler()
+    logger.addHandler(handler)
+    sampled = SampledLogger(logger, 10)
+
+    for i in range(100):
+        sampled.info("tweet %s", i)
+    sampled.warning("always kept")
+    logger.removeHandler(handler)
+
+    assert handler.messages[:10] == [f"tweet {i}" for i in range(0, 100, 10)]
+    assert handler.messages[10:] == ["always kept"]
+
+
+def test_sampled_logger_counts_each_call_site():
+    logger = logging.getLogger("Tester.sites")
+    logger.setLevel(logging.DEBUG)
+    logger.propagate = False
+    handler = ListHandler()
+    logger.addHandler(handler)
+    sampled = SampledLogger(logger, 2)
+
+    # two lines per tweet, with one shared counter only the first would ever be kept
+    for i in range(4):
+        sampled.info("parsing %s", i)
+        sampled.debug("author %s", i)
+    logger.removeHandler(handler)
+
+    assert handler.messages == ["parsing 0", "author 0", "parsing 2", "author 2"]
+
+
+def test_name_filter_routes_records():
+    logger = logging.getLogger("Tester.routed")
+    logger.setLevel(logging.DEBUG)
+    logger.propagate = False
+    handler = ListHandler()
+    handler.addFilter(NameFilter(["Tester.other"]))
+    start_queue_logging(logger, [handler])
+
+    logger.info("not for this handler")
+    stop_queue_logging()
+
+    assert handler.messages == []
+
+
+def test_structured_formatter_adds_extra_fields():
+    logger = logging.getLogger("Tester.structured")
+    record = logger.makeRecord(
+        logger.name,
+        logging.INFO,
+        __file__,
+        1,
+        "Parsing Tweet %s",
+        ("10",),
+        None,
+        extra={"tweet_id": "10"},
+    )
+    entry = json.loads(StructuredFormatter().format(record))
+
+    assert entry["msg"] == "Parsing Tweet 10"
+    assert entry["level"] == "INFO"
+    assert entry["logger"] == "Tester.structured"
+    assert entry["tweet_id"] == "10"
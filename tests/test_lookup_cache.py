@@ -0,0 +1,132 @@
+# native
+import logging
+from threading import Event, Thread
+import time
+
+# lib
+from classes.lookup_cache import LookupCache
+from tests.test_postgres_pipe import FakeObject
+from tools.tools_postgre import Toolkit as ToolkitPostgre
+
+log_tester = logging.getLogger("Tester")
+
+
+class CountingFetch(object):
+    """Looks keys up in a dict and records every call"""
+
+    def __init__(self, values, release=None):
+        self.values = values
+        self.release = release
+        self.calls = []
+
+    def __call__(self, keys):
+        self.calls.append(list(keys))
+        if self.release is not None:
+            self.release.wait(5)
+        return {key: self.values[key] for key in keys if key in self.values}
+
+
+def test_cached_across_instances(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    fetch = CountingFetch({"a": 1, "b": 2})
+    cache = LookupCache(path, log_tester)
+    assert cache.get_many("user_id", ["a", "b", "c"], fetch) == {
+        "a": 1,
+        "b": 2,
+        "c": None,
+    }
+    cache.close()
+
+    cache = LookupCache(path, log_tester)
+    assert cache.get_many("user_id", ["a", "b"], fetch) == {"a": 1, "b": 2}
+    # not found is not cached
+    cache.get_many("user_id", ["a", "c"], fetch)
+
+    assert fetch.calls == [["a", "b", "c"], ["c"]]
+    assert cache.stats()["user_id"]["hits"] == 3
+    assert cache.stats()["user_id"]["hit_ratio"] == 0.75
+
+
+def test_ttl_per_endpoint(tmp_path):
+    cache = LookupCache(
+        str(tmp_path / "cache.sqlite3"), log_tester, {"user_timeline": 0.05}
+    )
+    fetch = CountingFetch({"1/5": [1], "9": "author"})
+    cache.get("user_timeline", "1/5", lambda key: fetch([key])[key])
+    cache.get("tweet_author", "9", lambda key: fetch([key])[key])
+    time.sleep(0.1)
+    cache.get("user_timeline", "1/5", lambda key: fetch([key])[key])
+    cache.get("tweet_author", "9", lambda key: fetch([key])[key])
+
+    assert fetch.calls == [["1/5"], ["9"], ["1/5"]]
+
+
+def test_least_recently_used_evicted(tmp_path):
+    cache = LookupCache(
+        str(tmp_path / "cache.sqlite3"), log_tester, max_entries=2, touch_interval=0
+    )
+    fetch = CountingFetch({"a": 1, "b": 2, "c": 3})
+    cache.get_many("user_id", ["a"], fetch)
+    time.sleep(0.01)
+    cache.get_many("user_id", ["b"], fetch)
+    time.sleep(0.01)
+    cache.get_many("user_id", ["a"], fetch)
+    time.sleep(0.01)
+    cache.get_many("user_id", ["c"], fetch)
+    cache.get_many("user_id", ["a", "b", "c"], fetch)
+
+    assert fetch.calls == [["a"], ["b"], ["c"], ["b"]]
+
+
+def test_recent_hits_are_not_written(tmp_path):
+    cache = LookupCache(str(tmp_path / "cache.sqlite3"), log_tester)
+    fetch = CountingFetch({"a": 1, "b": 2})
+    cache.get_many("user_id", ["a", "b"], fetch)
+    writes = cache.conn.total_changes
+
+    for _ in range(3):
+        assert cache.get_many("user_id", ["a", "b"], fetch) == {"a": 1, "b": 2}
+    assert cache.conn.total_changes == writes
+
+    cache.touch_interval = 0
+    cache.get_many("user_id", ["a"], fetch)
+    assert cache.conn.total_changes == writes + 1
+
+
+def test_concurrent_lookups_are_merged(tmp_path):
+    cache = LookupCache(str(tmp_path / "cache.sqlite3"), log_tester)
+    release = Event()
+    fetch = CountingFetch({"a": 1, "b": 2}, release)
+    results = []
+    threads = [
+        Thread(
+            target=lambda: results.append(cache.get_many("user_id", ["a", "b"], fetch))
+        )
+        for _ in range(4)
+    ]
+    for thread in threads:
+        thread.start()
+    time.sleep(0.1)
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert fetch.calls == [["a", "b"]]
+    assert results == [{"a": 1, "b": 2}] * 4
+    assert cache.stats()["user_id"]["merged"] == 6
+
+
+def test_get_user_id_requests_only_new_names(tmp_path):
+    fake_self = FakeObject()
+    fake_self.lookup_cache = LookupCache(str(tmp_path / "cache.sqlite3"), log_tester)
+    fake_self.fetch_users_by_name = CountingFetch(
+        {
+            "sami": {"id": "1", "username": "Sami"},
+            "wami": {"id": "2", "username": "wami"},
+        }
+    )
+    ToolkitPostgre.get_user_id(fake_self, "Sami")
+    response = ToolkitPostgre.get_user_id(fake_self, "sami,wami")
+
+    assert [user["id"] for user in response["data"]] == ["1", "2"]
+    assert fake_self.fetch_users_by_name.calls == [["sami"], ["wami"]]
@@ -0,0 +1,90 @@
+# native
+from datetime import datetime, timedelta, timezone
+import logging
+from threading import Event
+import time
+
+# packages
+import psycopg.sql as psql
+from pytest_postgresql import factories
+
+# lib
+from classes.mapping_refresh import MappingRefresher
+from tests.test_postgres_pipe import FakeObject, FakePool
+from tools.tools_postgre import Toolkit as ToolkitPostgre
+
+log_tester = logging.getLogger("Tester")
+
+postgresql_my_proc = factories.postgresql_proc()
+postgresql = factories.postgresql("postgresql_my_proc")
+
+
+def make_refresher(mapping, db_args=None, watermark=None):
+    return MappingRefresher(db_args, mapping, Event(), log_tester, watermark)
+
+
+def add_user(connection, user_id, user_name):
+    connection.execute(
+        psql.SQL(
+            "INSERT INTO {} (user_id,user_name) VALUES (%s,%s) "
+            "ON CONFLICT (user_id) DO UPDATE SET user_name=EXCLUDED.user_name;"
+        ).format(psql.Identifier("id_name_mapping")),
+        (user_id, user_name),
+    )
+    connection.commit()
+
+
+def test_apply_notify_updates_in_place():
+    mapping = {1: "one"}
+    refresher = make_refresher(mapping)
+    refresher.apply_notify(
+        '{"user_id": 2, "user_name": "two", "updated_at": "2022-03-07T10:00:00+00:00"}'
+    )
+    refresher.apply_notify('{"user_id": 1, "user_name": null}')
+
+    assert mapping == {2: "two"}
+    assert refresher.watermark == datetime(2022, 3, 7, 10, tzinfo=timezone.utc)
+    assert refresher.applied == 2
+
+
+def test_watermark_only_moves_forward():
+    later = datetime(2022, 3, 7, 10, tzinfo=timezone.utc)
+    refresher = make_refresher({}, watermark=later)
+    refresher.apply(1, "one", later - timedelta(minutes=1))
+
+    assert refresher.watermark == later
+
+
+def test_catch_up_reads_only_changed_rows(postgresql):
+    fake_self = FakeObject()
+    fake_self.pool = FakePool(postgresql)
+    ToolkitPostgre.initialize_db(fake_self)
+    add_user(postgresql, 1, "one")
+    cur = postgresql.execute("SELECT now();")
+    loaded_at = cur.fetchone()[0]
+    postgresql.commit()
+    time.sleep(0.01)
+    add_user(postgresql, 2, "two")
+
+    mapping = {1: "one"}
+    refresher = make_refresher(mapping, watermark=loaded_at)
+
+    assert refresher.catch_up(postgresql) >= 1
+    assert mapping == {1: "one", 2: "two"}
+
+
+def test_refresher_applies_notifications(postgresql):
+    fake_self = FakeObject()
+    fake_self.pool = FakePool(postgresql)
+    ToolkitPostgre.initialize_db(fake_self)
+
+    mapping = {}
+    refresher = make_refresher(mapping, postgresql.info.get_parameters())
+    refresher.start()
+    deadline = time.monotonic() + 10
+    while refresher.stats()["watermark"] is None and time.monotonic() < deadline:
+        add_user(postgresql, 3, "three")
+        time.sleep(0.1)
+    refresher.killall.set()
+
+    assert mapping == {3: "three"}
@@ -0,0 +1,82 @@
+# native
+from datetime import datetime, timezone
+import logging
+
+# packages
+import psycopg.sql as psql
+from pytest_postgresql import factories
+
+# lib
+from classes.compact_mapping import CompactMapping
+from classes.mapping_refresh import MappingRefresher
+from classes.mapping_snapshot import load_snapshot, write_snapshot
+from tests.test_mapping_refresh import add_user
+from tests.test_postgres_pipe import FakeObject, FakePool
+from tools.tools_postgre import Toolkit as ToolkitPostgre
+
+log_tester = logging.getLogger("Tester")
+
+postgresql_my_proc = factories.postgresql_proc()
+postgresql = factories.postgresql("postgresql_my_proc")
+
+WATERMARK = datetime(2022, 3, 7, 10, tzinfo=timezone.utc)
+
+
+def test_snapshot_round_trip(tmp_path):
+    path = str(tmp_path / "mapping.snapshot")
+    write_snapshot(path, {1: "one", 2: "two"}, WATERMARK)
+    mapping, watermark = load_snapshot(path, log_tester)
+
+    assert isinstance(mapping, CompactMapping)
+    assert dict(mapping.items()) == {1: "one", 2: "two"}
+    assert watermark == WATERMARK
+
+
+def test_snapshot_keeps_changes(tmp_path):
+    path = str(tmp_path / "mapping.snapshot")
+    write_snapshot(path, {1: "one", 2: "two"}, WATERMARK)
+    mapping, _ = load_snapshot(path, log_tester)
+    mapping[3] = "three"
+    mapping.pop(1)
+    # rewritten over the file it was loaded from
+    write_snapshot(path, mapping, WATERMARK)
+
+    assert dict(load_snapshot(path, log_tester)[0].items()) == {2: "two", 3: "three"}
+
+
+def test_unusable_snapshots_are_ignored(tmp_path):
+    path = tmp_path / "mapping.snapshot"
+    assert load_snapshot(str(path), log_tester) is None
+
+    path.write_bytes(b"")
+    assert load_snapshot(str(path), log_tester) is None
+
+    write_snapshot(str(path), {i: f"user{i}" for i in range(100)}, WATERMARK)
+    path.write_bytes(path.read_bytes()[:-10])
+    assert load_snapshot(str(path), log_tester) is None
+
+    path.write_bytes(b"not a snapshot" * 10)
+    assert load_snapshot(str(path), log_tester) is None
+
+
+def test_catch_up_after_snapshot(postgresql, tmp_path):
+    fake_self = FakeObject()
+    fake_self.pool = FakePool(postgresql)
+    ToolkitPostgre.initialize_db(fake_self)
+    add_user(postgresql, 1, "one")
+    add_user(postgresql, 2, "two")
+    watermark = postgresql.execute(
+        psql.SQL("SELECT max(updated_at) FROM {}").format(
+            psql.Identifier("id_name_mapping")
+        )
+    ).fetchone()[0]
+    path = str(tmp_path / "mapping.snapshot")
+    write_snapshot(path, {1: "one", 2: "two"}, watermark)
+    add_user(postgresql, 2, "deux")
+    add_user(postgresql, 3, "three")
+
+    mapping, watermark = load_snapshot(path, log_tester)
+    refresher = MappingRefresher(None, mapping, None, log_tester, watermark)
+    refresher.catch_up(postgresql)
+
+    assert dict(mapping.items()) == {1: "one", 2: "deux", 3: "three"}
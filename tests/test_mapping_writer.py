@@ -0,0 +1,104 @@
+# native
+import logging
+from queue import Queue
+from threading import Event
+
+# packages
+import psycopg
+import psycopg.sql as psql
+from pytest_postgresql import factories
+
+# lib
+from classes.classesv2 import TweetDB
+from classes.decoder import StreamRecord
+from classes.mapping_writer import MappingWriter
+from tests.test_postgres_pipe import FakeObject, FakePool
+from tools.tools_postgre import Toolkit as ToolkitPostgre
+
+log_tester = logging.getLogger("Tester")
+
+postgresql_my_proc = factories.postgresql_proc()
+postgresql = factories.postgresql("postgresql_my_proc")
+
+
+class BrokenPool(object):
+    def connection(self):
+        raise psycopg.OperationalError("down")
+
+
+def make_db(mapping, writer=None):
+    events = {"local_db": Event(), "sql": Event(), "killall": Event()}
+    db_q = Queue()
+    database = TweetDB(
+        {}, Queue(), db_q, events, mapping, log_tester, mapping_writer=writer
+    )
+    return database, db_q
+
+
+def test_extract_row_resolves_from_includes():
+    writer = MappingWriter(None, log_tester)
+    database, _ = make_db({}, writer)
+    payload = {
+        "data": {"id": "5", "author_id": "7", "text": "hello"},
+        "includes": {"users": [{"id": "7", "username": "seven", "name": "Seven"}]},
+    }
+
+    assert database.extract_row(payload) == (5, 7, "seven", "hello")
+    assert database.id_mapping == {7: "seven"}
+    assert writer.take() == [(7, "seven", "Seven")]
+
+
+def test_extract_record_resolves_from_includes():
+    writer = MappingWriter(None, log_tester)
+    database, db_q = make_db({}, writer)
+    database.parse(StreamRecord(5, 7, "one", "seven", (), "Seven"))
+    database.parse(StreamRecord(6, 7, "two", "seven", (), "Seven"))
+    database.parse(StreamRecord(8, 9, "three"))
+
+    assert [db_q.get_nowait()[2] for _ in range(db_q.qsize())] == ["seven", "seven"]
+    # queued once, the second tweet found the author in the mapping
+    assert writer.take() == [(7, "seven", "Seven")]
+    assert database.resolved == 1
+
+
+def test_take_keeps_the_latest_name():
+    writer = MappingWriter(None, log_tester, max_batch=2)
+    writer.put(1, "old")
+    writer.put(1, "new")
+    writer.put(2, "two")
+    writer.put(3, "three")
+
+    assert writer.take() == [(1, "new", None), (2, "two", None)]
+    assert writer.take() == [(3, "three", None)]
+
+
+def test_flush_keeps_authors_when_postgres_is_down():
+    writer = MappingWriter(BrokenPool(), log_tester)
+    writer.put(1, "one")
+
+    assert writer.flush() == 0
+    assert writer.take() == [(1, "one", None)]
+
+
+def test_flush_upserts_authors(postgresql):
+    fake_self = FakeObject()
+    fake_self.pool = FakePool(postgresql)
+    ToolkitPostgre.initialize_db(fake_self)
+    postgresql.execute(
+        psql.SQL(
+            "INSERT INTO {} (user_id,user_name,user_full_name) VALUES (1,'one','One');"
+        ).format(psql.Identifier("id_name_mapping"))
+    )
+    postgresql.commit()
+
+    writer = MappingWriter(FakePool(postgresql), log_tester)
+    writer.put(1, "uno")
+    writer.put(2, "two", "Two")
+
+    assert writer.flush() == 2
+    rows = postgresql.execute(
+        psql.SQL(
+            "SELECT user_id,user_name,user_full_name FROM {} ORDER BY user_id"
+        ).format(psql.Identifier("id_name_mapping"))
+    ).fetchall()
+    assert rows == [(1, "uno", "One"), (2, "two", "Two")]
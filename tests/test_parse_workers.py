@@ -0,0 +1,86 @@
+# native
+import json
+import logging
+from queue import Queue
+from threading import Event
+import time
+
+# lib
+from classes.classesv2 import TweetDB
+from classes.parse_workers import ParseWorkerPool, init_worker, parse_lines
+
+log_tester = logging.getLogger("Tester")
+
+
+def make_line(tweet_id, author_id, text="text"):
+    payload = {"data": {"id": str(tweet_id), "author_id": str(author_id), "text": text}}
+    return json.dumps(payload).encode()
+
+
+def test_parse_lines():
+    init_worker({1: "one"})
+    rows = parse_lines([make_line(10, 1, "a\nb"), make_line(11, 2)])
+
+    assert rows == [(10, 1, "one", "ab"), (11, 2, None, "text")]
+
+
+def test_pool_keeps_order():
+    lines = [make_line(i, i % 3) for i in range(1000)]
+    chunks = [lines[i : i + 7] for i in range(0, len(lines), 7)]
+    pool = ParseWorkerPool(3, {0: "zero", 1: "one", 2: "two"}, log_tester)
+    rows = [row for chunk in pool.parse(chunks) for row in chunk]
+    pool.close()
+
+    assert [row[0] for row in rows] == list(range(1000))
+
+
+def test_connect_to_workers_drains_queue():
+    events = {"local_db": Event(), "sql": Event(), "killall": Event()}
+    response_q = Queue()
+    db_q = Queue()
+    database = TweetDB({}, response_q, db_q, events, {1: "one"}, log_tester)
+    for i in range(50):
+        response_q.put(make_line(i, 1))
+    events["killall"].set()
+
+    database.connect_to_workers(ParseWorkerPool(2, {1: "one"}, log_tester, 8))
+
+    assert [db_q.get_nowait()[0] for _ in range(50)] == list(range(50))
+    assert events["sql"].is_set()
+
+
+def test_connect_to_workers_uses_live_mapping():
+    events = {"local_db": Event(), "sql": Event(), "killall": Event()}
+    response_q = Queue()
+    db_q = Queue()
+    # the workers start with the old mapping, the refresher has since renamed 1 and added 2
+    database = TweetDB({}, response_q, db_q, events, {1: "uno", 2: "two"}, log_tester)
+    for i, author_id in enumerate((1, 2, 3)):
+        response_q.put(make_line(i, author_id))
+    events["killall"].set()
+
+    database.connect_to_workers(ParseWorkerPool(1, {1: "one"}, log_tester))
+
+    assert [db_q.get_nowait()[:3] for _ in range(db_q.qsize())] == [
+        (0, 1, "uno"),
+        (1, 2, "two"),
+    ]
+
+
+def test_pool_bounds_chunks_in_flight():
+    pulled = []
+
+    def line_chunks():
+        for i in range(100):
+            pulled.append(i)
+            yield [make_line(i, 1)]
+
+    pool = ParseWorkerPool(2, {1: "one"}, log_tester, max_in_flight=3)
+    parsed = pool.parse(line_chunks())
+    assert next(parsed)[0][0] == 0
+    time.sleep(0.2)
+    # the one taken back, three in flight and one waiting for a slot
+    assert len(pulled) <= 5
+
+    assert [rows[0][0] for rows in parsed] == list(range(1, 100))
+    pool.close()
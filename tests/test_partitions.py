@@ -0,0 +1,118 @@
+# native
+from datetime import datetime, timezone
+import logging
+
+# packages
+import psycopg.sql as psql
+from pytest_postgresql import factories
+
+# lib
+from classes.partitions import month_ranges, snowflake_id, snowflake_time
+from tests.test_postgres_pipe import FakeObject, FakePool
+from tools.tools_postgre import Toolkit as ToolkitPostgre
+
+log_tester = logging.getLogger("Tester")
+
+postgresql_my_proc = factories.postgresql_proc()
+postgresql = factories.postgresql("postgresql_my_proc")
+
+MARCH_2022 = datetime(2022, 3, 1, tzinfo=timezone.utc).timestamp()
+
+
+def make_toolkit(connection):
+    fake_self = FakeObject()
+    fake_self.pool = FakePool(connection)
+    fake_self.logger = log_tester
+    return fake_self
+
+
+def partition_of(connection, tweet_id):
+    cur = connection.cursor()
+    cur.execute(
+        psql.SQL("SELECT tableoid::regclass::text FROM {} WHERE tweet_id=%s;").format(
+            psql.Identifier("tweets")
+        ),
+        (tweet_id,),
+    )
+    return cur.fetchone()[0]
+
+
+def test_snowflake_round_trip():
+    # a rule id from the stream, posted 2022-03-07
+    tweet_id = 1500677568919392257
+    posted = snowflake_time(tweet_id)
+
+    assert (
+        datetime.fromtimestamp(posted, timezone.utc).date().isoformat() == "2022-03-07"
+    )
+    assert snowflake_id(posted) <= tweet_id < snowflake_id(posted + 0.001)
+
+
+def test_month_ranges_are_contiguous():
+    ranges = month_ranges(MARCH_2022, MARCH_2022 + 62 * 86400)
+
+    assert [name for name, _, _ in ranges] == [
+        "tweets_y2022m03",
+        "tweets_y2022m04",
+        "tweets_y2022m05",
+    ]
+    assert ranges[0][1] == snowflake_id(MARCH_2022)
+    assert all(a[2] == b[1] for a, b in zip(ranges, ranges[1:]))
+    assert ranges[0][1] <= 1500677568919392257 < ranges[0][2]
+
+
+def test_initialize_partitioned(postgresql):
+    ToolkitPostgre.initialize_db(make_toolkit(postgresql), partitioned=True)
+    tweet_id = snowflake_id(datetime.now(timezone.utc).timestamp())
+    cur = postgresql.cursor()
+    cur.execute(
+        psql.SQL("INSERT INTO {} VALUES (%s,%s,%s,%s);").format(
+            psql.Identifier("tweets")
+        ),
+        (tweet_id, 10, "author", "text"),
+    )
+
+    now = datetime.now(timezone.utc)
+    assert partition_of(postgresql, tweet_id) == f"tweets_y{now.year}m{now.month:02d}"
+    assert partition_of(postgresql, 1) == "tweets_default"
+
+
+def test_migrate_to_partitioned(postgresql):
+    toolkit = make_toolkit(postgresql)
+    ToolkitPostgre.initialize_db(toolkit)
+    cur = postgresql.cursor()
+    cur.execute(
+        psql.SQL("INSERT INTO {} VALUES (%s,%s,%s,%s);").format(
+            psql.Identifier("tweets")
+        ),
+        (1500677568919392257, 10, "author", "text"),
+    )
+    postgresql.commit()
+
+    ToolkitPostgre.migrate_to_partitioned(toolkit)
+
+    assert partition_of(postgresql, 1500677568919392257) == "tweets_y2022m03"
+    assert partition_of(postgresql, 1) == "tweets_y2010m11"
+    cur.execute("SELECT to_regclass('tweets_unpartitioned') IS NULL;")
+    assert cur.fetchone()[0]
+
+
+def test_migrate_keeps_early_tweets_in_their_month(postgresql):
+    toolkit = make_toolkit(postgresql)
+    ToolkitPostgre.initialize_db(toolkit)
+    # 00:30 UTC on the 1st, before the Twitter epoch's time of day
+    early = snowflake_id(datetime(2022, 4, 1, 0, 30, tzinfo=timezone.utc).timestamp())
+    cur = postgresql.cursor()
+    cur.execute(
+        psql.SQL("INSERT INTO {} VALUES (%s,%s,%s,%s);").format(
+            psql.Identifier("tweets")
+        ),
+        (early, 10, "author", "text"),
+    )
+    postgresql.commit()
+
+    ToolkitPostgre.migrate_to_partitioned(toolkit)
+
+    assert partition_of(postgresql, early) == "tweets_y2022m04"
+    cur.execute("SELECT to_regclass('tweets_y2022m03') IS NULL;")
+    assert cur.fetchone()[0]
@@ -0,0 +1,167 @@
+# native
+import asyncio
+from contextlib import asynccontextmanager
+import logging
+from threading import Event
+
+# packages
+import psycopg
+import psycopg.sql as psql
+from pytest_postgresql import factories
+
+# lib
+from classes.async_pipeline import AsyncPipeline
+from classes.pipeline_writer import PipelineWriter
+from tests.test_async_pipeline import fakeTwitterHandler, make_database, make_response
+from tests.test_postgres_pipe import FakeObject, make_fake_pipe
+from tools.tools_postgre import Toolkit as ToolkitPostgre
+
+log_tester = logging.getLogger("Tester")
+
+postgresql_my_proc = factories.postgresql_proc()
+postgresql = factories.postgresql("postgresql_my_proc")
+
+
+class fakeWriter:
+    def __init__(self) -> None:
+        self.rows = []
+        self.closed = False
+
+    async def write(self, rows):
+        self.rows.extend(rows)
+
+    async def close(self):
+        self.closed = True
+
+
+def make_writer(postgresql, acks: list, max_in_flight=500):
+    fake_self = make_fake_pipe(postgresql)
+    ToolkitPostgre.initialize_db(fake_self)
+    return PipelineWriter(
+        postgresql.info.get_parameters(), log_tester, max_in_flight, acks.extend
+    )
+
+
+def stored_ids(postgresql) -> list:
+    cur = postgresql.cursor()
+    cur.execute(
+        psql.SQL("SELECT tweet_id FROM {} ORDER BY tweet_id;").format(
+            psql.Identifier("tweets")
+        )
+    )
+    return [x[0] for x in cur.fetchall()]
+
+
+def test_async_pipeline_uses_writer():
+    responses = [make_response(i, 1, f"text {i}") for i in range(20)]
+    writer = fakeWriter()
+    pipeline = AsyncPipeline(
+        fakeTwitterHandler(responses), make_database(), None, log_tester, writer=writer
+    )
+    asyncio.run(pipeline.run())
+
+    assert [row[0] for row in writer.rows] == list(range(20))
+    assert writer.closed
+
+
+def test_write_acks_every_window(postgresql):
+    acks = []
+    writer = make_writer(postgresql, acks, max_in_flight=16)
+    rows = [(i, 10, "author", f"text {i}") for i in range(2, 102)]
+
+    async def write():
+        await writer.write(rows)
+        await writer.close()
+
+    asyncio.run(write())
+
+    assert acks == list(range(2, 102))
+    assert writer.stats()["syncs"] == 7
+    assert stored_ids(postgresql) == list(range(1, 102))
+
+
+def test_write_drops_only_bad_rows(postgresql):
+    acks = []
+    writer = make_writer(postgresql, acks)
+    # tweet_id=1 is already stored, the NULL author name breaks the window
+    rows = [(2, 10, "author", "a"), (1, 10, "author", "dup"), (3, 10, None, "bad")]
+
+    async def write():
+        await writer.write(rows)
+        await writer.close()
+
+    asyncio.run(write())
+
+    assert acks == [2, 1]
+    assert writer.failed == 1
+    assert stored_ids(postgresql) == [1, 2]
+
+
+class fakeConnection:
+    """Stores rows like an AsyncConnection in pipeline mode, or fails if down"""
+
+    def __init__(self, stored: list, down: bool) -> None:
+        self.stored = stored
+        self.down = down
+        self.closed = False
+
+    @asynccontextmanager
+    async def pipeline(self):
+        pipeline = FakeObject()
+
+        async def sync():
+            if self.down:
+                raise psycopg.OperationalError("server closed the connection")
+
+        pipeline.sync = sync
+        yield pipeline
+
+    @asynccontextmanager
+    async def cursor(self):
+        cursor = FakeObject()
+
+        async def executemany(query, rows):
+            if not self.down:
+                self.stored.extend(row[0] for row in rows)
+
+        cursor.executemany = executemany
+        yield cursor
+
+    async def close(self):
+        self.closed = True
+
+
+def make_flaky_writer(failures: int, acks: list, killall: Event = None):
+    writer = PipelineWriter(
+        {}, log_tester, 4, acks.extend, killall=killall, retry_interval=0.01
+    )
+    writer.stored = []
+    connects = []
+
+    async def connect():
+        connects.append(1)
+        writer.conn = fakeConnection(writer.stored, len(connects) <= failures)
+
+    writer.connect = connect
+    return writer
+
+
+def test_write_retries_lost_windows():
+    acks = []
+    writer = make_flaky_writer(2, acks)
+    asyncio.run(writer.write([(i, 10, "author", "text") for i in range(10)]))
+
+    assert writer.stored == acks == list(range(10))
+    assert writer.stats()["retries"] == 2
+    assert writer.failed == 0
+
+
+def test_write_gives_up_at_shutdown():
+    acks = []
+    killall = Event()
+    killall.set()
+    writer = make_flaky_writer(100, acks, killall)
+
+    assert not asyncio.run(writer.write_window([(1, 10, "author", "text")]))
+    assert acks == []
+    assert writer.failed == 1
@@ -0,0 +1,105 @@
+# native
+from contextlib import contextmanager
+import logging
+from queue import Queue
+
+# packages
+import psycopg.sql as psql
+from pytest_postgresql import factories
+
+# lib
+from classes.classesv2 import PostgresPipe
+from tools.tools_postgre import Toolkit as ToolkitPostgre
+
+log_tester = logging.getLogger("Tester")
+
+postgresql_my_proc = factories.postgresql_proc()
+postgresql = factories.postgresql("postgresql_my_proc")
+
+
+class FakeObject(object):
+    pass
+
+
+class FakePool(object):
+    """Hands out the single test connection the way ConnectionPool.connection() would"""
+
+    def __init__(self, connection):
+        self.conn = connection
+
+    @contextmanager
+    def connection(self):
+        try:
+            yield self.conn
+        except Exception:
+            self.conn.rollback()
+            raise
+        else:
+            self.conn.commit()
+
+
+def make_fake_pipe(connection=None, max_batch_size=500, max_linger=0.01):
+    fake_self = FakeObject()
+    fake_self.pool = FakePool(connection)
+    fake_self.db_q = Queue()
+    fake_self.logger = log_tester
+    fake_self.max_batch_size = max_batch_size
+    fake_self.max_linger = max_linger
+    fake_self.execute_SQL = lambda row: PostgresPipe.execute_SQL(fake_self, row)
+    return fake_self
+
+
+def test_collect_batch_stops_at_max_batch_size():
+    fake_self = make_fake_pipe(max_batch_size=3)
+    for i in range(5):
+        fake_self.db_q.put((i,))
+
+    assert PostgresPipe.collect_batch(fake_self) == [(0,), (1,), (2,)]
+    assert PostgresPipe.collect_batch(fake_self) == [(3,), (4,)]
+
+
+def test_execute_batch(postgresql):
+    fake_self = make_fake_pipe(postgresql)
+    ToolkitPostgre.initialize_db(fake_self)
+
+    rows = [(i, 10, "author", f"text {i}") for i in range(2, 102)]
+    PostgresPipe.execute_batch(fake_self, rows)
+
+    cur = postgresql.cursor()
+    cur.execute(psql.SQL("SELECT count(*) FROM {};").format(psql.Identifier("tweets")))
+    assert cur.fetchone()[0] == 101
+
+
+def test_execute_batch_keeps_good_rows_on_duplicate(postgresql):
+    fake_self = make_fake_pipe(postgresql)
+    ToolkitPostgre.initialize_db(fake_self)
+
+    # tweet_id=1 is the test tweet added by initialize_db
+    rows = [(2, 10, "author", "a"), (1, 10, "author", "dup"), (3, 10, "author", "b")]
+    PostgresPipe.execute_batch(fake_self, rows)
+
+    cur = postgresql.cursor()
+    cur.execute(
+        psql.SQL("SELECT tweet_id FROM {} ORDER BY tweet_id;").format(
+            psql.Identifier("tweets")
+        )
+    )
+    assert [x[0] for x in cur.fetchall()] == [1, 2, 3]
+
+
+def test_execute_batch_skips_stored_tweets(postgresql):
+    fake_self = make_fake_pipe(postgresql)
+    ToolkitPostgre.initialize_db(fake_self)
+
+    rows = [(i, 10, "author", f"text {i}") for i in range(2, 6)]
+    PostgresPipe.execute_batch(fake_self, rows)
+    # replayed batch with one new tweet and one repeated within the batch
+    PostgresPipe.execute_batch(fake_self, rows + [(6, 10, "author", "new")] * 2)
+
+    cur = postgresql.cursor()
+    cur.execute(
+        psql.SQL("SELECT tweet_id FROM {} ORDER BY tweet_id;").format(
+            psql.Identifier("tweets")
+        )
+    )
+    assert [x[0] for x in cur.fetchall()] == [1, 2, 3, 4, 5, 6]
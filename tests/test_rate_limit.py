@@ -0,0 +1,123 @@
+# native
+import logging
+from threading import Thread
+import time
+
+# lib
+from classes.rate_limit import RateLimitScheduler
+
+log_tester = logging.getLogger("Tester")
+
+USERS_URL = "https://api.twitter.com/2/users/by?usernames=test1,test2"
+
+
+def make_headers(limit, remaining, reset):
+    return {
+        "x-rate-limit-limit": str(limit),
+        "x-rate-limit-remaining": str(remaining),
+        "x-rate-limit-reset": str(reset),
+    }
+
+
+def test_endpoint_groups_ids():
+    assert (
+        RateLimitScheduler.endpoint("https://api.twitter.com/2/users/1234/tweets?x=1")
+        == "GET /2/users/:id/tweets"
+    )
+    assert RateLimitScheduler.endpoint(USERS_URL) == "GET /2/users/by"
+    assert RateLimitScheduler.endpoint(USERS_URL, "post") == "POST /2/users/by"
+
+
+def test_budget_follows_headers():
+    scheduler = RateLimitScheduler(log_tester)
+    assert scheduler.budget(USERS_URL) is None
+
+    reset = time.time() + 900
+    scheduler.update(USERS_URL, make_headers(300, 10, reset))
+    scheduler.acquire(USERS_URL)
+
+    assert scheduler.budget(USERS_URL) == {"limit": 300, "remaining": 9, "reset": reset}
+    assert list(scheduler.budget()) == ["GET /2/users/by"]
+
+
+def test_update_ignores_missing_headers():
+    scheduler = RateLimitScheduler(log_tester)
+    scheduler.update(USERS_URL, {})
+    assert scheduler.budget() == {}
+
+
+def test_acquire_waits_for_reset():
+    scheduler = RateLimitScheduler(log_tester, margin=0)
+    scheduler.update(USERS_URL, make_headers(300, 0, time.time() + 0.3))
+
+    start = time.perf_counter()
+    scheduler.acquire(USERS_URL)
+    assert time.perf_counter() - start >= 0.25
+
+
+def test_acquire_wakes_on_new_budget():
+    scheduler = RateLimitScheduler(log_tester)
+    scheduler.update(USERS_URL, make_headers(300, 0, time.time() + 900))
+
+    waiter = Thread(target=scheduler.acquire, args=(USERS_URL,))
+    waiter.start()
+    time.sleep(0.05)
+    assert waiter.is_alive()
+
+    scheduler.update(USERS_URL, make_headers(300, 5, time.time() + 1800))
+    waiter.join(timeout=1)
+    assert not waiter.is_alive()
+
+
+def test_one_request_learns_the_budget():
+    scheduler = RateLimitScheduler(log_tester)
+    scheduler.acquire(USERS_URL)
+
+    waiter = Thread(target=scheduler.acquire, args=(USERS_URL,))
+    waiter.start()
+    time.sleep(0.05)
+    assert waiter.is_alive()
+
+    scheduler.update(USERS_URL, make_headers(300, 299, time.time() + 900))
+    waiter.join(timeout=1)
+    assert not waiter.is_alive()
+
+
+def test_one_request_after_reset():
+    scheduler = RateLimitScheduler(log_tester, margin=0)
+    scheduler.update(USERS_URL, make_headers(300, 5, time.time() - 1))
+    scheduler.acquire(USERS_URL)
+
+    waiter = Thread(target=scheduler.acquire, args=(USERS_URL,))
+    waiter.start()
+    time.sleep(0.05)
+    assert waiter.is_alive()
+
+    # a response without headers lets the next request try
+    scheduler.update(USERS_URL, {})
+    waiter.join(timeout=1)
+    assert not waiter.is_alive()
+
+
+def test_budget_is_spent_without_waiting():
+    scheduler = RateLimitScheduler(log_tester)
+    scheduler.update(USERS_URL, make_headers(900, 50, time.time() + 900))
+
+    start = time.perf_counter()
+    for _ in range(50):
+        scheduler.acquire(USERS_URL)
+    assert time.perf_counter() - start < 0.1
+    assert scheduler.budget(USERS_URL)["remaining"] == 0
+
+
+def test_methods_have_their_own_budget():
+    scheduler = RateLimitScheduler(log_tester)
+    rules_url = "https://api.twitter.com/2/tweets/search/stream/rules"
+    scheduler.update(rules_url, make_headers(450, 0, time.time() + 900), "GET")
+    scheduler.update(rules_url, make_headers(100, 5, time.time() + 900), "POST")
+
+    start = time.perf_counter()
+    scheduler.acquire(rules_url, "POST")
+    assert time.perf_counter() - start < 0.1
+    assert scheduler.budget(rules_url, "POST")["remaining"] == 4
+    assert scheduler.budget(rules_url)["remaining"] == 0
@@ -0,0 +1,83 @@
+# native
+import logging
+from threading import Event
+import time
+
+# packages
+import pytest
+
+# lib
+from classes.classesv2 import TwitterHandler
+from tools.replay_server import ReplayServer, make_corpus
+
+log_tester = logging.getLogger("Tester")
+
+
+@pytest.fixture
+def replay():
+    corpus, mapping = make_corpus(200, n_authors=5)
+    server = ReplayServer(("127.0.0.1", 0), corpus, rate=2000, heartbeat=0.05)
+    server.start()
+    yield server
+    server.stop()
+
+
+def make_handler(server):
+    events = {"local_db": Event(), "sql": Event(), "killall": Event()}
+    return TwitterHandler("test_token", events, log_tester, api_url=server.url)
+
+
+def test_stream_replays_corpus(replay):
+    handler = make_handler(replay)
+    tweets = list(handler.stream())
+
+    assert [t["data"]["id"] for t in tweets] == [t["data"]["id"] for t in replay.corpus]
+    assert handler.events["killall"].is_set()
+
+
+def test_stream_sends_heartbeats(replay):
+    replay.corpus = replay.corpus[:1]
+    replay.hold_open = True
+    handler = make_handler(replay)
+
+    response = handler.session.get(
+        f"{replay.url}/2/tweets/search/stream", stream=True, timeout=2
+    )
+    lines = response.iter_lines()
+    assert next(lines).startswith(b"{")
+    assert next(lines) == b""
+    response.close()
+
+
+def test_rules_round_trip(replay):
+    handler = make_handler(replay)
+    assert handler.get_rules()[0] is None
+
+    handler.set_rules([{"value": "from:user0 OR from:user1", "tag": "24"}])
+    info, response = handler.get_rules()
+    assert info["rule_count"] == 1
+    assert info["rules"][0]["value"] == "from:user0 OR from:user1"
+
+    handler.delete_all_rules(response)
+    assert handler.get_rules()[0] is None
+
+
+def test_users_by_uses_corpus_ids(replay):
+    handler = make_handler(replay)
+    data = handler.get_from_endpoint(f"{replay.url}/2/users/by?usernames=user0,nobody")
+
+    assert data["data"][0] == {"id": "10000", "name": "User user0", "username": "user0"}
+    assert data["data"][1]["username"] == "nobody"
+
+
+def test_rate_limit_is_waited_out(replay):
+    replay.rate_limit = 2
+    replay.rate_window = 1
+    handler = make_handler(replay)
+    handler.rate_limits.margin = 0
+
+    start = time.perf_counter()
+    for _ in range(3):
+        handler.get_rules()
+    assert time.perf_counter() - start >= 0.5
+    assert handler.rate_limits.budget(f"{replay.url}/2/tweets/search/stream/rules")
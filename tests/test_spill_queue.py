@@ -0,0 +1,129 @@
+# native
+import queue
+from threading import Timer
+import time
+
+# packages
+import pytest
+
+# lib
+from classes.spill_queue import SpillQueue
+
+
+def test_spill_keeps_order(tmp_path):
+    q = SpillQueue(str(tmp_path / "q.spill"), high_watermark=10)
+    for i in range(100):
+        q.put((i, "text"))
+
+    stats = q.stats()
+    assert stats["memory_depth"] == 10
+    assert stats["spilled"] == 90
+    assert stats["spill_bytes"] > 0
+
+    assert [q.get(timeout=1)[0] for _ in range(100)] == list(range(100))
+    assert q.empty()
+    assert q.stats()["spill_bytes"] == 0
+    assert q.stats()["spilled_total"] == 90
+
+
+def test_interleaved_put_get_keeps_order(tmp_path):
+    q = SpillQueue(str(tmp_path / "q.spill"), high_watermark=4)
+    out = []
+    for i in range(50):
+        q.put(i)
+        if i % 3 == 0:
+            out.append(q.get_nowait())
+    while not q.empty():
+        out.append(q.get_nowait())
+
+    assert out == list(range(50))
+
+
+def test_get_times_out(tmp_path):
+    q = SpillQueue(str(tmp_path / "q.spill"))
+    with pytest.raises(queue.Empty):
+        q.get(timeout=0.01)
+    with pytest.raises(queue.Empty):
+        q.get_nowait()
+
+
+def test_recovers_spilled_items(tmp_path):
+    path = str(tmp_path / "q.spill")
+    q = SpillQueue(path, high_watermark=2)
+    for i in range(6):
+        q.put(i)
+    q.writer.flush()
+    # a crash mid-write leaves half a record behind
+    q.writer.write(b"\x10\x00\x00\x00abc")
+    q.close()
+
+    recovered = SpillQueue(path, high_watermark=2)
+    recovered.put(6)
+    assert [recovered.get_nowait() for _ in range(5)] == [2, 3, 4, 5, 6]
+
+
+def test_put_waits_at_max_spill_bytes(tmp_path):
+    q = SpillQueue(str(tmp_path / "q.spill"), high_watermark=2, max_spill_bytes=1)
+    for i in range(3):
+        q.put(i)
+    start = time.monotonic()
+    Timer(0.05, lambda: [q.get(), q.get()]).start()
+    q.put(3)
+
+    assert time.monotonic() - start >= 0.04
+    assert [q.get_nowait() for _ in range(2)] == [2, 3]
+
+
+def test_segments_are_reclaimed_as_they_are_read(tmp_path):
+    q = SpillQueue(
+        str(tmp_path / "q.spill"),
+        high_watermark=2,
+        max_spill_bytes=None,
+        segment_bytes=100,
+    )
+    for i in range(20):
+        q.put((i, "x" * 40))
+    full = q.stats()
+    assert full["segments"] > 3
+
+    out = [q.get_nowait()[0] for _ in range(8)]
+    stats = q.stats()
+    assert stats["spilled"] > 0
+    assert stats["segments"] < full["segments"]
+    assert stats["spill_bytes"] < full["spill_bytes"]
+    assert len(list(tmp_path.iterdir())) == stats["segments"]
+
+    while not q.empty():
+        out.append(q.get_nowait()[0])
+    assert out == list(range(20))
+    assert q.stats()["spill_bytes"] == 0
+
+
+def test_put_resumes_before_a_full_drain(tmp_path):
+    q = SpillQueue(
+        str(tmp_path / "q.spill"),
+        high_watermark=2,
+        max_spill_bytes=None,
+        segment_bytes=100,
+    )
+    for i in range(8):
+        q.put((i, "x" * 40))
+    q.max_spill_bytes = q.spill_bytes()
+    Timer(0.05, lambda: [q.get() for _ in range(4)]).start()
+    q.put((8, "x" * 40))
+
+    # space came back from the segments already read, with items still on disk
+    assert q.stats()["spilled"] > 0
+    assert [q.get_nowait()[0] for _ in range(5)] == [4, 5, 6, 7, 8]
+
+
+def test_recovers_items_across_segments(tmp_path):
+    path = str(tmp_path / "q.spill")
+    q = SpillQueue(path, high_watermark=2, segment_bytes=100)
+    for i in range(12):
+        q.put((i, "x" * 40))
+    q.get_nowait()
+    q.close()
+
+    recovered = SpillQueue(path, high_watermark=2, segment_bytes=100)
+    assert [recovered.get_nowait()[0] for _ in range(10)] == list(range(2, 12))
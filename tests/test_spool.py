@@ -0,0 +1,96 @@
+# native
+import logging
+import os
+import time
+
+# lib
+from classes.spool import SpoolDrainer, WriteAheadSpool
+
+log_tester = logging.getLogger("Tester")
+
+
+def make_rows(start, n):
+    return [(i, 10, "author", f"text {i}") for i in range(start, start + n)]
+
+
+def test_read_and_commit(tmp_path):
+    spool = WriteAheadSpool(str(tmp_path), log_tester, fsync=False)
+    spool.append(make_rows(0, 3))
+    spool.append(make_rows(3, 3))
+
+    rows, position = spool.read(4)
+    assert [row[0] for row in rows] == list(range(6))
+    spool.commit(position)
+    assert spool.read(4)[0] == []
+    assert spool.backlog_bytes() == 0
+
+
+def test_rewind_rereads_uncommitted_rows(tmp_path):
+    spool = WriteAheadSpool(str(tmp_path), log_tester, fsync=False)
+    spool.append(make_rows(0, 3))
+    spool.read(10)
+    spool.rewind()
+
+    assert [row[0] for row in spool.read(10)[0]] == [0, 1, 2]
+
+
+def test_reopen_resumes_at_checkpoint(tmp_path):
+    spool = WriteAheadSpool(str(tmp_path), log_tester, fsync=False)
+    spool.append(make_rows(0, 2))
+    spool.commit(spool.read(2)[1])
+    spool.append(make_rows(2, 2))
+    spool.close()
+
+    spool = WriteAheadSpool(str(tmp_path), log_tester, fsync=False)
+    spool.append(make_rows(4, 2))
+    assert [row[0] for row in spool.read(10)[0]] == [2, 3, 4, 5]
+
+
+def test_drops_a_torn_record(tmp_path):
+    spool = WriteAheadSpool(str(tmp_path), log_tester, fsync=False)
+    spool.append(make_rows(0, 2))
+    spool.append(make_rows(2, 2))
+    spool.close()
+    path = spool.segment_path(0)
+    os.truncate(path, os.path.getsize(path) - 3)
+
+    spool = WriteAheadSpool(str(tmp_path), log_tester, fsync=False)
+    spool.append(make_rows(4, 1))
+    assert [row[0] for row in spool.read(10)[0]] == [0, 1, 4]
+
+
+def test_drained_segments_are_deleted(tmp_path):
+    spool = WriteAheadSpool(str(tmp_path), log_tester, max_segment_bytes=100)
+    for i in range(5):
+        spool.append(make_rows(i * 10, 10))
+    assert len(spool.segments) == 5
+
+    rows, position = spool.read(100)
+    spool.commit(position)
+    assert len(rows) == 50
+    assert spool.segments == [4]
+
+
+def test_drainer_retries_until_postgres_is_back(tmp_path):
+    spool = WriteAheadSpool(str(tmp_path), log_tester, fsync=False)
+    stored = []
+    attempts = []
+
+    def write_batch(rows):
+        attempts.append(len(rows))
+        if len(attempts) < 3:
+            return False
+        stored.extend(rows)
+        return True
+
+    drainer = SpoolDrainer(spool, write_batch, log_tester, retry_interval=0.01)
+    drainer.start()
+    spool.append(make_rows(0, 5))
+    deadline = time.monotonic() + 5
+    while len(stored) < 5 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    drainer.stop()
+
+    assert [row[0] for row in stored] == list(range(5))
+    assert drainer.stats()["failures"] == 2
+    assert drainer.stats()["backlog_bytes"] == 0
@@ -0,0 +1,102 @@
+# native
+from array import array
+import logging
+from queue import Queue
+import statistics
+import sys
+from threading import Event, Thread
+import time
+import tracemalloc
+
+# lib
+from classes.stage import run_stage
+
+log_tester = logging.getLogger("Tester")
+
+
+def frame_depth():
+    frame, depth = sys._getframe(1), 0
+    while frame is not None:
+        frame, depth = frame.f_back, depth + 1
+    return depth
+
+
+def start_stage(work_q, handle, killall, upstream_done=None, poll_interval=1.0):
+    result = {}
+
+    def target():
+        result["handled"] = run_stage(
+            "Tester",
+            lambda timeout: work_q.get(timeout=timeout),
+            handle,
+            killall,
+            log_tester,
+            upstream_done,
+            poll_interval,
+        )
+
+    thread = Thread(target=target, daemon=True)
+    thread.start()
+    return thread, result
+
+
+def test_idle_wake_soak():
+    """
+    Every item arrives on an empty queue, so the stage goes idle and wakes for each one.
+    Stack depth, memory and wake latency have to stay flat over the whole run.
+    """
+    transitions = 20_000
+    work_q = Queue()
+    killall = Event()
+    handled = Event()
+    depths = set()
+
+    def handle(item):
+        depths.add(frame_depth())
+        handled.set()
+
+    # a tiny poll interval also runs the queue.Empty path between most items
+    thread, result = start_stage(work_q, handle, killall, poll_interval=0.0001)
+    # preallocated so the measurement itself does not show up as growth
+    latencies = array("d", bytes(8 * transitions))
+    tracemalloc.start()
+    for num in range(transitions):
+        if num == transitions // 10:
+            baseline = tracemalloc.get_traced_memory()[0]
+        handled.clear()
+        start = time.perf_counter()
+        work_q.put(num)
+        assert handled.wait(5)
+        latencies[num] = time.perf_counter() - start
+    grown = tracemalloc.get_traced_memory()[0] - baseline
+    tracemalloc.stop()
+    killall.set()
+    thread.join(5)
+
+    assert result["handled"] == transitions
+    assert len(depths) == 1
+    assert grown < 64 * 1024
+    first, last = latencies[: transitions // 10], latencies[-transitions // 10 :]
+    assert statistics.median(last) < 3 * statistics.median(first) + 0.001
+
+
+def test_stage_drains_after_upstream_done():
+    work_q = Queue()
+    killall = Event()
+    upstream_done = Event()
+    seen = []
+    killall.set()
+
+    thread, result = start_stage(
+        work_q, seen.append, killall, upstream_done, poll_interval=0.01
+    )
+    for num in range(100):
+        work_q.put(num)
+    time.sleep(0.05)
+    assert thread.is_alive()
+
+    upstream_done.set()
+    thread.join(5)
+    assert not thread.is_alive()
+    assert seen == list(range(100))
+    assert result["handled"] == 100
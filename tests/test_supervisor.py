@@ -0,0 +1,181 @@
+# native
+import logging
+from threading import Event
+import time
+
+# packages
+import pytest
+import requests
+
+# lib
+from classes.classesv2 import TwitterHandler
+from classes.supervisor import StreamSupervisor
+from tools.replay_server import ReplayServer, make_corpus
+
+log_tester = logging.getLogger("Tester")
+
+
+def make_handler(url, stream_timeout=(3.05, 90), **supervisor_args):
+    events = {"local_db": Event(), "sql": Event(), "killall": Event()}
+    supervisor = StreamSupervisor(
+        events["killall"], log_tester, backoff_base=0.01, **supervisor_args
+    )
+    handler = TwitterHandler(
+        "test_token",
+        events,
+        log_tester,
+        stream_timeout=stream_timeout,
+        retries=0,
+        api_url=url,
+        supervisor=supervisor,
+    )
+    return handler, supervisor
+
+
+def read_passes(handler, corpus, passes):
+    """
+    Reads the corpus passes times over, the server replays it on every connection
+    """
+    ids = []
+    for record in handler.stream_records():
+        ids.append(record.tweet_id)
+        if len(ids) == len(corpus) * passes:
+            assert not handler.events["killall"].is_set()
+            handler.events["killall"].set()
+    return ids
+
+
+def start_server(**server_args):
+    corpus, _ = make_corpus(20, n_authors=5)
+    server = ReplayServer(("127.0.0.1", 0), corpus, **server_args)
+    server.start()
+    return server, corpus
+
+
+def test_reconnects_when_server_closes():
+    server, corpus = start_server()
+    closed = []
+    handler, supervisor = make_handler(server.url, on_reconnect=closed.append)
+    ids = read_passes(handler, corpus, 3)
+    server.stop()
+
+    assert ids == [int(p["data"]["id"]) for p in corpus] * 3
+    assert [w.reason for w in supervisor.windows] == ["closed by server"] * 2
+    assert all(w.end is not None for w in supervisor.windows)
+    assert supervisor.connects == 3
+    assert closed == supervisor.windows
+    assert 0 < supervisor.downtime() < 5
+
+
+def test_announced_disconnect_is_the_window_reason():
+    corpus, _ = make_corpus(20, n_authors=5)
+    notice = {
+        "errors": [
+            {
+                "title": "operational-disconnect",
+                "disconnect_type": "UpstreamOperationalDisconnect",
+                "detail": "Upstream closed",
+            }
+        ]
+    }
+    server = ReplayServer(("127.0.0.1", 0), corpus + [notice])
+    server.start()
+    handler, supervisor = make_handler(server.url)
+    lines = []
+    for line in handler.stream_lines():
+        lines.append(line)
+        if len(lines) == len(corpus) * 2:
+            handler.events["killall"].set()
+    server.stop()
+
+    assert all(line.startswith(b'{"data":') for line in lines)
+    assert handler.notices == 1
+    assert [w.reason for w in supervisor.windows] == [
+        "disconnected by server: operational-disconnect: Upstream closed"
+    ]
+
+
+def test_errors_are_logged_not_yielded(caplog):
+    corpus, _ = make_corpus(5, n_authors=5)
+    error = {"errors": [{"title": "ConnectionException", "detail": "Too many"}]}
+    server = ReplayServer(("127.0.0.1", 0), [error] + corpus)
+    server.start()
+    handler, supervisor = make_handler(server.url)
+    with caplog.at_level(logging.ERROR, logger="Tester"):
+        ids = read_passes(handler, corpus, 1)
+    server.stop()
+
+    assert ids == [int(p["data"]["id"]) for p in corpus]
+    assert handler.notices == 1
+    assert "Stream error: ConnectionException: Too many" in caplog.text
+    assert supervisor.announced is None
+
+
+def test_detects_stalled_stream():
+    # no heartbeats once the corpus is sent, the read timeout catches the silence
+    server, corpus = start_server(hold_open=True, heartbeat=60)
+    handler, supervisor = make_handler(server.url, stream_timeout=(3.05, 0.2))
+    ids = read_passes(handler, corpus, 2)
+    server.stop()
+
+    assert len(ids) == len(corpus) * 2
+    assert supervisor.windows[0].reason == "stalled"
+
+
+def test_gives_up_after_max_reconnects():
+    server, _ = start_server()
+    url = server.url
+    server.stop()
+    handler, supervisor = make_handler(url, max_reconnects=2)
+
+    assert list(handler.stream_records()) == []
+    assert len(supervisor.windows) == 1
+    assert supervisor.windows[0].attempts == 3
+    assert supervisor.windows[0].end is None
+    assert handler.events["killall"].is_set()
+
+
+def test_backoff_is_jittered_and_capped():
+    supervisor = StreamSupervisor(Event(), log_tester, backoff_base=1, backoff_max=8)
+    delays = [supervisor.backoff(attempt) for attempt in range(10)]
+
+    assert 0.5 <= delays[0] <= 1
+    assert 2 <= delays[2] <= 4
+    assert all(4 <= delay <= 8 for delay in delays[4:])
+
+
+class tricklingResponse:
+    """
+    Sends chunks with a pause before each one
+    """
+
+    def __init__(self, chunks, pause):
+        self.chunks = chunks
+        self.pause = pause
+
+    def iter_content(self, chunk_size=None):
+        for chunk in self.chunks:
+            time.sleep(self.pause)
+            yield chunk
+
+
+def test_bytes_without_a_line_count_as_stalled():
+    handler, _ = make_handler("http://127.0.0.1:1", stall_timeout=0.1)
+    response = tricklingResponse([b'{"data":'] + [b" "] * 5 + [b"{}}\r\n"], 0.03)
+
+    with pytest.raises(requests.exceptions.ReadTimeout, match="timed out"):
+        list(handler.read_frames(response))
+
+
+def test_heartbeats_keep_the_stream_alive():
+    handler, _ = make_handler("http://127.0.0.1:1", stall_timeout=0.1)
+    response = tricklingResponse([b"\r\n"] * 6 + [b'{"data":{}}\r\n'], 0.03)
+
+    assert [bytes(frame) for frame in handler.read_frames(response)] == [b'{"data":{}}']
+
+
+def test_stall_timeout_caps_the_read_timeout():
+    handler, supervisor = make_handler("http://127.0.0.1:1")
+
+    assert supervisor.stall_timeout == 30
+    assert handler.stall_timeout() == 30
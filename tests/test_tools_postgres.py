@@ -1,4 +1,5 @@
 # native
+from contextlib import contextmanager
 import logging
 import time
 from unittest.mock import patch
@@ -10,7 +11,6 @@ from pytest_postgresql import factories
 # lib
 from tools.tools_postgre import Toolkit as ToolkitPostgre
 
-
 formatter = logging.Formatter("%(asctime)s [%(name)s][%(levelname)s] %(message)s")
 log_tester = logging.getLogger("Tester")
 ch = logging.StreamHandler()
@@ -103,6 +103,23 @@ class FakeObject(object):
     pass
 
 
+class FakePool(object):
+    """Hands out the single test connection the way ConnectionPool.connection() would"""
+
+    def __init__(self, connection):
+        self.conn = connection
+
+    @contextmanager
+    def connection(self):
+        try:
+            yield self.conn
+        except Exception:
+            self.conn.rollback()
+            raise
+        else:
+            self.conn.commit()
+
+
 def fake_extract_users_from_old_rules(rules):
     rules = [x["value"].split("OR") for x in rules["rules"]]
     # --- from https://stackoverflow.com/questions/952914/how-to-make-a-flat-list-out-of-a-list-of-lists
@@ -138,7 +155,7 @@ def test_init(postgresql):
     cur = connection.cursor()
 
     fake_self = FakeObject()
-    fake_self.connection = connection
+    fake_self.pool = FakePool(connection)
     ToolkitPostgre.initialize_db(fake_self)
     cur.execute(
         psql.SQL("SELECT tweet_id FROM {} WHERE tweet_id=1;").format(
@@ -154,7 +171,7 @@ def test_update_author_id(postgresql):
     cur = connection.cursor()
 
     fake_self = FakeObject()
-    fake_self.connection = connection
+    fake_self.pool = FakePool(connection)
     fake_self.handler = fakeTwitterHandler
     fake_self.logger = log_tester
     fake_self.clean_user_rule = fake_clean_user_rule
@@ -175,7 +192,7 @@ def test_create_user_group_db(postgresql):
     cur = connection.cursor()
 
     fake_self = FakeObject()
-    fake_self.connection = connection
+    fake_self.pool = FakePool(connection)
     fake_self.handler = fakeTwitterHandler
 
     users = ["sami", "wami", "bami"]
@@ -195,7 +212,7 @@ def test_update_user_group_db(postgresql):
     cur = connection.cursor()
 
     fake_self = FakeObject()
-    fake_self.connection = connection
+    fake_self.pool = FakePool(connection)
     fake_self.handler = fakeTwitterHandler
 
     users = ["sami", "wami", "bami"]
@@ -217,7 +234,7 @@ def test_get_user_list(postgresql):
     cur = connection.cursor()
 
     fake_self = FakeObject()
-    fake_self.connection = connection
+    fake_self.pool = FakePool(connection)
     fake_self.handler = fakeTwitterHandler
 
     users = ["sami", "wami", "bami"]
@@ -0,0 +1,118 @@
+"""
+Re-ingests raw stream captures (see classes.capture) without refetching anything.
+
+Load captured tweets into the tweets table, parsed with the current TweetDB code:
+    python -m tools.reingest captures/
+Export captured payloads as a corpus for tools.replay_server --corpus:
+    python -m tools.reingest captures/ --export corpus.jsonl
+"""
+
+# native
+import argparse
+import logging
+import os
+from threading import Event
+import time
+
+# lib
+from classes import PG_ARGS
+from classes.capture import list_segments, read_segment
+from classes.classesv2 import PostgresPipe, TweetDB
+from classes.decoder import StreamNotice, decode_line
+
+
+def iter_capture(paths: list[str]):
+    """
+    Yields (receive time, raw stream line) from capture directories and segment files, in order
+    """
+    for path in paths:
+        segments = list_segments(path) if os.path.isdir(path) else [path]
+        for segment in segments:
+            yield from read_segment(segment)
+
+
+def export_corpus(paths: list[str], out_path: str) -> int:
+    count = 0
+    with open(out_path, "wb") as f:
+        for _, line in iter_capture(paths):
+            f.write(line + b"\n")
+            count += 1
+    return count
+
+
+def store(
+    sql_pipe,
+    batch: list[tuple],
+    logger: logging.Logger,
+    retries: int,
+    delay: float = 1.0,
+) -> bool:
+    """
+    Writes batch, retrying with a growing delay while Postgres is unavailable
+    """
+    for attempt in range(retries + 1):
+        if sql_pipe.execute_batch(batch):
+            return True
+        if attempt < retries:
+            time.sleep(delay * 2**attempt)
+    logger.error(f"Failed to store {len(batch)} tweets from {batch[0][0]}")
+    return False
+
+
+def reingest(
+    paths: list[str], db_args: dict, logger: logging.Logger, retries: int = 5
+) -> tuple[int, int]:
+    """
+    Loads the tweets of the captures, frames without a tweet (heartbeats, errors,
+    system messages) are skipped.
+    Returns the number of tweets stored and the number in batches that failed every retry.
+    """
+    events = {"local_db": Event(), "sql": Event(), "killall": Event()}
+    sql_pipe = PostgresPipe(db_args, None, events, logger)
+    mapping = sql_pipe.download_user_mapping() or {}
+    database = TweetDB({}, None, None, events, mapping, logger)
+
+    stored = 0
+    failed = 0
+    batch = []
+    for _, line in iter_capture(paths):
+        record = decode_line(line)
+        if isinstance(record, StreamNotice):
+            logger.info(f"Skipping captured stream notice: {record.summary()}")
+            continue
+        if record is None:
+            continue
+        row = database.extract_record(record)
+        if row is not None:
+            batch.append(row)
+        if len(batch) >= sql_pipe.max_batch_size:
+            if store(sql_pipe, batch, logger, retries):
+                stored += len(batch)
+            else:
+                failed += len(batch)
+            batch = []
+            database.tweet_dict.clear()
+    if batch:
+        if store(sql_pipe, batch, logger, retries):
+            stored += len(batch)
+        else:
+            failed += len(batch)
+    return stored, failed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("paths", nargs="+", help="capture directories or segment files")
+    parser.add_argument("--export", help="write a replay corpus instead of loading")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    logger = logging.getLogger("Reingest")
+    if args.export:
+        count = export_corpus(args.paths, args.export)
+        logger.info(f"Exported {count} payloads to {args.export}")
+    else:
+        stored, failed = reingest(args.paths, PG_ARGS, logger)
+        logger.info(f"Re-ingested {stored} tweets")
+        if failed:
+            logger.error(f"{failed} tweets could not be stored, re-run to retry them")
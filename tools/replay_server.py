@@ -0,0 +1,427 @@
+"""
+Local stand-in for the Twitter API v2 endpoints the auditor uses, for load testing without network.
+
+Serves:
+    GET  /2/tweets/search/stream        newline delimited JSON with \\r\\n heartbeats,
+                                         replaying a corpus at a set rate with bursts
+    GET  /2/tweets/search/stream/rules   the rules stored by POST
+    POST /2/tweets/search/stream/rules   {"add": [...]} and {"delete": {"ids": [...]}}
+    GET  /2/users/by?usernames=a,b       users from the corpus, or stable made-up ids
+    GET  /2/tweets/search/recent         corpus tweets matching from:<username> OR ... queries
+    GET  /2/users/:id/tweets             corpus tweets of one author
+The last two page through the corpus by created_at with start_time/end_time, newest first.
+
+Run from the repo root, then point TwitterHandler/Toolkit/TweetStream at it with api_url:
+    python -m tools.replay_server --port 8080 --tweets 100000 --rate 10000
+"""
+
+# native
+import argparse
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from itertools import islice
+import json
+import logging
+import math
+import random
+import re
+from threading import Event, Lock, Thread
+import time
+from urllib.parse import parse_qs, urlparse
+import zlib
+
+
+def iso_time(ts: float) -> str:
+    return (
+        time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(ts))
+        + f".{int(ts % 1 * 1000):03d}Z"
+    )
+
+
+def parse_time(value: str) -> float:
+    return datetime.fromisoformat(value.replace("Z", "+00:00")).timestamp()
+
+
+def make_corpus(
+    n_tweets: int,
+    n_authors: int = 500,
+    seed: int = 0,
+    start: float = 1_650_000_000,
+    interval: float = 0.01,
+):
+    """
+    Builds n_tweets filtered-stream payloads from n_authors accounts, posted interval
+    seconds apart from start. Returns the payloads and the matching user_id -> user_name mapping.
+    """
+    rng = random.Random(seed)
+    mapping = {10_000 + i: f"user{i}" for i in range(n_authors)}
+    author_ids = list(mapping)
+    corpus = []
+    for i in range(n_tweets):
+        author_id = rng.choice(author_ids)
+        corpus.append(
+            {
+                "data": {
+                    "author_id": str(author_id),
+                    "id": str(1_500_000_000_000_000_000 + i),
+                    "text": f"tweet number {i} " + "x" * rng.randint(20, 260),
+                    "created_at": iso_time(start + i * interval),
+                },
+                "includes": {
+                    "users": [
+                        {
+                            "id": str(author_id),
+                            "name": f"User {mapping[author_id]}",
+                            "username": mapping[author_id],
+                        }
+                    ]
+                },
+                "matching_rules": [{"id": "1500677568919392257", "tag": "501"}],
+            }
+        )
+    return corpus, mapping
+
+
+def load_corpus(path: str) -> list[dict]:
+    """
+    Reads a recorded corpus, one stream payload per line
+    """
+    with open(path, "rb") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+class ReplayServer(ThreadingHTTPServer):
+    """
+    Arguments:
+        corpus          (list): stream payloads to replay
+        rate           (float): tweets/sec, None sends as fast as the client reads
+        burst_every    (float): seconds between the start of each burst, 0 for no bursts
+        burst_seconds  (float): length of each burst
+        burst_factor   (float): rate multiplier during a burst
+        repeat           (int): times the corpus is replayed, tweet ids are shifted on each pass
+        heartbeat      (float): seconds of silence before a \\r\\n heartbeat is sent
+        hold_open       (bool): keep the stream open sending heartbeats once the corpus is done
+        rate_limit       (int): requests per window for the rules and users endpoints
+        rate_window    (float): seconds in a rate limit window
+    """
+
+    daemon_threads = True
+    max_chunk = 1000  # lines per write
+
+    def __init__(
+        self,
+        address: tuple,
+        corpus: list[dict],
+        rate: float = None,
+        burst_every: float = 0,
+        burst_seconds: float = 0,
+        burst_factor: float = 1,
+        repeat: int = 1,
+        heartbeat: float = 20,
+        hold_open: bool = False,
+        rate_limit: int = 900,
+        rate_window: float = 15 * 60,
+        logger: logging.Logger = logging.getLogger("Replay"),
+    ):
+        super().__init__(address, ReplayRequestHandler)
+        self.corpus = corpus
+        self.rate = rate
+        self.burst_every = burst_every
+        self.burst_seconds = burst_seconds
+        self.burst_factor = burst_factor
+        self.repeat = repeat
+        self.heartbeat = heartbeat
+        self.hold_open = hold_open
+        self.rate_limit = rate_limit
+        self.rate_window = rate_window
+        self.logger = logger
+        self.stopping = Event()
+        self.lock = Lock()
+        self.rules = {}
+        self.next_rule_id = 1_500_677_568_919_392_257
+        self.windows = {}
+        self.users = {}
+        for payload in corpus:
+            for user in payload.get("includes", {}).get("users", []):
+                self.users[user["username"].lower()] = user
+        # (created_at, data) newest first, the order the search and timeline endpoints answer in
+        self.timeline = sorted(
+            (
+                (parse_time(p["data"]["created_at"]), p["data"])
+                for p in corpus
+                if "created_at" in p.get("data", {})
+            ),
+            key=lambda item: item[0],
+            reverse=True,
+        )
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.server_address[0]}:{self.server_address[1]}"
+
+    def start(self) -> Thread:
+        thread = Thread(target=self.serve_forever, daemon=True)
+        thread.start()
+        return thread
+
+    def stop(self) -> None:
+        self.stopping.set()
+        self.shutdown()
+        self.server_close()
+
+    def encoded_corpus(self):
+        """
+        Yields every payload as a \\r\\n terminated line, shifting tweet ids on repeated passes
+        """
+        for num in range(self.repeat):
+            for payload in self.corpus:
+                if num and "data" in payload:
+                    payload = dict(payload)
+                    payload["data"] = dict(payload["data"])
+                    payload["data"]["id"] = str(
+                        int(payload["data"]["id"]) + num * 10**15
+                    )
+                yield json.dumps(payload).encode() + b"\r\n"
+
+    def due(self, elapsed: float) -> float:
+        """
+        Number of tweets that should have been sent after elapsed seconds
+        """
+        if not self.rate:
+            return float("inf")
+        burst_time = 0
+        if self.burst_every and self.burst_seconds:
+            periods, into_period = divmod(elapsed, self.burst_every)
+            burst_time = periods * self.burst_seconds + min(
+                into_period, self.burst_seconds
+            )
+        return self.rate * (elapsed + (self.burst_factor - 1) * burst_time)
+
+    def take_request(self, endpoint: str) -> dict:
+        """
+        Counts a request against the endpoint's window and returns its rate limit headers
+        """
+        now = time.time()
+        with self.lock:
+            reset, used = self.windows.get(endpoint, (now + self.rate_window, 0))
+            if now >= reset:
+                reset, used = now + self.rate_window, 0
+            used += 1
+            self.windows[endpoint] = (reset, used)
+        return {
+            "x-rate-limit-limit": str(self.rate_limit),
+            "x-rate-limit-remaining": str(max(self.rate_limit - used, 0)),
+            "x-rate-limit-reset": str(math.ceil(reset)),
+            "exceeded": used > self.rate_limit,
+        }
+
+    def find_tweets(self, author_ids: set, query: dict) -> dict:
+        """
+        One page of the corpus tweets by author_ids inside the start_time/end_time of query
+        """
+        start = parse_time(query["start_time"][0]) if "start_time" in query else 0
+        end = parse_time(query["end_time"][0]) if "end_time" in query else time.time()
+        max_results = int(query.get("max_results", ["10"])[0])
+        token = (query.get("next_token") or query.get("pagination_token") or ["0"])[0]
+        matches = [
+            data
+            for created_at, data in self.timeline
+            if start <= created_at < end and data["author_id"] in author_ids
+        ]
+        offset = int(token)
+        page = matches[offset : offset + max_results]
+        meta = {"result_count": len(page)}
+        if page:
+            meta["newest_id"], meta["oldest_id"] = page[0]["id"], page[-1]["id"]
+        if offset + max_results < len(matches):
+            meta["next_token"] = str(offset + max_results)
+        return {"data": page, "meta": meta} if page else {"meta": meta}
+
+    def lookup_user(self, username: str) -> dict:
+        user = self.users.get(username.lower())
+        if user is None:
+            user_id = 2_000_000_000 + zlib.crc32(username.lower().encode())
+            user = {"id": str(user_id), "name": username, "username": username}
+        return user
+
+
+class ReplayRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        self.server.logger.debug(format % args)
+
+    def send_json(self, status: int, body: dict, headers: dict = None) -> None:
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def read_json(self) -> dict:
+        length = int(self.headers.get("Content-Length", 0))
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def limited(self, endpoint: str) -> dict or None:
+        """
+        Returns the rate limit headers, or None after answering 429
+        """
+        headers = self.server.take_request(endpoint)
+        exceeded = headers.pop("exceeded")
+        if exceeded:
+            self.send_json(429, {"title": "Too Many Requests"}, headers)
+            return None
+        return headers
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path == "/2/tweets/search/stream":
+            self.stream_tweets()
+        elif url.path == "/2/tweets/search/stream/rules":
+            headers = self.limited(url.path)
+            if headers is not None:
+                self.get_rules(headers)
+        elif url.path == "/2/users/by":
+            headers = self.limited(url.path)
+            if headers is not None:
+                self.get_users(parse_qs(url.query), headers)
+        elif url.path == "/2/tweets/search/recent":
+            headers = self.limited(url.path)
+            if headers is not None:
+                self.search_recent(parse_qs(url.query), headers)
+        elif re.fullmatch(r"/2/users/\d+/tweets", url.path):
+            headers = self.limited("/2/users/:id/tweets")
+            if headers is not None:
+                author_id = url.path.split("/")[3]
+                body = self.server.find_tweets({author_id}, parse_qs(url.query))
+                self.send_json(200, body, headers)
+        else:
+            self.send_json(404, {"title": "Not Found Error"})
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        if url.path != "/2/tweets/search/stream/rules":
+            self.send_json(404, {"title": "Not Found Error"})
+            return
+        headers = self.limited(url.path)
+        if headers is not None:
+            self.post_rules(self.read_json(), headers)
+
+    def get_rules(self, headers: dict) -> None:
+        server = self.server
+        with server.lock:
+            rules = list(server.rules.values())
+        meta = {"sent": time.strftime("%Y-%m-%dT%H:%M:%S.000Z", time.gmtime())}
+        meta["result_count"] = len(rules)
+        body = {"data": rules, "meta": meta} if rules else {"meta": meta}
+        self.send_json(200, body, headers)
+
+    def post_rules(self, payload: dict, headers: dict) -> None:
+        server = self.server
+        with server.lock:
+            if "delete" in payload:
+                ids = payload["delete"].get("ids", [])
+                deleted = sum(server.rules.pop(i, None) is not None for i in ids)
+                summary = {"deleted": deleted, "not_deleted": len(ids) - deleted}
+                self.send_json(200, {"meta": {"summary": summary}}, headers)
+                return
+            added = []
+            for rule in payload.get("add", []):
+                rule = dict(rule, id=str(server.next_rule_id))
+                server.next_rule_id += 1
+                server.rules[rule["id"]] = rule
+                added.append(rule)
+        summary = {"created": len(added), "not_created": 0, "valid": len(added)}
+        summary["invalid"] = 0
+        self.send_json(200, {"data": added, "meta": {"summary": summary}}, headers)
+
+    def get_users(self, query: dict, headers: dict) -> None:
+        usernames = ",".join(query.get("usernames", [])).split(",")
+        users = [self.server.lookup_user(name) for name in usernames if name]
+        self.send_json(200, {"data": users}, headers)
+
+    def search_recent(self, query: dict, headers: dict) -> None:
+        usernames = re.findall(r"from:(\w+)", query.get("query", [""])[0])
+        author_ids = {self.server.lookup_user(name)["id"] for name in usernames}
+        self.send_json(200, self.server.find_tweets(author_ids, query), headers)
+
+    def write_chunk(self, data: bytes) -> None:
+        self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+
+    def stream_tweets(self) -> None:
+        server = self.server
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        lines = server.encoded_corpus()
+        sent = 0
+        start = last_write = time.perf_counter()
+        replaying = True
+        try:
+            while not server.stopping.is_set() and (replaying or server.hold_open):
+                now = time.perf_counter()
+                due = server.due(now - start) - sent if replaying else 0
+                if due >= 1:
+                    count = int(min(due, server.max_chunk))
+                    batch = list(islice(lines, count))
+                    if len(batch) < count:
+                        replaying = False
+                    if batch:
+                        self.write_chunk(b"".join(batch))
+                        sent += len(batch)
+                        last_write = now
+                    continue
+                if now - last_write >= server.heartbeat:
+                    self.write_chunk(b"\r\n")
+                    last_write = now
+                wait = (1 - due) / server.rate if replaying and server.rate else 0.05
+                time.sleep(min(wait, server.heartbeat, 0.05))
+            self.write_chunk(b"")
+        except (BrokenPipeError, ConnectionResetError):
+            server.logger.info(f"Stream client disconnected after {sent} tweets")
+        self.close_connection = True
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--corpus", help="recorded payloads, one JSON per line")
+    parser.add_argument("--tweets", type=int, default=100_000, help="synthetic corpus")
+    parser.add_argument("--authors", type=int, default=500)
+    parser.add_argument("--rate", type=float, default=None, help="tweets/sec")
+    parser.add_argument("--burst-every", type=float, default=0)
+    parser.add_argument("--burst-seconds", type=float, default=0)
+    parser.add_argument("--burst-factor", type=float, default=1)
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument("--heartbeat", type=float, default=20)
+    parser.add_argument("--hold-open", action="store_true")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    if args.corpus:
+        corpus = load_corpus(args.corpus)
+    else:
+        corpus, _ = make_corpus(args.tweets, args.authors)
+    server = ReplayServer(
+        (args.host, args.port),
+        corpus,
+        rate=args.rate,
+        burst_every=args.burst_every,
+        burst_seconds=args.burst_seconds,
+        burst_factor=args.burst_factor,
+        repeat=args.repeat,
+        heartbeat=args.heartbeat,
+        hold_open=args.hold_open,
+    )
+    print(f"Replaying {len(corpus)} tweets on {server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
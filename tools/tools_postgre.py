@@ -1,6 +1,8 @@
 # native
+from concurrent.futures import ThreadPoolExecutor
 import logging
 import os
+import time
 
 # packages
 import psycopg
@@ -8,20 +10,51 @@ import psycopg.sql as psql
 
 # lib
 from classes.classesv2 import TwitterHandler
+from classes.db_pool import get_pool
+from classes.lookup_cache import LookupCache
+from classes.mapping_refresh import install_mapping_trigger
+from classes.partitions import (
+    TIMESTAMP_SHIFT,
+    TWITTER_EPOCH_MS,
+    create_partitioned_table,
+    create_partitions,
+    is_partitioned,
+    month_start,
+)
 from classes import PG_ARGS
 
 
 class Toolkit:
-    def __init__(self, bearer_token, db_args):
+    """
+    Arguments:
+        cache_path (str): SQLite file caching user and tweet lookups between runs, see
+                          classes/lookup_cache.py [optional, None looks everything up]
+        cache_ttls (dict): endpoint -> seconds a cached lookup is used for [optional]
+    """
+
+    def __init__(
+        self,
+        bearer_token,
+        db_args,
+        api_url="https://api.twitter.com",
+        cache_path: str = None,
+        cache_ttls: dict = None,
+    ):
         self.logger = self.create_loggers()
-        self.handler = TwitterHandler(bearer_token, None, self.logger)
+        self.handler = TwitterHandler(bearer_token, None, self.logger, api_url=api_url)
         self.db_args = db_args
+        self.lookup_cache = (
+            LookupCache(cache_path, logging.getLogger("Lookup_Cache"), cache_ttls)
+            if cache_path
+            else None
+        )
 
         try:
-            self.connection = psycopg.connect(**self.db_args)
+            self.pool = get_pool(self.db_args)
+            self.pool.wait()
             self.logger.info("Postgres Connection Established!")
         except Exception as err:
-            self.connection = None
+            self.pool = None
             self.logger.error("POSTGRES CONNECTION BROKEN")
             self.logger.error(db_args)
             self.logger.error(f"{err}")
@@ -52,7 +85,10 @@ class Toolkit:
         return log_tools
 
     def tearDown(self):
-        self.connection.close()
+        self.pool.close()
+        if self.lookup_cache is not None:
+            self.logger.info(f"Lookup cache: {self.lookup_cache.stats()}")
+            self.lookup_cache.close()
 
     def format_rules(self, usernames):
         sorted_users = sorted(usernames, key=len)
@@ -125,11 +161,22 @@ class Toolkit:
         self.handler.set_rules(rules)
         self.update_author_to_id()
 
-    def update_author_to_id(self) -> None:
+    def update_author_to_id(self, max_workers: int = 4) -> dict or None:
         """
         Gets users from the Twitter Stream, compares them to local id_name_mapping, and updates anything missing
+
+        The 100-name lookups run concurrently on up to max_workers threads (the handler paces them
+        against the rate limit), and all results are written with one upsert in one transaction.
+
+        Arguments:
+            max_workers (int): parallel user lookups, 1 runs them one after another
+
+        Returns the time in seconds spent in each phase, or None if there was nothing to do
         """
+        timings = {}
+        start = time.perf_counter()
         info, resp = self.handler.get_rules()
+        timings["rules"] = time.perf_counter() - start
 
         if not info:
             return
@@ -143,23 +190,20 @@ class Toolkit:
         self.logger.info(f"Number of users is: {len(users)}")
         # ! add a check here for number of users
         get_rules = []
-        responses = []
 
-        conn = self.connection
-        cur = conn.cursor()
-        current_names = cur.execute(
-            psql.SQL("SELECT user_name,user_id FROM {};").format(
-                psql.Identifier("id_name_mapping")
+        start = time.perf_counter()
+        with self.pool.connection() as conn:
+            cur = conn.cursor()
+            cur.execute(
+                psql.SQL("SELECT user_name FROM {};").format(
+                    psql.Identifier("id_name_mapping")
+                )
             )
-        )
-        current_names = cur.fetchall()
-        current_ids = (
-            set([name[1] for name in current_names]) if current_names else set()
-        )
-        current_names = [name[0] for name in current_names] if current_names else set()
+            current_names = cur.fetchall()
+        timings["db_read"] = time.perf_counter() - start
 
         self.logger.info("Got names from DB")
-        names_set = set(current_names) if current_names else set()
+        names_set = {name[0] for name in current_names} if current_names else set()
         users_add = [name for name in users if name not in names_set]
 
         if not users_add:
@@ -171,106 +215,129 @@ class Toolkit:
             get_rule = ",".join(users_add[i : i + 100])
             get_rules.append(get_rule)
 
-        # self.logger.info("Got rules from endpoint")
-
-        for i in get_rules:
-            response = self.get_user_id(i)
-            responses.append(response)
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers) as executor:
+            responses = list(executor.map(self.get_user_id, get_rules))
+        timings["fetch"] = time.perf_counter() - start
 
         flattened_responses = [
             (item["id"], item["username"], item["name"])
             for response in responses
-            for item in response["data"]
+            for item in response.get("data", [])
         ]
-        to_update = []
-        to_add = []
-        for resp in flattened_responses:
-            if int(resp[0]) in current_ids:
-                to_update.append(resp)
-            else:
-                to_add.append(resp)
-
-        conn = self.connection
-        curr = conn.cursor()
-        curr.executemany(
-            psql.SQL("INSERT INTO {} VALUES (%s,%s,%s)").format(
-                psql.Identifier("id_name_mapping")
-            ),
-            to_add,
-        )
-        conn.commit()
-        for resp in to_update:
-            resp = {"user_id": resp[0], "user_name": resp[1], "user_full_name": resp[2]}
-            curr.execute(
+
+        start = time.perf_counter()
+        with self.pool.connection() as conn:
+            cur = conn.cursor()
+            cur.executemany(
                 psql.SQL(
-                    "UPDATE {} SET user_name=%(user_name)s, user_full_name=%(user_full_name)s WHERE user_id=%(user_id)s;"
+                    """INSERT INTO {} (user_id,user_name,user_full_name) VALUES (%s,%s,%s)
+                    ON CONFLICT (user_id) DO UPDATE
+                    SET user_name=EXCLUDED.user_name, user_full_name=EXCLUDED.user_full_name;"""
                 ).format(psql.Identifier("id_name_mapping")),
-                resp,
+                flattened_responses,
             )
             conn.commit()
+        timings["write"] = time.perf_counter() - start
+
+        self.logger.info(
+            f"Upserted {len(flattened_responses)} users from {len(get_rules)} lookups"
+        )
+        self.logger.info(
+            "Phase timings: "
+            + ", ".join(f"{phase}={secs:.3f}s" for phase, secs in timings.items())
+        )
+        return timings
 
     def create_user_group_db(self, users: list[str], table_name: str) -> None:
         """
         creates a table with table_name and a simple list of users
         """
         users_add = [[user] for user in users]
-        conn = self.connection
-        cur = conn.cursor()
-        cur.execute(
-            psql.SQL(
-                """CREATE TABLE {} (user_name TEXT PRIMARY KEY NOT NULL);"""
-            ).format(psql.Identifier(table_name))
-        )
-        # cur.execute(psql.SQL("INSERT INTO {} VALUES (%s)").format(psql.Identifier(table_name)), (10,))
-        cur.executemany(
-            psql.SQL("INSERT INTO {} VALUES (%s);").format(psql.Identifier(table_name)),
-            users_add,
-        )
-        conn.commit()
+        with self.pool.connection() as conn:
+            cur = conn.cursor()
+            cur.execute(
+                psql.SQL(
+                    """CREATE TABLE {} (user_name TEXT PRIMARY KEY NOT NULL);"""
+                ).format(psql.Identifier(table_name))
+            )
+            # cur.execute(psql.SQL("INSERT INTO {} VALUES (%s)").format(psql.Identifier(table_name)), (10,))
+            cur.executemany(
+                psql.SQL("INSERT INTO {} VALUES (%s);").format(
+                    psql.Identifier(table_name)
+                ),
+                users_add,
+            )
+            conn.commit()
 
     def update_user_group_db(self, users: list[str], table_name: str) -> None:
         """
         Gets names from a user_db, compares them to the input users, and then adds the difference
         """
-        conn = self.connection
-        cur = conn.cursor()
-        names = cur.execute(
-            psql.SQL("SELECT user_name FROM {};").format(psql.Identifier(table_name))
-        )
-        names = cur.fetchall()
-        names_set = {name[0] for name in names}
-        users_add = [[name] for name in users if name not in names_set]
+        with self.pool.connection() as conn:
+            cur = conn.cursor()
+            names = cur.execute(
+                psql.SQL("SELECT user_name FROM {};").format(
+                    psql.Identifier(table_name)
+                )
+            )
+            names = cur.fetchall()
+            names_set = {name[0] for name in names}
+            users_add = [[name] for name in users if name not in names_set]
 
-        cur.executemany(
-            psql.SQL("INSERT INTO {} VALUES (%s);").format(psql.Identifier(table_name)),
-            users_add,
-        )
+            cur.executemany(
+                psql.SQL("INSERT INTO {} VALUES (%s);").format(
+                    psql.Identifier(table_name)
+                ),
+                users_add,
+            )
 
     def get_user_list(self, table_name: str) -> list:
 
-        conn = self.connection
-        cur = conn.cursor()
-        cur.execute(
-            psql.SQL("SELECT user_name FROM {};").format(psql.Identifier(table_name))
-        )
-        output = cur.fetchall()
-        return [user[0] for user in output]
+        with self.pool.connection() as conn:
+            cur = conn.cursor()
+            cur.execute(
+                psql.SQL("SELECT user_name FROM {};").format(
+                    psql.Identifier(table_name)
+                )
+            )
+            output = cur.fetchall()
+            return [user[0] for user in output]
 
     def get_user_id(self, user: str) -> dict:
         """
-        Given a twitter username without "@", returns the user id
+        Given a twitter username without "@", returns the user id.
+        With the lookup cache, only the names not looked up recently are requested, and
+        the response holds the "data" of every name found.
 
         Arguments:
-            user    (str): the twitter username without '@'
+            user    (str): the twitter username without '@', or up to 100 of them joined by ','
         """
+        if self.lookup_cache is None:
+            return self.fetch_users(user)
+        users = self.lookup_cache.get_many(
+            "user_id",
+            [name.lower() for name in user.split(",")],
+            self.fetch_users_by_name,
+        )
+        return {"data": [found for found in users.values() if found is not None]}
+
+    def fetch_users(self, user: str) -> dict:
         usernames = f"usernames={user}"
         user_fields = "user.fields=id,verified,description,created_at"
 
-        url = "https://api.twitter.com/2/users/by?{}&{}".format(usernames, user_fields)
+        url = "{}/2/users/by?{}&{}".format(self.handler.api_url, usernames, user_fields)
         data = self.handler.get_from_endpoint(url)
 
         return data
 
+    def fetch_users_by_name(self, names: list[str]) -> dict:
+        """
+        Lower case username -> user object for the names that exist
+        """
+        data = self.fetch_users(",".join(names))
+        return {found["username"].lower(): found for found in data.get("data", [])}
+
     def get_user_timeline(self, user_id: str, max_results=5) -> list[dict]:
         """
         Given a user id, return some tweets from the users timeline
@@ -278,7 +345,16 @@ class Toolkit:
         Arguments:
             user_id (str): the users id
         """
-        url = "https://api.twitter.com/2/users/{}/tweets".format(user_id)
+        if self.lookup_cache is None:
+            return self.fetch_user_timeline(user_id, max_results)
+        return self.lookup_cache.get(
+            "user_timeline",
+            f"{user_id}/{max_results}",
+            lambda _: self.fetch_user_timeline(user_id, max_results),
+        )
+
+    def fetch_user_timeline(self, user_id: str, max_results=5) -> list[dict]:
+        url = "{}/2/users/{}/tweets".format(self.handler.api_url, user_id)
         params = {
             "tweet.fields": "text,source,author_id,attachments",
             "max_results": str(max_results),
@@ -301,34 +377,42 @@ class Toolkit:
     def download_user_mapping(self):
         user_mapping = {}
 
-        conn = self.connection
-        cur = conn.cursor()
-        try:
-            cur.execute(
-                psql.SQL("SELECT user_id,user_name FROM {};").format(
-                    psql.Identifier("id_name_mapping")
+        with self.pool.connection() as conn:
+            cur = conn.cursor()
+            try:
+                cur.execute(
+                    psql.SQL("SELECT user_id,user_name FROM {};").format(
+                        psql.Identifier("id_name_mapping")
+                    )
                 )
-            )
-        except Exception as err:
-            self.logger.error(f"ERROR DOWNLOADING USER MAPPING {err}")
-        try:
-            user_data = cur.fetchall()
-        except:
-            user_data = None
-        if user_data == None:
-            self.logger.warning("id_name_mapping Empty. Is this expected?")
-            return
-        for data in user_data:
-            user_mapping[data[0]] = data[1]
-        self.logger.info("User Mapping Downloaded Successfully!")
-        return user_mapping
+            except Exception as err:
+                self.logger.error(f"ERROR DOWNLOADING USER MAPPING {err}")
+            try:
+                user_data = cur.fetchall()
+            except:
+                user_data = None
+            if user_data == None:
+                self.logger.warning("id_name_mapping Empty. Is this expected?")
+                return
+            for data in user_data:
+                user_mapping[data[0]] = data[1]
+            self.logger.info("User Mapping Downloaded Successfully!")
+            return user_mapping
 
     def get_user_from_tweet(self, id: str):
+        if self.lookup_cache is None:
+            return self.fetch_user_from_tweet(id)
+        # a tweet's author never changes, the TTL only bounds the cache
+        return self.lookup_cache.get(
+            "tweet_author", str(id), self.fetch_user_from_tweet
+        )
+
+    def fetch_user_from_tweet(self, id: str):
         tweet_fields = "tweet.fields=lang,author_id"
         # ids = "ids=1278747501642657792,1255542774432063488"
         id = f"ids={id}"
-        url = "https://api.twitter.com/2/tweets?{}&{}".format(
-            id, tweet_fields
+        url = "{}/2/tweets?{}&{}".format(
+            self.handler.api_url, id, tweet_fields
         )  # ? Maybe use [text] response to double checK?
 
         data = self.handler.get_from_endpoint(url)
@@ -338,71 +422,170 @@ class Toolkit:
         self.logger.info(f"User ID Query Returned: {user_id}")
         return user_id
 
-    def initialize_db(self) -> None:
+    def initialize_db(self, partitioned: bool = False, months_ahead: int = 3) -> None:
         """
         Creates the tweet table and the id_name_mapping table.
         Also adds a test into the tweet table to make sure all is well.
+
+        Arguments:
+            partitioned  (bool): partition tweets by month, with an author_id index,
+                                 see classes/partitions.py
+            months_ahead  (int): months of partitions created past the current one
         """
-        # with self.connection as conn:
-        conn = self.connection
-        cur = conn.cursor()
+        with self.pool.connection() as conn:
+            cur = conn.cursor()
+
+            try:
+                cur.execute(
+                    psql.SQL("""CREATE TABLE {} (
+                    user_id BIGINT PRIMARY KEY NOT NULL,
+                    user_name TEXT NOT NULL,
+                    user_full_name TEXT);""").format(psql.Identifier("id_name_mapping"))
+                )
+                conn.commit()
+
+            except psycopg.errors.DuplicateTable:
+                self.logger.warning("DUPLICATE TABLE, id_name_mapping EXISTS")
+                conn.rollback()
+
+            except psycopg.errors.InFailedSqlTransaction as e:
+                self.logger.error(f"Fatal Error: {e}")
+                conn.rollback()
+                raise psycopg.errors.InFailedSqlTransaction
+
+            try:
+                if partitioned:
+                    create_partitioned_table(conn)
+                    now = time.time()
+                    create_partitions(
+                        conn,
+                        month_start(now, -1).timestamp(),
+                        month_start(now, months_ahead).timestamp(),
+                        self.logger,
+                    )
+                else:
+                    cur.execute(
+                        psql.SQL("""CREATE TABLE {} (
+                        tweet_id BIGINT PRIMARY KEY NOT NULL,
+                        author_id BIGINT NOT NULL,
+                        author_name TEXT NOT NULL,
+                        tweet_text TEXT NOT NULL);""").format(psql.Identifier("tweets"))
+                    )
+                conn.commit()
 
-        try:
-            cur.execute(
-                psql.SQL(
-                    """CREATE TABLE {} (
-                user_id BIGINT PRIMARY KEY NOT NULL,
-                user_name TEXT NOT NULL,
-                user_full_name TEXT);"""
-                ).format(psql.Identifier("id_name_mapping"))
-            )
-            conn.commit()
+            except psycopg.errors.DuplicateTable:
+                self.logger.warning("DUPLICATE TABLE, tweets EXISTS")
+                conn.rollback()
 
-        except psycopg.errors.DuplicateTable:
-            self.logger.warning("DUPLICATE TABLE, id_name_mapping EXISTS")
-            conn.rollback()
+            except psycopg.errors.InFailedSqlTransaction as e:
+                self.logger.error(f"Fatal Error: {e}")
+                conn.rollback()
+                raise psycopg.errors.InFailedSqlTransaction
 
-        except psycopg.errors.InFailedSqlTransaction as e:
-            self.logger.error(f"Fatal Error: {e}")
-            conn.rollback()
-            raise psycopg.errors.InFailedSqlTransaction
+            # lets running pipelines pick up mapping changes, see classes/mapping_refresh.py
+            install_mapping_trigger(conn)
+            conn.commit()
+
+            try:
+                cur.execute(
+                    psql.SQL("INSERT INTO {} VALUES (%s,%s,%s,%s);").format(
+                        psql.Identifier("tweets")
+                    ),
+                    (1, 1, "testName", "testText"),
+                )
+                conn.commit()
+            except psycopg.errors.UniqueViolation:
+                self.logger.warning(
+                    "test tweet is already in database! Are you re-initializing?"
+                )
+                conn.rollback()
 
-        try:
-            cur.execute(
-                psql.SQL(
-                    """CREATE TABLE {} (
-                tweet_id BIGINT PRIMARY KEY NOT NULL,
-                author_id BIGINT NOT NULL,
-                author_name TEXT NOT NULL,
-                tweet_text TEXT NOT NULL);"""
-                ).format(psql.Identifier("tweets"))
-            )
             conn.commit()
 
-        except psycopg.errors.DuplicateTable:
-            self.logger.warning("DUPLICATE TABLE, tweets EXISTS")
-            conn.rollback()
+    def install_mapping_trigger(self) -> None:
+        """
+        Adds the id_name_mapping trigger to a database created before it existed,
+        initialize_db installs it on new ones
+        """
+        with self.pool.connection() as conn:
+            install_mapping_trigger(conn)
+            conn.commit()
+        self.logger.info("id_name_mapping trigger installed")
 
-        except psycopg.errors.InFailedSqlTransaction as e:
-            self.logger.error(f"Fatal Error: {e}")
-            conn.rollback()
-            raise psycopg.errors.InFailedSqlTransaction
+    def migrate_to_partitioned(self, months_ahead: int = 3, keep_old=False) -> None:
+        """
+        Moves an existing tweets table into a partitioned one, in a single transaction.
+        The old table is renamed to tweets_unpartitioned, every month that holds tweets gets
+        a partition, and the rows are copied over. Writers block on the table lock until
+        the copy is committed, so stop the stream first on a big table.
 
-        try:
+        Arguments:
+            months_ahead  (int): months of partitions created past the current one
+            keep_old     (bool): keep tweets_unpartitioned instead of dropping it
+        """
+        with self.pool.connection() as conn:
+            if is_partitioned(conn):
+                self.logger.warning("tweets is already partitioned")
+                return
+            cur = conn.cursor()
             cur.execute(
-                psql.SQL("INSERT INTO {} VALUES (%s,%s,%s,%s);").format(
+                psql.SQL("LOCK TABLE {} IN ACCESS EXCLUSIVE MODE;").format(
                     psql.Identifier("tweets")
-                ),
-                (1, 1, "testName", "testText"),
+                )
             )
-            conn.commit()
-        except psycopg.errors.UniqueViolation:
-            self.logger.warning(
-                "test tweet is already in database! Are you re-initializing?"
+            # the new table's primary key wants the old one's name
+            cur.execute(
+                "SELECT conname FROM pg_constraint "
+                "WHERE conrelid = 'tweets'::regclass AND contype = 'p';"
             )
-            conn.rollback()
+            for (constraint,) in cur.fetchall():
+                cur.execute(
+                    psql.SQL("ALTER TABLE {} RENAME CONSTRAINT {} TO {};").format(
+                        psql.Identifier("tweets"),
+                        psql.Identifier(constraint),
+                        psql.Identifier(f"{constraint}_unpartitioned"),
+                    )
+                )
+            cur.execute(
+                psql.SQL("ALTER TABLE {} RENAME TO {};").format(
+                    psql.Identifier("tweets"), psql.Identifier("tweets_unpartitioned")
+                )
+            )
+            create_partitioned_table(conn)
 
-        conn.commit()
+            # the UTC month each tweet was posted in, the Twitter epoch is not at midnight
+            cur.execute(
+                psql.SQL(
+                    "SELECT DISTINCT extract(epoch FROM date_trunc('month', "
+                    "to_timestamp(((tweet_id >> %s) + %s) / 1000.0) AT TIME ZONE 'UTC')) "
+                    "FROM {};"
+                ).format(psql.Identifier("tweets_unpartitioned")),
+                (TIMESTAMP_SHIFT, TWITTER_EPOCH_MS),
+            )
+            months = [float(month) for (month,) in cur.fetchall()]
+            for month in sorted(months):
+                create_partitions(conn, month, month, self.logger)
+            now = time.time()
+            create_partitions(
+                conn, now, month_start(now, months_ahead).timestamp(), self.logger
+            )
+
+            cur.execute(
+                psql.SQL(
+                    "INSERT INTO {} (tweet_id,author_id,author_name,tweet_text) "
+                    "SELECT tweet_id,author_id,author_name,tweet_text FROM {};"
+                ).format(
+                    psql.Identifier("tweets"), psql.Identifier("tweets_unpartitioned")
+                )
+            )
+            self.logger.info(f"Moved {cur.rowcount} tweets into {len(months)} months")
+            if not keep_old:
+                cur.execute(
+                    psql.SQL("DROP TABLE {};").format(
+                        psql.Identifier("tweets_unpartitioned")
+                    )
+                )
+            conn.commit()
 
     def test_connection(self, secret=True) -> None:
         """
@@ -434,26 +617,26 @@ class Toolkit:
 
         self.logger.info("Testing Connection to Postgres Server")
 
-        conn = self.connection
-        cur = conn.cursor()
-        cur.execute(
-            psql.SQL("SELECT tweet_id FROM {} WHERE tweet_id=1;").format(
-                psql.Identifier("tweets")
+        with self.pool.connection() as conn:
+            cur = conn.cursor()
+            cur.execute(
+                psql.SQL("SELECT tweet_id FROM {} WHERE tweet_id=1;").format(
+                    psql.Identifier("tweets")
+                )
             )
-        )
-        conn.commit()
+            conn.commit()
 
-        self.logger.info("Connection to Postgres server good!")
-        self.logger.info("Connection test complete.")
+            self.logger.info("Connection to Postgres server good!")
+            self.logger.info("Connection test complete.")
 
     def table_exists(self, table_name: str):
-        conn = self.connection
-        cur = conn.cursor()
-        cur.execute(
-            "select exists(select * from information_schema.tables where table_name=%s)",
-            (table_name,),
-        )
-        return cur.fetchone()[0]
+        with self.pool.connection() as conn:
+            cur = conn.cursor()
+            cur.execute(
+                "select exists(select * from information_schema.tables where table_name=%s)",
+                (table_name,),
+            )
+            return cur.fetchone()[0]
 
     def add_users(self, users: list[str], table_name: str) -> None:
         """
@@ -493,7 +676,7 @@ class Toolkit:
         if to_delete:
             self.remove_users_from_rules(to_delete)
 
-    def clean_local_table(self,table_name) -> None:
+    def clean_local_table(self, table_name) -> None:
         #  grab users from local sql
         table_local_users = set(self.get_user_list(table_name))
         #  grab users from stream
@@ -503,15 +686,16 @@ class Toolkit:
         )
         to_delete = table_local_users - stream_users
         to_delete = [(x,) for x in to_delete]
-        conn = self.connection
-        cur = conn.cursor()
-        cur.executemany(
-            psql.SQL("DELETE FROM {} WHERE user_name=%s;").format(
-                psql.Identifier(table_name)
-            ),to_delete
-        )
-        conn.commit()
-        self.logger.info(f"Deleted following users from {table_name}: {to_delete}")
+        with self.pool.connection() as conn:
+            cur = conn.cursor()
+            cur.executemany(
+                psql.SQL("DELETE FROM {} WHERE user_name=%s;").format(
+                    psql.Identifier(table_name)
+                ),
+                to_delete,
+            )
+            conn.commit()
+            self.logger.info(f"Deleted following users from {table_name}: {to_delete}")
 
     def cache_users_local(self, cache_path):
         users = [str(user) for user in self.download_user_mapping().values()]